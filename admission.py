@@ -0,0 +1,140 @@
+# admission.py — upload size limits, spooling and the in-flight byte budget
+#
+# A conversion request used to be read whatever its size: a few concurrent
+# 500 MB uploads were enough to exhaust the container's memory. Three parts
+# keep that in check:
+#
+# - ByteBudget: every upload request reserves its Content-Length (or the
+#   per-request maximum when the length is not sent) from a process-wide
+#   budget before its body is read, and gives it back when its response has
+#   been sent. A request larger than the per-request limit is refused with
+#   413, one that does not fit in what is left of the budget with 503.
+# - spool_stream(): multipart file parts of requests above a threshold are
+#   written to named temp files instead of memory, so the bytes of an upload
+#   exist once, on disk; process-pool workers open the same file by path.
+# - mapped(): the parser reads spooled files through a read-only mmap, so
+#   the page cache holds the data and the process only ever holds a chunk.
+
+import contextlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+
+
+class Reservation:
+    """Bytes held in a ByteBudget; release() is idempotent."""
+
+    def __init__(self, budget, nbytes):
+        self.budget = budget
+        self.nbytes = nbytes
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.budget._release(self.nbytes)
+
+
+class ByteBudget:
+    """
+    Thread-safe budget of in-flight upload bytes. limit <= 0 disables it
+    (every reservation succeeds).
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, nbytes):
+        """A Reservation for nbytes, or None when they do not fit right now."""
+        with self._lock:
+            if self.limit > 0 and self.in_use + nbytes > self.limit:
+                self.rejected += 1
+                return None
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+            self.admitted += 1
+        return Reservation(self, nbytes)
+
+    def _release(self, nbytes):
+        with self._lock:
+            self.in_use -= nbytes
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit, "in_use": self.in_use, "peak": self.peak,
+                    "admitted": self.admitted, "rejected": self.rejected}
+
+
+def spool_stream(total_content_length, threshold, spool_dir=None):
+    """
+    Writable stream for one multipart file part: memory for requests of at
+    most threshold bytes, otherwise a named temp file (removed when closed).
+    """
+    if total_content_length is not None and total_content_length <= threshold:
+        return io.BytesIO()
+    if spool_dir:
+        os.makedirs(spool_dir, exist_ok=True)
+    return tempfile.NamedTemporaryFile("w+b", prefix="upload-", suffix=".part", dir=spool_dir or None)
+
+
+def spooled_path(upload):
+    """Path of the temp file an upload (werkzeug FileStorage or file) was spooled to, or None."""
+    stream = getattr(upload, "stream", upload)
+    name = getattr(stream, "name", None)
+    if not isinstance(name, str) or not os.path.isfile(name):
+        return None
+    try:
+        stream.flush()
+    except (AttributeError, OSError, ValueError):
+        return None
+    return name
+
+
+def take_stream(upload):
+    """
+    Take the stream out of a werkzeug FileStorage so closing the request
+    does not close it; the caller closes it. No bytes are copied.
+    """
+    stream = upload.stream
+    upload.stream = io.BytesIO()
+    stream.seek(0)
+    return stream
+
+
+def save_upload(upload, path):
+    """Store an upload at path: a hard link to its spool file when possible, else a copy."""
+    spooled = spooled_path(upload)
+    if spooled is not None:
+        try:
+            os.link(spooled, path)
+            return
+        except OSError:
+            pass
+    upload.save(path)
+
+
+@contextlib.contextmanager
+def mapped(fh):
+    """
+    A read-only mmap of a real file (positioned where fh is) while the block
+    runs, or fh itself for in-memory streams and empty files.
+    """
+    stream = getattr(fh, "stream", fh)
+    try:
+        pos = stream.tell()
+        view = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        yield fh
+        return
+    try:
+        view.seek(pos)
+        yield view
+    finally:
+        view.close()
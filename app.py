@@ -1,35 +1,136 @@
 # app.py — FINAL (Merge multi-file + centered UI)
 # BAGIAN 1/2
 
-from flask import Flask, request, send_file, render_template_string, jsonify
-from bs4 import BeautifulSoup
-import datetime, io, traceback, pyminizip, tempfile, os, shutil, re, sys, unicodedata
+from flask import Flask, Request, Response, g, request, render_template_string, jsonify, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import dump_options_header
+from urllib.parse import quote
+import datetime, io, traceback, os, re, sys, unicodedata, heapq, threading, hashlib, tempfile, shutil, time, uuid, itertools, gzip, json
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from collections import deque, namedtuple
+from functools import lru_cache
+from stream_parser import iter_message_elements
+from timestamps import format_iso_instant, format_prefix, parse_telegram_datetime
+from rules import RuleStore
+from message_record import extract_record, probe_head, probe_tail
+from overlap import ExportIndex, OverlapIndex, find_contained
+from checkpoint import Checkpoint, find_resume_offset, message_id, seen_digest
+from entry_store import DroppedStore, EntryStore
+from admission import ByteBudget, mapped, save_upload, spool_stream, spooled_path, take_stream
+from result_cache import EntryCache, bytes_digest, file_digest, path_digest
+from zipstream import (ENCRYPTION_AES, ENCRYPTION_ZIPCRYPTO, ZIP_ENCRYPTIONS, aes_available, iter_zip_entries,
+                       zipcrypto_tables)
+from media import MEDIA_OMITTED, ExportUploads, is_zip_upload, media_ref
+from jobs import ConversionProgress, Job, JobManager, JobQueueFull, STATUS_DONE, STATUS_FAILED
+from metrics import Registry
 
 app = Flask(__name__)
 
+# -----------------------
+# Config (env overrides)
+# -----------------------
+# bytes read from each upload per parser step
+STREAM_CHUNK_SIZE = int(os.environ.get("CONVERTER_STREAM_CHUNK_SIZE", 1 << 20))
+# processes used to parse multi-file uploads (0/1 = parse in the request thread)
+PARSE_WORKERS = int(os.environ.get("CONVERTER_PARSE_WORKERS", 0))
+# characters of output buffered before a chunk is encoded and sent
+RESPONSE_BUFFER_SIZE = int(os.environ.get("CONVERTER_RESPONSE_BUFFER_SIZE", 64 * 1024))
+# parsed-entry cache: memory budget in bytes (0 = off) and optional disk tier
+ENTRY_CACHE_BYTES = int(os.environ.get("CONVERTER_CACHE_BYTES", 128 * 1024 * 1024))
+ENTRY_CACHE_DIR = os.environ.get("CONVERTER_CACHE_DIR") or None
+# distinct raw sender names kept in the name resolver
+SENDER_CACHE_SIZE = int(os.environ.get("CONVERTER_SENDER_CACHE_SIZE", 65536))
+# background jobs: concurrent conversions, queued+running limit, result lifetime
+JOB_WORKERS = int(os.environ.get("CONVERTER_JOB_WORKERS", 2))
+JOB_MAX_PENDING = int(os.environ.get("CONVERTER_JOB_MAX_PENDING", 8))
+JOB_TTL = int(os.environ.get("CONVERTER_JOB_TTL", 3600))
+JOB_DIR = os.environ.get("CONVERTER_JOB_DIR") or os.path.join(tempfile.gettempdir(), "converter-jobs")
+# seconds a client is asked to wait when the job queue is full
+JOB_RETRY_AFTER = 10
+# where per-request cProfile dumps go; profiling is off unless this is set
+PROFILE_DIR = os.environ.get("CONVERTER_PROFILE_DIR") or None
+# request header that asks for a profile of that conversion
+PROFILE_HEADER = "X-Converter-Profile"
+# drop messages repeated across uploads (overlapping exports) and skip
+# uploads contained in another; lines within this many seconds count as one
+DEDUPE_ACROSS_FILES = os.environ.get("CONVERTER_DEDUPE_ACROSS_FILES", "1") not in ("0", "false", "no")
+DEDUPE_WINDOW_SECONDS = float(os.environ.get("CONVERTER_DEDUPE_WINDOW_SECONDS", 0))
+# response header with the number of uploads skipped as contained in another
+SKIPPED_FILES_HEADER = "X-Converter-Files-Skipped"
+# incremental conversions: response header with the token to continue from,
+# and how many dedupe digests the token carries
+CHECKPOINT_HEADER = "X-Converter-Checkpoint"
+CHECKPOINT_RECENT = int(os.environ.get("CONVERTER_CHECKPOINT_RECENT", 256))
+# response header set to "partial" when a conversion continued from a token
+# alone whose dedupe digests may be incomplete (checkpoint.py); sending the
+# previous TXT as well makes the dedupe exact
+DEDUPE_HEADER = "X-Converter-Dedupe"
+# candidate lines the parser collects before running the content filter on
+# them as one batch (ContentFilter.check_many)
+FILTER_BATCH_LINES = max(1, int(os.environ.get("CONVERTER_FILTER_BATCH_LINES", 4096)))
+# upload admission: largest request body, upload bytes all requests in
+# flight may hold together (0 = no limit), and the seconds a client is asked
+# to wait when that budget is used up
+MAX_REQUEST_BYTES = int(os.environ.get("CONVERTER_MAX_REQUEST_BYTES", 1 << 30))
+MAX_INFLIGHT_BYTES = int(os.environ.get("CONVERTER_MAX_INFLIGHT_BYTES", 2 << 30))
+ADMISSION_RETRY_AFTER = int(os.environ.get("CONVERTER_ADMISSION_RETRY_AFTER", 5))
+# requests larger than this have their uploads spooled to disk (in
+# SPOOL_DIR, default the temp dir) and parsed through mmap
+SPOOL_THRESHOLD = int(os.environ.get("CONVERTER_SPOOL_THRESHOLD", 1 << 20))
+SPOOL_DIR = os.environ.get("CONVERTER_SPOOL_DIR") or None
+# export folders uploaded as a zip (media.py): whether ZIP results carry the
+# attachments (a request can still send media=0), and the most bytes of chat
+# pages one conversion may extract from its archives (0 = no limit)
+MEDIA_PASSTHROUGH = os.environ.get("CONVERTER_MEDIA_PASSTHROUGH", "1") not in ("0", "false", "no")
+MAX_ARCHIVE_PAGE_BYTES = int(os.environ.get("CONVERTER_MAX_ARCHIVE_PAGE_BYTES", 4 << 30))
+# most attachment bytes one ZIP result carries (0 = no limit); links past it
+# stay "<Media omitted>". A password-protected ZipCrypto result encrypts
+# its stored media in pure Python (measured in zipstream.py), so it gets the
+# smaller MAX_SLOW_MEDIA_BYTES; AES results are not affected
+MAX_MEDIA_BYTES = int(os.environ.get("CONVERTER_MAX_MEDIA_BYTES", 2 << 30))
+MAX_SLOW_MEDIA_BYTES = int(os.environ.get("CONVERTER_MAX_SLOW_MEDIA_BYTES", 16 << 20))
+# JSON rule set replacing the built-in filter rules (see rules.py), and how
+# often (seconds) the file is checked for changes
+RULES_FILE = os.environ.get("CONVERTER_RULES_FILE") or None
+RULES_CHECK_INTERVAL = float(os.environ.get("CONVERTER_RULES_CHECK_INTERVAL", 2))
+# response header with the id of the rule set a conversion used
+RULES_HEADER = "X-Converter-Rules-Version"
+
 # -----------------------
 # Utilities (name cleaning, emoji removal, etc.)
 # -----------------------
+EMOJI_RE = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"
+    "\U0001F300-\U0001F5FF"
+    "\U0001F680-\U0001F6FF"
+    "\U0001F1E0-\U0001F1FF"
+    "\U00002702-\U000027B0"
+    "\U000024C2-\U0001F251"
+    "]+",
+    flags=re.UNICODE
+)
+ZERO_WIDTH_RE = re.compile(r'[\u200B\u200C\u200D\uFEFF]')
+SQUARE_BRACKET_RE = re.compile(r"\[.*?\]")
+CURLY_BRACKET_RE = re.compile(r"\{.*?\}")
+PAREN_RE = re.compile(r"\(.*?\)")
+WHITESPACE_RE = re.compile(r"\s+")
+
 def remove_emoji(text):
     if not text:
         return text
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"
-        "\U0001F300-\U0001F5FF"
-        "\U0001F680-\U0001F6FF"
-        "\U0001F1E0-\U0001F1FF"
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "]+",
-        flags=re.UNICODE
-    )
-    return emoji_pattern.sub(r'', text)
+    return EMOJI_RE.sub(r'', text)
 
 def remove_zero_width(text):
     if not text:
         return text
-    return re.sub(r'[\u200B\u200C\u200D\uFEFF]', '', text)
+    return ZERO_WIDTH_RE.sub('', text)
+
+def _printable_only(s):
+    if s.isprintable():
+        return s
+    return "".join(ch for ch in s if ch.isprintable())
 
 def sanitize_filename(name):
     if not name:
@@ -55,11 +156,11 @@ def normalize_name_for_key(name):
     s = unicodedata.normalize("NFKC", name)
     s = remove_emoji(s)
     s = remove_zero_width(s)
-    s = "".join(ch for ch in s if ch.isprintable())
+    s = _printable_only(s)
 
     # remove square/curly bracket contents like [xxx] or {yyy}
-    s = re.sub(r"\[.*?\]", "", s)
-    s = re.sub(r"\{.*?\}", "", s)
+    s = SQUARE_BRACKET_RE.sub("", s)
+    s = CURLY_BRACKET_RE.sub("", s)
     # remove any remaining stray ']' or '}'
     s = s.replace("]", "").replace("}", "")
 
@@ -68,9 +169,9 @@ def normalize_name_for_key(name):
         s = s.split(" | ")[0]
 
     # remove parenthesis contents and tags like (Bot)
-    s = re.sub(r"\(.*?\)", "", s)
+    s = PAREN_RE.sub("", s)
 
-    s = re.sub(r"\s+", " ", s).strip()
+    s = WHITESPACE_RE.sub(" ", s).strip()
     if not s:
         return "deleted account"
     return s.lower()
@@ -88,11 +189,11 @@ def display_name_cleanup(name):
         return "Deleted Account"
     s = remove_emoji(name)
     s = remove_zero_width(s)
-    s = "".join(ch for ch in s if ch.isprintable())
+    s = _printable_only(s)
 
     # remove [] and {} contents
-    s = re.sub(r"\[.*?\]", "", s)
-    s = re.sub(r"\{.*?\}", "", s)
+    s = SQUARE_BRACKET_RE.sub("", s)
+    s = CURLY_BRACKET_RE.sub("", s)
     s = s.replace("]", "").replace("}", "")
 
     # cut after pipe
@@ -100,151 +201,287 @@ def display_name_cleanup(name):
         s = s.split(" | ")[0].strip()
 
     # remove parentheses content
-    s = re.sub(r"\(.*?\)", "", s)
+    s = PAREN_RE.sub("", s)
 
-    s = re.sub(r"\s+", " ", s).strip()
+    s = WHITESPACE_RE.sub(" ", s).strip()
     return s if s else "Deleted Account"
 
-def parse_dt_from_title(t):
-    if not t:
-        return None
-    # try common Telegram title format: "dd.mm.YYYY HH:MM:SS UTC..."
-    try:
-        parts = t.split(" UTC")[0]
-        return datetime.datetime.strptime(parts, "%d.%m.%Y %H:%M:%S")
-    except Exception:
-        # fallback: try alternative like "MM/DD/YY, HH:MM AM/PM" or "03/06/25, 07:12 PM"
-        try:
-            return datetime.datetime.strptime(t.strip(), "%m/%d/%y, %I:%M %p")
-        except Exception:
-            return None
+def parse_dt_from_title(t, default_tz=None):
+    # "dd.mm.YYYY HH:MM:SS UTC+hh:mm" (keeps the offset) or the fallback
+    # "MM/DD/YY, HH:MM AM/PM"; see timestamps.py
+    return parse_telegram_datetime(t, default_tz=default_tz)
 
 def fmt(dt):
-    return dt.strftime("%m/%d/%y, %I:%M %p")
+    return format_prefix(dt)
+
+# bump when parsing/formatting changes so cached results are not reused
+PARSER_VERSION = 4
+
+# filter rules (rules.py): built-in, or RULES_FILE reloaded when it changes
+RULES = RuleStore(RULES_FILE, RULES_CHECK_INTERVAL)
+
+def rules_cache_version(rules):
+    """Entry cache key part for everything that decides which lines are kept."""
+    return hashlib.sha1(("%d-%s" % (PARSER_VERSION, rules.id)).encode("utf-8")).hexdigest()[:12]
+
+ENTRY_CACHE = EntryCache(ENTRY_CACHE_BYTES, disk_dir=ENTRY_CACHE_DIR)
 
 # -----------------------
-# Spam helpers & patterns (copied from final rules)
+# Sender names: display name, counting key and block verdict are computed
+# once per distinct raw name (group chats have a few hundred senders but
+# millions of messages) and kept in a bounded LRU shared by all files.
 # -----------------------
-def is_spam_like(text):
-    if not text:
-        return False
-    t = text.strip()
-    if re.search(r"(.)\1{4,}", t.lower()):
-        return True
-    if re.search(r"([!?.,])\1{3,}", t):
+SenderInfo = namedtuple("SenderInfo", ["display_name", "key"])
+
+# drop reasons counted per rule, next to the sender block rules
+# (rules.RULE_SENDER_*) and the content_filter RULE_* ids
+DROP_MISSING_FIELDS = "missing_fields"
+DROP_BOT_ELEMENTS = "bot_elements"
+DROP_CONSECUTIVE = "consecutive"
+DROP_NO_TEXT = "no_text"
+DROP_DUPLICATE = "duplicate"
+# merge level (overlap.py): lines repeated in another upload, and messages
+# of uploads skipped because another upload contains them
+DROP_OVERLAP = "overlap"
+DROP_CONTAINED_FILE = "contained_file"
+# incremental mode: message already converted before the checkpoint
+DROP_BEFORE_CHECKPOINT = "before_checkpoint"
+
+def _resolve_sender(raw_name):
+    display_name = display_name_cleanup(raw_name)
+    name_norm = normalize_name_for_key(raw_name)
+    if not name_norm or name_norm.strip() == "":
+        name_norm = "deleted account"
+        display_name = "Deleted Account"
+    return SenderInfo(display_name, name_norm)
+
+resolve_sender = lru_cache(maxsize=SENDER_CACHE_SIZE)(_resolve_sender)
+
+def sender_cache_stats():
+    info = resolve_sender.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+def record_has_bot_elements(rec, rules=None):
+    """Bot buttons/quotes/commands/keyboards, or a reply to a bot-named message."""
+    if rec.bot_markers:
         return True
-    letters = [c for c in t if c.isalpha()]
-    if letters:
-        caps = sum(1 for c in letters if c.isupper())
-        if caps > len(letters) * 0.6:
+    if rec.reply_text:
+        if rules is None:
+            rules = RULES.current()
+        if rules.mentions_bot_name(rec.reply_text):
             return True
-    if len(t) > 350:
-        return True
     return False
 
-SINGLE_WORD_SPAM_RE = re.compile(r"^[/\\]?(up|yo|ok|utc|cek|check|ping|pm|bump|push|help|upvote|vote|voteup)[!?.]*$", re.IGNORECASE)
-SHORT_WHITELIST = {"hai", "iya"}
-PRICE_RE = re.compile(r"\b\d+(\.\d+)?\s*(k|rb)\b", re.IGNORECASE)
-IP_COUNT_RE = re.compile(r"\b\d+\s*ip\b", re.IGNORECASE)
-DURATION_RE = re.compile(r"\b\d+\s*(hari|day|bulan|month)\b", re.IGNORECASE)
-LINK_RE = re.compile(r"(http|https|www\.|\.com|\.net|\.id|\.co)", re.IGNORECASE)
-
-CATALOG_KEYWORDS = [
-    "proxy", "ip:", "port", "user:pass", "residential", "static",
-    "bandwidth", "masa aktif", "ready", "note:", "package", "bandwith"
-]
-PROMO_KEYWORDS = [
-    "jual", "jualan", "promosi", "promo", "lowongan", "loker",
-    "jasa", "sewa", "autoscript install rdp", "vps", "garansi", "1 bulan"
-]
-PROMO_EMOJI = {"💥","🔥","⚡","💸","⭐","🎁","🎉"}
-
-RDP_KEYWORDS = [
-    "detail information", "speed download", "speed upload",
-    "linux", "ubuntu", "debian", "centos", "rockylinux", "almalinux",
-    "windows server", "cpu", "ram", "bandwidth", "rdp", "server", "vps",
-    "speed", "download", "upload", "durasi"
-]
-
-SENDER_HARD_BLOCK = ["deleted", "burnfp"]
-BOT_NAME_SUBSTRINGS = ["uxuy", "rose", "agent", "bot"]
-
-def msg_has_bot_elements(msg):
+def msg_has_bot_elements(msg, rules=None):
     try:
-        if msg.select_one("table.bot_buttons_table"):
-            return True
-        if msg.find("blockquote"):
-            return True
-        a_onclick = msg.find("a", onclick=True)
-        if a_onclick and "ShowBotCommand" in (a_onclick.get("onclick") or ""):
-            return True
-        if msg.select_one(".bot_inline_keyboard") or msg.select_one(".bot-buttons"):
-            return True
-        reply = msg.select_one(".reply_to")
-        if reply:
-            text = reply.get_text(" ", strip=True).lower()
-            if any(b in text for b in BOT_NAME_SUBSTRINGS):
-                return True
+        return record_has_bot_elements(extract_record(msg), rules)
     except Exception:
-        pass
-    return False
+        return False
 
 # -----------------------
 # Parse one HTML soup into a list of entries (dt, line)
 # We return list of tuples (dt, line). If dt missing, we assign fallback dt
 # -----------------------
-def parse_soup_to_entries(soup, fallback_dt=None):
+def parse_soup_to_entries(soup, fallback_dt=None, rules=None):
     """
     Parse messages from a BeautifulSoup object and return list of (dt, line) entries
     dt: datetime object (if cannot parse, fallback_dt or current time)
     """
-    entries = []
-    seen = set()  # (sender_norm, content) for per-soup dedupe
+    return parse_messages_to_entries(soup.select(".message.default"), fallback_dt=fallback_dt,
+                                     rules=rules)
+
+def parse_messages_to_entries(messages, fallback_dt=None, progress=None, carry_sender=None,
+                              rules=None):
+    """
+    Same as parse_soup_to_entries, but takes an iterable of message elements
+    (bs4 Tags or stream_parser.MessageNode).
+    """
+    store = parse_messages_to_store(messages, fallback_dt=fallback_dt, progress=progress,
+                                    carry_sender=carry_sender, rules=rules)
+    return list(store.iter_entries())
+
+def parse_messages_to_store(messages, fallback_dt=None, progress=None, carry_sender=None,
+                            resume=None, rules=None, keep_media=False, keep_dropped=False):
+    """
+    Parse an iterable of message elements (bs4 Tags or
+    stream_parser.MessageNode, so the streaming parser can feed messages one
+    at a time) into an EntryStore, in message order. progress
+    (jobs.ConversionProgress) gets messages_seen / messages_kept updates and
+    a drop count per rule when given. "joined" follow-ups take the sender of
+    the message before them; carry_sender is that sender for joined messages
+    at the very start (a later page of a split export).
+    resume (checkpoint.Checkpoint) continues an earlier conversion: messages
+    before its boundary are skipped and the consecutive counter, dedupe and
+    joined sender carry on from it. The parser state after the last message
+    is left in store.checkpoint. rules (rules.RuleSet) defaults to the
+    rule set active when the call starts. With keep_media, a media line
+    that links its file holds a media.media_ref() instead of
+    "<Media omitted>". With keep_dropped, store.dropped is an
+    entry_store.DroppedStore of every dropped message (its text) and line,
+    with the rule that dropped it; messages before the checkpoint are not
+    kept there.
+
+    Two phases: the message loop collects candidate lines, and every
+    FILTER_BATCH_LINES of them the content filter runs on the batch, then
+    dedupe and the store see the lines in their original order. The
+    message-level rules never depend on which lines were kept, so the
+    result is the same as filtering line by line.
+    """
+    if rules is None:
+        rules = RULES.current()
+    content_filter = rules.content
+    store = EntryStore()
+    seen = set()  # (sender_norm, content) for per-file dedupe
     user_counter = {}
     last_user_norm = None
-
-    for msg in soup.select(".message.default"):
-        date_el = msg.select_one(".date")
-        name_el = msg.select_one(".from_name")
+    state = resume.resume() if resume is not None else Checkpoint(CHECKPOINT_RECENT)
+    if state.run_key is not None:
+        last_user_norm = state.run_key
+        user_counter[last_user_norm] = state.run_count
+    last_sender = carry_sender if carry_sender is not None else state.last_sender
+    boundary = resume is not None and resume.has_boundary
+    seen_before = state.seen
+    tail = deque(maxlen=state.recent.maxlen)  # latest kept (sender, content), digested at the end
+
+    # all datetimes end up aware so files from different timezones sort by
+    # real time; timestamps without an offset take the last one seen in the
+    # file (or the first one, if they come before any)
+    if fallback_dt is None:
+        fallback_dt = datetime.datetime.now().astimezone()
+    elif fallback_dt.tzinfo is None:
+        fallback_dt = fallback_dt.astimezone()
+    last_tz = None
+    first_tz = None
+    naive_seen = False
+
+    # phase 1 output: (message number, dt, sid, name_norm, content) in order,
+    # name_norm None for media lines (kept without filter or dedupe); texts
+    # holds the contents to filter. A message dropped while lines wait here
+    # is queued as (None, dt, (display_name, name_key, media), rule, content)
+    # so store.dropped gets it after those lines, in message order.
+    pending = []
+    texts = []
+    msg_no = 0
+    last_kept_msg = -1
+    dropped = DroppedStore() if keep_dropped else None
+
+    def drop(rule, dt=None, display_name="", name_key="", content=None, rec=None):
+        if progress is not None:
+            progress.drop(rule)
+        if dropped is not None:
+            media = False
+            if content is None:
+                # a whole message: its text, as the parser saw it
+                media = rec.text is None and rec.has_media
+                content = rec.text if rec.text is not None else (MEDIA_OMITTED if media else "")
+            if pending and rec is not None:
+                pending.append((None, dt or fallback_dt, (display_name, name_key, media), rule, content))
+            else:
+                dropped.add(dt or fallback_dt, dropped.sender_id(display_name, name_key), content, rule,
+                            media)
+
+    def flush():
+        nonlocal last_kept_msg
+        verdicts = iter(content_filter.check_many(texts))
+        for no, line_dt, line_sid, norm, content in pending:
+            if no is None:
+                # a message dropped in phase 1: norm is its rule
+                display_name, name_key, media = line_sid
+                dropped.add(line_dt, dropped.sender_id(display_name, name_key), content, norm, media)
+                continue
+            if norm is not None:
+                # bot phrases, single word/short, catalog/price/ip/duration,
+                # rdp/vps, links/promos and spam patterns
+                rule = next(verdicts)
+                if rule is None:
+                    # dedupe per sender & content (and against the lines before the checkpoint)
+                    key = (norm, content)
+                    if key in seen or (seen_before and seen_digest(norm, content) in seen_before):
+                        rule = DROP_DUPLICATE
+                if rule is not None:
+                    drop(rule, line_dt, store.names[line_sid], norm, content)
+                    continue
+                seen.add(key)
+                tail.append(key)
+
+            store.add(line_dt, line_sid, content, media=norm is None)
+            if progress is not None and no != last_kept_msg:
+                progress.messages_kept += 1
+            last_kept_msg = no
+        pending.clear()
+        texts.clear()
+
+    for msg in messages:
+        msg_no += 1
+        if progress is not None:
+            progress.messages_seen += 1
+        msg_id = message_id(msg)
+        if boundary and resume.is_old_id(msg_id):
+            if progress is not None:
+                progress.drop(DROP_BEFORE_CHECKPOINT)
+            continue
+        # one walk over the element; the rules below only read the record
+        rec = extract_record(msg)
+        raw_name = rec.sender
+        if raw_name is not None:
+            last_sender = raw_name
+        elif rec.joined:
+            # follow-up without .from_name: same sender as the message before
+            raw_name = last_sender
         # skip entries missing essential pieces
-        if not date_el or name_el is None:
+        if rec.date_title is None or raw_name is None:
+            if dropped is not None and rec.date_title is not None:
+                drop(DROP_MISSING_FIELDS, parse_dt_from_title(rec.date_title or rec.date_text or "",
+                                                              default_tz=last_tz), rec=rec)
+            else:
+                drop(DROP_MISSING_FIELDS, rec=rec)
             continue
 
         # parse dt robustly
         dt = None
-        title = date_el.get("title") or date_el.get_text(" ", strip=True) or ""
-        dt = parse_dt_from_title(title)
+        title = rec.date_title or rec.date_text or ""
+        dt = parse_dt_from_title(title, default_tz=last_tz)
         if dt is None:
             # try parse if date_el text is like '03/06/25, 07:12 PM -'
-            try:
-                textdt = date_el.get_text(" ", strip=True)
-                dt = parse_dt_from_title(textdt)
-            except:
-                dt = None
+            dt = parse_dt_from_title(rec.date_text, default_tz=last_tz)
         if dt is None:
-            dt = fallback_dt or datetime.datetime.now()
-
-        raw_name = name_el.get_text(strip=True) if name_el else ""
-        display_name = display_name_cleanup(raw_name)
-        name_norm = normalize_name_for_key(raw_name)
-        if not name_norm or name_norm.strip() == "":
-            name_norm = "deleted account"
-            display_name = "Deleted Account"
-        name_norm_lower = name_norm.lower()
-
-        # hard block senders
-        if any(block in name_norm_lower for block in SENDER_HARD_BLOCK):
+            dt = fallback_dt
+        elif dt.tzinfo is None:
+            naive_seen = True
+        else:
+            if first_tz is None:
+                first_tz = dt.tzinfo
+            last_tz = dt.tzinfo
+        if boundary and msg_id is None and resume.is_old_time(dt):
+            if progress is not None:
+                progress.drop(DROP_BEFORE_CHECKPOINT)
             continue
+        state.note_message(msg_id, dt)
 
-        # bot name heuristic
-        if any(b in name_norm_lower for b in BOT_NAME_SUBSTRINGS):
+        sender = resolve_sender(raw_name)
+
+        # hard block senders / bot name heuristic
+        block_rule = rules.sender_block_rule(sender.key)
+        if block_rule is not None:
+            drop(block_rule, dt, sender.display_name, sender.key, rec=rec)
             continue
+        display_name = sender.display_name
+        name_norm = sender.key
+        sid = store.sender_id(display_name, name_norm)
 
 # End of BAGIAN 1/2
 # BAGIAN 2/2 — lanjutan parse + merge + frontend + routes + run
 
         # bot elements inside message
-        if msg_has_bot_elements(msg):
+        if record_has_bot_elements(rec, rules):
+            drop(DROP_BOT_ELEMENTS, dt, display_name, name_norm, rec=rec)
             continue
 
         # update consecutive counter
@@ -255,107 +492,1009 @@ def parse_soup_to_entries(soup, fallback_dt=None):
             last_user_norm = name_norm
         count_now = user_counter.get(name_norm, 1)
         if count_now > 2:
+            drop(DROP_CONSECUTIVE, dt, display_name, name_norm, rec=rec)
             continue  # strict rule: delete beyond 2 consecutive
 
         # media
-        media = msg.select_one(".media_wrap")
-        if media:
-            line = f"{fmt(dt)} - {display_name}: <Media omitted>"
-            entries.append((dt, line))
+        if rec.has_media:
+            if keep_media and rec.media_link:
+                content = media_ref(dt, rec.media_link)
+            else:
+                content = MEDIA_OMITTED
+            pending.append((msg_no, dt, sid, None, content))
             continue
 
-        text_el = msg.select_one(".text")
-        if not text_el:
+        raw_text = rec.text
+        if raw_text is None:
+            drop(DROP_NO_TEXT, dt, display_name, name_norm, rec=rec)
             continue
 
-        raw_text = text_el.get_text("\n", strip=True)
         for part in raw_text.split("\n"):
             content = part.strip()
-            if not content:
-                continue
-            lc = content.lower().strip()
+            if content:
+                pending.append((msg_no, dt, sid, name_norm, content))
+                texts.append(content)
+        if len(texts) >= FILTER_BATCH_LINES:
+            flush()
+
+    flush()
+    if naive_seen:
+        store.resolve_naive(first_tz or fallback_dt.tzinfo)
+    if dropped is not None:
+        if dropped.has_naive:
+            dropped.resolve_naive(first_tz or fallback_dt.tzinfo)
+        store.dropped = dropped
+    state.last_sender = last_sender
+    state.run_key = last_user_norm
+    state.run_count = user_counter.get(last_user_norm, 0)
+    state.recent.extend(seen_digest(k, c) for k, c in tail)
+    state.seen = frozenset()  # only needed while parsing
+    store.checkpoint = state
+    return store
 
-            # bot phrases
-            bot_phrases = ["click below", "see details", "join now", "congrat", "congrats", "already checked", "you have won", "check in", "daily reward", "bonus claim"]
-            if any(p in lc for p in bot_phrases):
-                continue
+# -----------------------
+# Merge multiple files: given list of file-like objects, produce merged text
+# Each file is parsed and sorted on its own (optionally in a process pool),
+# then the per-file runs are k-way merged. heapq.merge is stable across its
+# inputs, so equal timestamps keep upload order exactly like one global sort.
+# -----------------------
+_parse_pool = None
+_parse_pool_workers = 0
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool(workers):
+    """Return the shared process pool, (re)created when the size changes."""
+    global _parse_pool, _parse_pool_workers
+    with _parse_pool_lock:
+        if _parse_pool is None or _parse_pool_workers != workers:
+            if _parse_pool is not None:
+                _parse_pool.shutdown(wait=False)
+            _parse_pool = ProcessPoolExecutor(max_workers=workers)
+            _parse_pool_workers = workers
+        return _parse_pool
+
+class _ProgressReader:
+    """File wrapper that adds every read to progress.bytes_parsed."""
+
+    def __init__(self, f, progress):
+        self._f = f
+        self._progress = progress
+
+    def read(self, n=-1):
+        data = self._f.read(n)
+        self._progress.bytes_parsed += len(data)
+        return data
+
+class _SkipReader:
+    """
+    Binary reader over a seekable stream that jumps from offset skip_from
+    to skip_to (relative to where it starts): the already converted part
+    of an export in incremental mode.
+    """
 
-            # single word spam
-            if SINGLE_WORD_SPAM_RE.fullmatch(lc):
-                continue
+    def __init__(self, f, skip_from, skip_to):
+        self._f = f
+        self._start = f.tell()
+        self._pos = 0
+        self._skip_from = skip_from
+        self._skip_to = skip_to
+
+    def read(self, n=-1):
+        if self._skip_from is not None:
+            left = self._skip_from - self._pos
+            if left <= 0:
+                self._f.seek(self._start + self._skip_to)
+                self._pos = self._skip_to
+                self._skip_from = None
+            elif n is None or n < 0 or n > left:
+                n = left
+        data = self._f.read(n)
+        self._pos += len(data)
+        return data
+
+def _skip_before_checkpoint(f, resume, progress):
+    """f, or a _SkipReader leaving out the messages before resume's boundary."""
+    offsets = find_resume_offset(_iter_source_chunks(f), resume)
+    if offsets is None:
+        return f
+    header_end, resume_at = offsets
+    if progress is not None:
+        progress.bytes_parsed += resume_at - header_end
+    return _SkipReader(f, header_end, resume_at)
+
+def _parse_stream(f, fallback_dt, progress, carry_sender=None, resume=None, rules=None,
+                  keep_media=False, keep_dropped=False):
+    # stream the upload: messages are parsed as soon as they close,
+    # no full-document tree is built
+    if resume is not None and resume.has_boundary:
+        if progress is None:
+            f = _skip_before_checkpoint(f, resume, progress)
+        else:
+            with progress.clock.stage("skip"):
+                f = _skip_before_checkpoint(f, resume, progress)
+    if progress is None:
+        return parse_messages_to_store(
+            iter_message_elements(f, chunk_size=STREAM_CHUNK_SIZE), fallback_dt=fallback_dt,
+            carry_sender=carry_sender, resume=resume, rules=rules, keep_media=keep_media,
+            keep_dropped=keep_dropped)
+    # time spent producing message elements is "parse", the rest is "filter"
+    clock = progress.clock
+    messages = clock.timed_iter(
+        iter_message_elements(_ProgressReader(f, progress), chunk_size=STREAM_CHUNK_SIZE), "parse")
+    with clock.stage("filter"):
+        return parse_messages_to_store(messages, fallback_dt=fallback_dt, progress=progress,
+                                       carry_sender=carry_sender, resume=resume, rules=rules,
+                                       keep_media=keep_media, keep_dropped=keep_dropped)
+
+def parse_file_entries(source, fallback_dt, progress=None, carry_sender=None, resume=None,
+                       rules=None, keep_media=False, keep_dropped=False):
+    """
+    Parse one export into an EntryStore sorted by instant (stable).
+    source: file-like object, raw bytes, or a path on disk.
+    carry_sender: sender of leading "joined" messages (see joined_carry_senders).
+    resume: checkpoint.Checkpoint to continue from; the old part of the
+    file is skipped before it is tokenized.
+    rules: rules.RuleSet to filter with (default: the active one).
+    keep_media: media lines reference their files (media.media_ref).
+    keep_dropped: store.dropped holds what was dropped (sorted as well).
+    Files on disk (paths, spooled uploads) are read through an mmap.
+    Unreadable files give an empty store, like before.
+    """
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as fh, mapped(fh) as data:
+                store = _parse_stream(data, fallback_dt, progress, carry_sender, resume, rules,
+                                      keep_media, keep_dropped)
+        elif isinstance(source, bytes):
+            store = _parse_stream(io.BytesIO(source), fallback_dt, progress, carry_sender, resume,
+                                  rules, keep_media, keep_dropped)
+        else:
+            with mapped(source) as data:
+                store = _parse_stream(data, fallback_dt, progress, carry_sender, resume, rules,
+                                      keep_media, keep_dropped)
+    except Exception:
+        return EntryStore()
+    if progress is None:
+        store.sort()
+    else:
+        with progress.clock.stage("sort"):
+            store.sort()
+    if store.dropped is not None:
+        store.dropped.sort()
+    return store
+
+def _parse_file_in_worker(source, fallback_dt, carry_sender=None, resume=None, rules=None,
+                          keep_media=False, keep_dropped=False):
+    """Pool task: the store plus the worker-side counters, folded in by the caller."""
+    progress = ConversionProgress()
+    store = parse_file_entries(source, fallback_dt, progress=progress, carry_sender=carry_sender,
+                               resume=resume, rules=rules, keep_media=keep_media,
+                               keep_dropped=keep_dropped)
+    return store, progress
+
+def _read_upload(f):
+    try:
+        payload = f.read()
+    except Exception:
+        payload = b""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return payload
 
-            # short messages
-            if len(lc) <= 3 and lc not in SHORT_WHITELIST:
-                continue
+def _source_digest(source):
+    """Content hash of a path, raw bytes or seekable upload; None if it can't be hashed."""
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            return path_digest(source)
+        if isinstance(source, bytes):
+            return bytes_digest(source)
+        return file_digest(source)
+    except Exception:
+        return None
 
-            # catalog/price/ip/duration
-            if re.match(r"^\s*[-•*]\s+", content):
-                continue
-            if PRICE_RE.search(lc):
-                continue
-            if IP_COUNT_RE.search(lc):
-                continue
-            if any(k in lc for k in CATALOG_KEYWORDS):
-                continue
-            if DURATION_RE.search(lc):
-                continue
+def _source_size(source):
+    try:
+        if isinstance(source, (str, os.PathLike)):
+            return os.path.getsize(source)
+        if isinstance(source, bytes):
+            return len(source)
+        pos = source.tell()
+        size = source.seek(0, os.SEEK_END) - pos
+        source.seek(pos)
+        return size
+    except (AttributeError, OSError, ValueError):
+        pass
+    return 0
 
-            # rdp/vps keywords
-            if any(k in lc for k in RDP_KEYWORDS):
-                continue
+# -----------------------
+# Joined messages across files: Telegram splits big exports into
+# messages.html, messages2.html, ... and a page can start with "joined"
+# follow-ups of the previous page's last sender. Before parsing, the first
+# message of every upload is probed from its raw head; only when one starts
+# joined are the tails probed, and the page ending last before it supplies
+# the sender. Pages are then parsed independently (also in the pool).
+# -----------------------
+EDGE_PROBE_BYTES = 64 * 1024
+EDGE_PROBE_MAX_BYTES = 4 << 20
 
-            # links/promos
-            if LINK_RE.search(content):
-                continue
-            if any(k in lc for k in PROMO_KEYWORDS):
-                continue
-            if any(e in content for e in PROMO_EMOJI):
+def _read_edge(source, tail, size):
+    """First or last `size` bytes of a path, raw bytes or seekable upload, as text."""
+    try:
+        if isinstance(source, bytes):
+            data = source[-size:] if tail else source[:size]
+        else:
+            fh = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+            try:
+                pos = fh.tell()
+                if tail:
+                    fh.seek(max(pos, fh.seek(0, os.SEEK_END) - size))
+                data = fh.read(size)
+                fh.seek(pos)
+            finally:
+                if fh is not source:
+                    fh.close()
+    except (AttributeError, OSError, ValueError):
+        return ""
+    return data if isinstance(data, str) else data.decode("utf-8", "ignore")
+
+def _probe_tail(source):
+    size = EDGE_PROBE_BYTES
+    while True:
+        tail = probe_tail(_read_edge(source, True, size))
+        if tail is not None or size >= EDGE_PROBE_MAX_BYTES or size >= _source_size(source):
+            return tail
+        size *= 4
+
+def _title_instant(title):
+    dt = parse_dt_from_title(title) if title else None
+    if dt is None:
+        return None
+    return (dt if dt.tzinfo is not None else dt.replace(tzinfo=datetime.timezone.utc)).timestamp()
+
+def joined_carry_senders(sources):
+    """
+    Raw sender name that the leading "joined" messages of each source
+    continue, or None (file starts normally, or no page before it was uploaded).
+    The predecessor is the page whose last message is the latest one not after
+    the file's first message; without usable dates, the previous upload.
+    """
+    carries = [None] * len(sources)
+    if len(sources) < 2:
+        return carries
+    heads = [probe_head(_read_edge(src, False, EDGE_PROBE_BYTES)) for src in sources]
+    if not any(h is not None and h.joined for h in heads):
+        return carries
+    tails = [_probe_tail(src) for src in sources]
+    for i, head in enumerate(heads):
+        if head is None or not head.joined:
+            continue
+        start = _title_instant(head.date_title)
+        best, best_end = None, None
+        if start is not None:
+            for j, tail in enumerate(tails):
+                if j == i or tail is None:
+                    continue
+                end = _title_instant(tail.date_title)
+                if end is not None and end <= start and (best_end is None or end > best_end):
+                    best, best_end = j, end
+        if best is None and i > 0 and tails[i - 1] is not None:
+            best = i - 1
+        if best is not None:
+            carries[i] = tails[best].sender
+    return carries
+
+def _cache_rules_version(rules, carry_sender, resume=None, keep_media=False):
+    # the carried sender, the checkpoint and media references change what a page parses to
+    version = rules_cache_version(rules)
+    if keep_media:
+        version += "-media"
+    if carry_sender is not None:
+        version = "%s-%s" % (version, hashlib.sha1(carry_sender.encode("utf-8")).hexdigest()[:12])
+    if resume is not None:
+        version = "%s-%s" % (version, hashlib.sha1(resume.fingerprint.encode("ascii")).hexdigest()[:12])
+    return version
+
+# -----------------------
+# Overlapping uploads (overlap.py): two exports of the same group taken a
+# week apart share most of their messages. An upload whose messages (by id
+# and date) all appear in another upload is skipped before parsing; the
+# rest of the overlap is dropped line by line while the runs are merged.
+# -----------------------
+def _iter_source_chunks(source, chunk_size=None):
+    """Raw bytes of a path, raw bytes or seekable upload, in chunks; an upload's position is restored."""
+    if chunk_size is None:
+        chunk_size = STREAM_CHUNK_SIZE
+    if isinstance(source, bytes):
+        for start in range(0, len(source), chunk_size):
+            yield source[start:start + chunk_size]
+        return
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fh:
+            yield from iter(lambda: fh.read(chunk_size), b"")
+        return
+    pos = source.tell()
+    try:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+    finally:
+        source.seek(pos)
+
+def _export_index(source):
+    try:
+        return ExportIndex.scan(_iter_source_chunks(source))
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def parse_files_to_runs(filelist, workers=None, cache=None, progress=None, resume=None,
+                        rules=None, keep_media=False, keep_dropped=False):
+    """
+    Parse every file into its own sorted run (an EntryStore), in upload order.
+    Files whose content hash is already in the entry cache are not parsed
+    again. With workers > 1 and more than one file left to parse, files are
+    parsed in the shared process pool; uploads spooled to disk are sent to
+    the workers as paths, in-memory ones as bytes. progress (jobs.ConversionProgress) is updated per file,
+    and per message for files parsed in this process (pooled files report
+    their counters when they finish, cached files only add their kept count).
+    With DEDUPE_ACROSS_FILES, uploads contained in another upload get an
+    empty run and are counted in progress.files_skipped. resume
+    (checkpoint.Checkpoint) makes every file continue from that checkpoint.
+    rules (rules.RuleSet, default the active one) is used for every file.
+    keep_media makes media lines reference their files (media.media_ref).
+    keep_dropped gives every run a .dropped store (see
+    parse_messages_to_store); those conversions bypass the entry cache.
+    """
+    if workers is None:
+        workers = PARSE_WORKERS
+    if cache is None:
+        cache = ENTRY_CACHE
+    if progress is None:
+        progress = ConversionProgress()
+    if rules is None:
+        rules = RULES.current()
+    clock = progress.clock
+    filelist = list(filelist)
+    use_pool = workers > 1 and len(filelist) > 1
+
+    sources = []
+    for f in filelist:
+        if use_pool and not isinstance(f, (str, os.PathLike, bytes)):
+            # the worker maps a spooled upload itself: no copy of it here
+            path = spooled_path(f)
+            if path is not None:
+                f = path
+            else:
+                with clock.stage("read"):
+                    f = _read_upload(f)
+        sources.append(f)
+    with clock.stage("probe"):
+        carries = joined_carry_senders(sources)
+    contained = {}
+    if DEDUPE_ACROSS_FILES and len(sources) > 1:
+        with clock.stage("overlap"):
+            indexes = [_export_index(src) for src in sources]
+            contained = find_contained(indexes)
+
+    runs = [None] * len(filelist)
+    pending = []  # (index, cache key, source, fallback_dt, carry_sender)
+    for i, source in enumerate(sources):
+        if i in contained:
+            runs[i] = EntryStore()
+            progress.files_parsed += 1
+            progress.files_skipped += 1
+            progress.bytes_parsed += _source_size(source)
+            progress.drop(DROP_CONTAINED_FILE, len(indexes[i]))
+            continue
+        fallback_dt = datetime.datetime.now()
+        key = None
+        if cache.enabled and not keep_dropped and (resume is None or resume.fingerprint is not None):
+            with clock.stage("cache"):
+                digest = _source_digest(source)
+                cached = None
+                if digest is not None:
+                    key = cache.make_key(digest, _cache_rules_version(rules, carries[i], resume,
+                                                                      keep_media))
+                    cached = cache.get(key)
+            if cached is not None:
+                runs[i] = cached
+                progress.files_parsed += 1
+                progress.bytes_parsed += _source_size(source)
+                progress.messages_kept += len(cached)
                 continue
+        pending.append((i, key, source, fallback_dt, carries[i]))
+
+    if use_pool and len(pending) > 1:
+        pool = get_parse_pool(workers)
+        futures = [(i, key, source, pool.submit(_parse_file_in_worker, source, fallback_dt, carry,
+                                                resume, rules, keep_media, keep_dropped))
+                   for i, key, source, fallback_dt, carry in pending]
+        for i, key, source, fut in futures:
+            store, worker_progress = fut.result()
+            progress.absorb(worker_progress)
+            progress.files_parsed += 1
+            progress.bytes_parsed += _source_size(source)
+            if key is not None:
+                with clock.stage("cache"):
+                    cache.put(key, store)
+            runs[i] = store
+    else:
+        for i, key, source, fallback_dt, carry in pending:
+            store = parse_file_entries(source, fallback_dt, progress=progress, carry_sender=carry,
+                                       resume=resume, rules=rules, keep_media=keep_media,
+                                       keep_dropped=keep_dropped)
+            progress.files_parsed += 1
+            if key is not None:
+                with clock.stage("cache"):
+                    cache.put(key, store)
+            runs[i] = store
+    return runs
+
+def iter_merged_entries(runs):
+    """Stable k-way merge of per-file sorted runs (EntryStores), yielding (dt, line)."""
+    return heapq.merge(*(run.iter_entries() for run in runs), key=itemgetter(0))
+
+def iter_merged_lines(runs, progress=None, dedupe=None):
+    """
+    Output lines of the merged chat, in order. Runs are merged on their
+    integer instant column; lines are only formatted as they are written.
+    With dedupe (default DEDUPE_ACROSS_FILES), a line whose sender and
+    content were already merged from another upload at the same instant
+    (within DEDUPE_WINDOW_SECONDS) is dropped and counted in progress.
+    """
+    if dedupe is None:
+        dedupe = DEDUPE_ACROSS_FILES
+    runs = [run for run in runs if len(run)]
+    if len(runs) == 1:
+        yield from runs[0].iter_lines()
+        return
+    if not dedupe:
+        for _, line in heapq.merge(*(run.iter_keyed_lines() for run in runs), key=itemgetter(0)):
+            yield line
+        return
+    # every run is already free of repeats (per-file dedupe), so only lines
+    # from different uploads can meet here
+    overlap = OverlapIndex(int(DEDUPE_WINDOW_SECONDS * 1000000))
+    for ts, line, key, content in heapq.merge(*(run.iter_dedupe_rows() for run in runs),
+                                              key=itemgetter(0)):
+        if overlap.seen(ts, key, content):
+            if progress is not None:
+                progress.drop(DROP_OVERLAP)
+            continue
+        yield line
 
-            # spam pattern
-            if is_spam_like(content):
+def iter_encoded_chunks(lines, buffer_size=None):
+    """
+    Join lines with "\n" (no trailing newline, same bytes as "\n".join) and
+    yield UTF-8 chunks of about buffer_size characters, so a response only
+    ever holds one batch instead of the whole chat.
+    """
+    if buffer_size is None:
+        buffer_size = RESPONSE_BUFFER_SIZE
+    batch = []
+    size = 0
+    sep = ""
+    for line in lines:
+        batch.append(sep)
+        batch.append(line)
+        sep = "\n"
+        size += len(line) + 1
+        if size >= buffer_size:
+            yield "".join(batch).encode("utf-8")
+            batch = []
+            size = 0
+    if batch:
+        yield "".join(batch).encode("utf-8")
+
+# -----------------------
+# Structured output: one JSON object per kept line (NDJSON), written from
+# the entry stores without formatting TXT lines, for tools that would
+# otherwise parse the TXT back:
+#   {"ts": "2025-06-03T19:12:00+07:00", "name": "Rina", "key": "rina",
+#    "content": "...", "media": false, "source": "messages2.html"}
+# ts is the wall-clock time with its offset, key the sender's counting key
+# (normalize_name_for_key), source the upload the line came from. media is
+# the parser's flag for a line that stands for an attachment (EntryStore's
+# media column), so a text that reads "<Media omitted>" is not one. Records
+# come in TXT order, after the same cross-file dedupe. With dropped, the
+# runs' dropped stores are merged in by time and every record has
+# "dropped": null, or the rule that dropped the message or line.
+# -----------------------
+_json_str = json.JSONEncoder(ensure_ascii=False).encode
+
+def _record_rows(store, source, dropped=False):
+    """(µs, offset, name JSON, key JSON, key, content bytes, media JSON, source JSON, rule) per row."""
+    names = [_json_str(n) for n in store.names]
+    keys = [_json_str(k) for k in store.keys]
+    source = _json_str(source)
+    flags = ("false", "true")
+    if dropped:
+        for (us, off, sid, content, rule), media in zip(store.iter_rows(), store.media):
+            yield us, off, names[sid], keys[sid], store.keys[sid], content, flags[media], source, rule
+    else:
+        for (us, off, sid, content), media in zip(store.iter_rows(), store.media):
+            yield us, off, names[sid], keys[sid], store.keys[sid], content, flags[media], source, None
+
+def iter_merged_records(runs, sources, progress=None, dropped=False, dedupe=None):
+    """
+    NDJSON records (without the line end) of the merged runs; sources[i]
+    names the upload of runs[i] (default ""). dropped: include the runs' dropped stores
+    and the lines the cross-file dedupe drops. dedupe as in iter_merged_lines.
+    """
+    if dedupe is None:
+        dedupe = DEDUPE_ACROSS_FILES
+    if sources is None:
+        sources = [""] * len(runs)
+    inputs = []
+    kept_runs = 0
+    for run, source in zip(runs, sources):
+        if len(run):
+            inputs.append(_record_rows(run, source))
+            kept_runs += 1
+        if dropped and run.dropped is not None and len(run.dropped):
+            inputs.append(_record_rows(run.dropped, source, dropped=True))
+    overlap = OverlapIndex(int(DEDUPE_WINDOW_SECONDS * 1000000)) if dedupe and kept_runs > 1 else None
+    rows = inputs[0] if len(inputs) == 1 else heapq.merge(*inputs, key=itemgetter(0))
+    for us, off, name, key, key_text, content, media, source, rule in rows:
+        if rule is None and overlap is not None and overlap.seen(us, key_text, content):
+            if progress is not None:
+                progress.drop(DROP_OVERLAP)
+            if not dropped:
                 continue
+            rule = DROP_OVERLAP
+        record = '{"ts":"%s","name":%s,"key":%s,"content":%s,"media":%s,"source":%s' % (
+            format_iso_instant(us, off), name, key, _json_str(content.decode("utf-8")), media, source)
+        if dropped:
+            record += ',"dropped":%s}' % ("null" if rule is None else _json_str(rule))
+        else:
+            record += "}"
+        yield record
+
+def upload_name(source, exports=None):
+    """Name of an upload for the records: its filename, or archive/member for pages of a zip."""
+    if exports is not None and isinstance(source, str) and source in exports.page_names:
+        return exports.page_names[source]
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(source)
+    return getattr(source, "filename", None) or ""
+
+def process_and_merge_files(filelist, workers=None):
+    runs = parse_files_to_runs(filelist, workers=workers)
+    earliest = min((run.datetime_at(0) for run in runs if len(run)), default=None)
+
+    merged_text = "\n".join(iter_merged_lines(runs))
+    return merged_text, earliest
+
+# -----------------------
+# Metrics & profiling
+# Every conversion carries a ConversionProgress: counters and per-stage times
+# are added to the process-wide metrics when its output stream ends.
+# -----------------------
+METRICS = Registry()
+CONVERSIONS = METRICS.counter(
+    "converter_conversions_total", "Conversions by output format and outcome.", ["format", "outcome"])
+BYTES_IN = METRICS.counter(
+    "converter_bytes_in_total", "Bytes of uploaded HTML converted (parsed or served from the cache).")
+MESSAGES_SEEN = METRICS.counter(
+    "converter_messages_seen_total", "Message elements parsed.")
+MESSAGES_DROPPED = METRICS.counter(
+    "converter_messages_dropped_total",
+    "Messages dropped by rule (text lines for the content rules).", ["rule"])
+LINES_OUT = METRICS.counter(
+    "converter_lines_out_total", "Lines written to converted chats.")
+STAGE_SECONDS = METRICS.histogram(
+    "converter_stage_seconds", "Time one conversion spent in each pipeline stage.", ["stage"])
+CONVERSION_SECONDS = METRICS.histogram(
+    "converter_conversion_seconds", "Wall time of a conversion, upload parsed to last byte out.", ["format"])
+UPLOADS_REJECTED = METRICS.counter(
+    "converter_uploads_rejected_total", "Upload requests refused before their body was read.", ["reason"])
+MEDIA_FILES = METRICS.counter(
+    "converter_media_files_total",
+    "Attachment links in ZIP results: stored, duplicate of a stored file, missing from the upload,"
+    " or over the result's media budget.",
+    ["result"])
+MEDIA_BYTES = METRICS.counter(
+    "converter_media_bytes_total", "Bytes of attachments copied into ZIP results.")
+
+def record_conversion(progress, out_format, outcome, seconds):
+    CONVERSIONS.inc(1, out_format, outcome)
+    BYTES_IN.inc(progress.bytes_parsed)
+    MESSAGES_SEEN.inc(progress.messages_seen)
+    for rule, n in progress.dropped.items():
+        MESSAGES_DROPPED.inc(n, rule)
+    LINES_OUT.inc(progress.lines_out)
+    for stage, spent in progress.clock.totals.items():
+        STAGE_SECONDS.observe(spent, stage)
+    CONVERSION_SECONDS.observe(seconds, out_format)
+
+def media_budget(password=None, encryption=ENCRYPTION_ZIPCRYPTO):
+    """Most attachment bytes a ZIP result with this protection may carry (0 = no limit)."""
+    if password and encryption == ENCRYPTION_ZIPCRYPTO:
+        return min(MAX_MEDIA_BYTES, MAX_SLOW_MEDIA_BYTES) if MAX_MEDIA_BYTES > 0 else MAX_SLOW_MEDIA_BYTES
+    return MAX_MEDIA_BYTES
+
+def record_media(library):
+    stats = library.stats()
+    MEDIA_FILES.inc(stats["files"], "stored")
+    MEDIA_FILES.inc(stats["duplicates"], "duplicate")
+    MEDIA_FILES.inc(stats["missing"], "missing")
+    MEDIA_FILES.inc(stats["over_budget"], "over_budget")
+    MEDIA_BYTES.inc(stats["bytes"])
+
+def _collect_runtime_metrics():
+    cache = ENTRY_CACHE.stats()
+    names = sender_cache_stats()
+    yield ("converter_entry_cache_lookups_total", "counter", "Parsed-entry cache lookups by result.",
+           [({"result": "hit"}, cache["hits"]), ({"result": "disk_hit"}, cache["disk_hits"]),
+            ({"result": "miss"}, cache["misses"])])
+    yield ("converter_entry_cache_bytes", "gauge", "Estimated size of the in-memory entry cache.",
+           [({}, cache["bytes"])])
+    yield ("converter_sender_cache_lookups_total", "counter", "Sender name resolver lookups by result.",
+           [({"result": "hit"}, names["hits"]), ({"result": "miss"}, names["misses"])])
+    yield ("converter_jobs_pending", "gauge", "Background jobs queued or running.",
+           [({}, JOB_MANAGER.pending_count())])
+    yield ("converter_upload_bytes_in_flight", "gauge", "Upload bytes reserved by requests in flight.",
+           [({}, UPLOAD_BUDGET.stats()["in_use"])])
+
+METRICS.add_collector(_collect_runtime_metrics)
+
+class RequestProfile:
+    """cProfile of one conversion, written to PROFILE_DIR as <name>.prof when stopped."""
+
+    def __init__(self, label):
+        self.name = "%s-%s-%s" % (datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), label,
+                                  uuid.uuid4().hex[:8])
+        import cProfile  # only servers with PROFILE_DIR set ever profile
+        self._profiler = cProfile.Profile()
+
+    def start(self):
+        self._profiler.enable()
+        return self
+
+    def stop(self):
+        self._profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self._profiler.dump_stats(os.path.join(PROFILE_DIR, self.name + ".prof"))
+
+def profile_requested():
+    """True when profiling is enabled on this server and the request asks for it."""
+    return bool(PROFILE_DIR) and request.headers.get(PROFILE_HEADER, "").strip().lower() in ("1", "true", "yes")
+
+def parse_uploads(filelist, progress, out_format, started, profile=None, resume=None, rules=None,
+                  keep_media=False, keep_dropped=False):
+    """parse_files_to_runs() that still records the conversion (and profile) when it fails."""
+    try:
+        return parse_files_to_runs(filelist, progress=progress, resume=resume, rules=rules,
+                                   keep_media=keep_media, keep_dropped=keep_dropped)
+    except Exception:
+        record_conversion(progress, out_format, "error", time.perf_counter() - started)
+        if profile is not None:
+            profile.stop()
+        raise
+
+def iter_conversion_output(runs, progress, started, out_format="txt", txt_name=None,
+                           password=None, encryption=ENCRYPTION_ZIPCRYPTO, profile=None,
+                           previous=None, exports=None, sources=None, dropped=False):
+    """
+    Bytes of the converted chat: the merged TXT, a ZIP holding it as
+    txt_name, or with out_format "ndjson" one JSON record per line
+    (iter_merged_records(); sources are the upload names of the runs).
+    previous (path or file object of an earlier TXT) is written first, so
+    an incremental conversion appends to it; a file object is closed at
+    the end. exports (media.ExportUploads of zip uploads) is
+    closed at the end too; with exports.passthrough the ZIP also gets the
+    attachments the lines reference, up to media_budget() bytes. Merge,
+    encode, media and zip time go to progress.clock; the conversion is
+    recorded in the metrics (and the profile, if any, is written) when the
+    stream ends or the client goes away.
+    """
+    clock = progress.clock
+    def counted(lines):
+        for line in lines:
+            progress.lines_out += 1
+            yield line
+
+    media = exports.library if exports is not None and exports.passthrough else None
+    if media is not None:
+        media.max_bytes = media_budget(password, encryption)
+    if out_format == "ndjson":
+        lines = iter_merged_records(runs, sources, progress, dropped)
+    else:
+        lines = iter_merged_lines(runs, progress)
+    lines = clock.timed_iter(lines, "merge")
+    if media is not None:
+        lines = clock.timed_iter(media.rewrite_lines(lines), "media")
+    if previous is not None:
+        lines = itertools.chain(iter_text_lines(previous), lines)
+    lines = counted(lines)
+    if out_format == "ndjson":
+        # every record ends with a line end: a final "" adds the last one
+        lines = itertools.chain(lines, [""])
+    chunks = clock.timed_iter(iter_encoded_chunks(lines), "encode")
+    if out_format == "zip":
+        entries = [(txt_name, chunks, True, None)]
+        if media is not None:
+            # named while the TXT was written; read from the uploads as they are stored
+            entries = itertools.chain(entries, media.iter_zip_entries(
+                lambda file_chunks: clock.timed_iter(file_chunks, "media")))
+        chunks = clock.timed_iter(iter_zip_entries(entries, password=password, encryption=encryption,
+                                                   compresslevel=5), "zip")
+    outcome = "error"
+    try:
+        yield from chunks
+        outcome = "ok"
+    except GeneratorExit:
+        outcome = "aborted"
+        raise
+    finally:
+        record_conversion(progress, out_format, outcome, time.perf_counter() - started)
+        if profile is not None:
+            profile.stop()
+        if previous is not None and hasattr(previous, "close"):
+            previous.close()
+        if media is not None:
+            record_media(media)
+        if exports is not None:
+            exports.close()
 
-            # dedupe per sender & content
-            key = (name_norm, content)
-            if key in seen:
+# -----------------------
+# Incremental conversions (checkpoint.py): every conversion hands back a
+# checkpoint token; a later conversion given that token, or the TXT it
+# produced, skips what was converted before and continues the counter and
+# dedupe from there. With the TXT, the output is the TXT plus the new lines.
+# -----------------------
+def iter_text_lines(source):
+    """Lines (without line ends) of a TXT given as a path or a binary upload."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8-sig", errors="replace", newline="") as fh:
+            for line in fh:
+                yield line.rstrip("\r\n")
+        return
+    stream = getattr(source, "stream", source)
+    stream.seek(0)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        for line in text:
+            yield line.rstrip("\r\n")
+    finally:
+        text.detach()  # leave the upload open
+
+def load_resume(token=None, previous=None):
+    """
+    Checkpoint to continue from, or None for a full conversion. A token
+    gives the exact boundary; a previous TXT gives every line for the
+    dedupe. With both, the token's boundary is used with the TXT's lines.
+    Raises ValueError for a token that cannot be read.
+    """
+    resume = Checkpoint.from_token(token, CHECKPOINT_RECENT) if token else None
+    if previous is not None:
+        from_txt = Checkpoint.from_txt(iter_text_lines(previous), resolve_sender, CHECKPOINT_RECENT)
+        if resume is None:
+            resume = from_txt
+        else:
+            resume.seen = from_txt.seen
+            resume.dedupe_partial = False
+            resume.fingerprint += from_txt.fingerprint
+    return resume
+
+def conversion_checkpoint(runs, resume=None):
+    """Token for continuing after this conversion."""
+    checkpoints = [run.checkpoint for run in runs if run.checkpoint is not None]
+    if not checkpoints:
+        return resume.to_token() if resume is not None else Checkpoint(CHECKPOINT_RECENT).to_token()
+    return Checkpoint.combine(checkpoints).to_token()
+
+def request_resume():
+    """
+    (checkpoint, previous TXT) from the "checkpoint" field and "previous"
+    file of the request. The TXT's stream is taken over from the upload: it
+    is written out while the response streams, after the request has closed
+    its uploads.
+    """
+    upload = request.files.get("previous")
+    previous = None
+    if upload is not None and upload.filename:
+        previous = take_stream(upload)
+    try:
+        return load_resume(request.form.get("checkpoint"), previous), previous
+    except ValueError:
+        if previous is not None:
+            previous.close()
+        raise
+
+def dropped_requested():
+    """True when an NDJSON conversion should also list the dropped messages ("dropped" field or arg)."""
+    value = request.args.get("dropped") or request.form.get("dropped") or ""
+    return value.strip().lower() in ("1", "true", "yes")
+
+# -----------------------
+# Export folders uploaded as a zip (media.py): the chat pages are extracted
+# next to the spooled uploads and parsed like uploaded pages; the archives
+# stay open until the result has been written, for the attachments.
+# -----------------------
+def media_requested():
+    """True when this server copies attachments and the request did not turn it off."""
+    return MEDIA_PASSTHROUGH and request.form.get("media", "1").strip().lower() not in ("0", "false", "no")
+
+def expand_uploads(files, workdir):
+    """
+    (sources, exports): the uploads with every zip of an export folder
+    replaced by the paths of its chat pages, extracted under workdir, and
+    the media.ExportUploads holding those archives (None when no upload is
+    a zip). A zip given as a request upload is taken over from the request
+    (admission.take_stream). Raises ValueError for a zip that cannot be used.
+    """
+    sources = []
+    exports = None
+    try:
+        for f in files:
+            if not is_zip_upload(f):
+                sources.append(f)
                 continue
-            seen.add(key)
+            if exports is None:
+                exports = ExportUploads(workdir, MAX_ARCHIVE_PAGE_BYTES)
+            name = upload_name(f)
+            stream = open(f, "rb") if isinstance(f, (str, os.PathLike)) else take_stream(f)
+            sources.extend(exports.add(stream, name))
+    except Exception:
+        if exports is not None:
+            exports.close()
+        raise
+    return sources, exports
 
-            line = f"{fmt(dt)} - {display_name}: {content}"
-            entries.append((dt, line))
+def request_exports_dir():
+    return os.path.join(SPOOL_DIR or tempfile.gettempdir(), "converter-export-%s" % uuid.uuid4().hex)
 
-    return entries
+# -----------------------
+# Background jobs
+# -----------------------
+def run_conversion_job(job):
+    """Parse the job's spooled uploads and write the TXT/ZIP result to job.result_path."""
+    opts = job.options
+    progress = job.progress
+    # cProfile only sees the thread it is enabled in, so start it here
+    profile = opts.get("profile")
+    if profile is not None:
+        profile.start()
+    started = time.perf_counter()
+    progress.stage = "parsing"
+    previous = opts.get("previous")
+    resume = load_resume(opts.get("checkpoint"), previous)
+    sources, exports = expand_uploads(job.input_paths, os.path.join(job.workdir, "pages"))
+    keep_media = False
+    if exports is not None:
+        keep_media = exports.passthrough = opts["format"] == "zip" and opts.get("media", False)
+        progress.files_total = len(sources)
+        progress.bytes_total = sum(os.path.getsize(p) for p in sources)
+    try:
+        runs = parse_uploads(sources, progress, opts["format"], started, profile, resume,
+                             opts.get("rules"), keep_media)
+    except Exception:
+        if exports is not None:
+            exports.close()
+        raise
+    job.checkpoint = conversion_checkpoint(runs, resume)
+    job.dedupe_partial = resume is not None and resume.dedupe_partial
+
+    progress.stage = "writing"
+    chunks = iter_conversion_output(runs, progress, started, out_format=opts["format"],
+                                    txt_name=opts["txt_name"], password=opts.get("password"),
+                                    encryption=opts.get("encryption", ENCRYPTION_ZIPCRYPTO),
+                                    profile=profile, previous=previous, exports=exports)
+    with open(job.result_path, "wb") as fh:
+        for chunk in chunks:
+            fh.write(chunk)
+
+JOB_MANAGER = JobManager(run_conversion_job, JOB_DIR, max_workers=JOB_WORKERS,
+                         max_pending=JOB_MAX_PENDING, ttl=JOB_TTL)
+
+def drain(timeout):
+    """
+    Graceful shutdown (serve.py): refuse new jobs, let queued and running
+    ones finish for up to timeout seconds, then stop the job and parse
+    pools. True when nothing was cut off.
+    """
+    idle = JOB_MANAGER.drain(timeout)
+    JOB_MANAGER.shutdown(wait=idle)
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=idle)
+    return idle
 
 # -----------------------
-# Merge multiple files: given list of file-like objects, produce merged text
+# Warm-up (serve.py --warm-up): importing this module leaves the costly
+# first-use work for the first conversion: importing bs4 (its entity table,
+# stream_parser.html_entities), compiling the built-in filter rules,
+# building the ZipCrypto tables and rendering the index page. warm_up()
+# does all of it, plus one small conversion to fill the per-process
+# lookup caches, before a server takes traffic.
 # -----------------------
-def process_and_merge_files(filelist):
-    all_entries = []
-    earliest = None
+WARM_UP_HTML = b"""<div class="history">
+ <div class="message default clearfix" id="message1"><div class="body">
+  <div class="pull_right date details" title="01.01.2024 08:00:00 UTC+07:00">08:00</div>
+  <div class="from_name">Warm Up</div>
+  <div class="text">good morning &amp; welcome</div>
+ </div></div>
+ <div class="message default clearfix joined" id="message2"><div class="body">
+  <div class="pull_right date details" title="01.01.2024 08:01:00 UTC+07:00">08:01</div>
+  <div class="text">PROMO VPS murah 10k!!!!</div>
+ </div></div>
+</div>
+"""
 
-    for f in filelist:
-        try:
-            content = f.read()
-            if isinstance(content, bytes):
-                soup = BeautifulSoup(content, "html.parser")
-            else:
-                soup = BeautifulSoup(str(content), "html.parser")
-        except Exception:
-            continue
+def warm_up():
+    """Do the first-use work of a conversion now; seconds spent per step."""
+    timings = {}
+    def step(name, fn):
+        start = time.perf_counter()
+        fn()
+        timings[name] = round(time.perf_counter() - start, 6)
+
+    step("rules", RULES.current)
+    step("parser", lambda: list(iter_merged_lines(
+        [parse_file_entries(WARM_UP_HTML, datetime.datetime.now(), rules=RULES.current())])))
+    step("zip", zipcrypto_tables)
+    with app.app_context():
+        step("index", index_page)
+    return timings
 
-        fallback_dt = datetime.datetime.now()
-        entries = parse_soup_to_entries(soup, fallback_dt=fallback_dt)
-        for dt, line in entries:
-            all_entries.append((dt, line))
-            if earliest is None or dt < earliest:
-                earliest = dt
-
-    # sort entries by datetime
-    all_entries.sort(key=lambda x: x[0])
-    merged_lines = [line for dt, line in all_entries]
-    merged_text = "\n".join(merged_lines)
-    return merged_text, earliest
+# -----------------------
+# Upload admission (admission.py): an upload request reserves its size from
+# UPLOAD_BUDGET before its body is read and gives it back once the response
+# has been sent (for a streamed conversion, when the stream is closed).
+# -----------------------
+class SpoolingRequest(Request):
+    """Request whose large file uploads go to named temp files (admission.spool_stream)."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return spool_stream(total_content_length, SPOOL_THRESHOLD, SPOOL_DIR)
+
+UPLOAD_BUDGET = ByteBudget(MAX_INFLIGHT_BYTES)
+UPLOAD_ENDPOINTS = frozenset(["convert_txt", "convert_zip", "submit_job"])
+# a request larger than the whole budget could never be admitted: refuse it as too large
+UPLOAD_LIMIT = min((n for n in (MAX_REQUEST_BYTES, MAX_INFLIGHT_BYTES) if n > 0), default=0)
+
+app.request_class = SpoolingRequest
+# werkzeug enforces the limit while reading bodies sent without a Content-Length
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_LIMIT or None
+
+def too_large_response():
+    UPLOADS_REJECTED.inc(1, "too_large")
+    return jsonify({"error": "upload too large", "limit": UPLOAD_LIMIT}), 413
+
+@app.before_request
+def admit_upload():
+    if request.method != "POST" or request.endpoint not in UPLOAD_ENDPOINTS:
+        return None
+    size = request.content_length
+    if UPLOAD_LIMIT and size is not None and size > UPLOAD_LIMIT:
+        return too_large_response()
+    # without a Content-Length the request may use up to the limit
+    reservation = UPLOAD_BUDGET.try_acquire(size if size is not None else UPLOAD_LIMIT)
+    if reservation is None:
+        UPLOADS_REJECTED.inc(1, "busy")
+        return busy_response("too many uploads in progress, try again later", ADMISSION_RETRY_AFTER)
+    g.upload_reservation = reservation
+    try:
+        request.files  # read (and spool) the body now, inside the reservation
+    except RequestEntityTooLarge:
+        return too_large_response()
+    return None
+
+@app.after_request
+def release_upload_after_response(response):
+    reservation = g.pop("upload_reservation", None)
+    if reservation is not None:
+        response.call_on_close(reservation.release)
+    return response
+
+@app.teardown_request
+def release_upload_on_error(exc):
+    # only still set when no response was finalized
+    reservation = g.pop("upload_reservation", None)
+    if reservation is not None:
+        reservation.release()
 
 # -----------------------
 # FRONTEND HTML (centered UI) — embedded here as INDEX_HTML
@@ -398,8 +1537,10 @@ INDEX_HTML = """
   label.small{font-size:13px;color:var(--muted)}
   input[type=text]{padding:10px 12px;width:100%;border-radius:8px;border:1px solid rgba(0,0,0,0.06);box-sizing:border-box}
   input[type=file]{display:none}
+  select{padding:8px 10px;border-radius:8px;border:1px solid rgba(0,0,0,0.06)}
   .btn{padding:10px 14px;border-radius:8px;border:none;background:var(--accent);color:white;cursor:pointer;margin-right:8px}
-  #loader{display:none;margin-left:6px}
+  #progressWrap{display:none;margin-top:12px}
+  #progressWrap progress{width:100%;height:14px}
   #status{white-space:pre-wrap;margin-top:12px;color:var(--muted);text-align:center}
   .dropzone{border:2px dashed rgba(0,0,0,0.10);border-radius:10px;padding:24px;text-align:center;color:var(--muted)}
   .dropzone.dragover{background:rgba(0,0,0,0.05);border-color:var(--accent);color:var(--text)}
@@ -418,9 +1559,9 @@ INDEX_HTML = """
     <div class="row">
       <div id="drop" class="dropzone">
         <div id="dropText">Drop Telegram HTML files here (multiple allowed), or <label for="fileInput" style="color:var(--accent);cursor:pointer">browse</label></div>
-        <input id="fileInput" type="file" accept=".html" multiple />
+        <input id="fileInput" type="file" accept=".html,.zip" multiple />
       </div>
-      <div class="note">You can drop/upload 2 or more HTML export files. They will be merged by timestamp.</div>
+      <div class="note">You can drop/upload 2 or more HTML export files. They will be merged by timestamp. Upload the export folder as a .zip to get its photos and files in the ZIP result.</div>
     </div>
 
     <div class="row">
@@ -431,7 +1572,6 @@ INDEX_HTML = """
     <div class="row">
       <button id="btn" class="btn">Convert & Download TXT (Merge)</button>
       <button id="btnZip" class="btn">Convert & Encrypt ZIP (Merge)</button>
-      <span id="loader">⏳ Processing...</span>
     </div>
 
     <div class="row">
@@ -439,6 +1579,15 @@ INDEX_HTML = """
       <input type="text" id="zipPass" placeholder="password untuk ZIP" />
     </div>
 
+    <div class="row">
+      <label class="small">Enkripsi ZIP:</label><br/>
+      <select id="zipEnc">
+        <option value="zipcrypto" selected>ZipCrypto (paling kompatibel)</option>
+        <option value="aes">AES-256</option>
+      </select>
+    </div>
+
+    <div id="progressWrap"><progress id="progress" max="100" value="0"></progress></div>
     <div id="status"></div>
   </div>
 </div>
@@ -449,7 +1598,8 @@ INDEX_HTML = """
   const drop=document.getElementById('drop'),dropText=document.getElementById('dropText');
   const fileInput=document.getElementById('fileInput');
   const btn=document.getElementById('btn'),btnZip=document.getElementById('btnZip');
-  const loader=document.getElementById('loader'),status=document.getElementById('status');
+  const progressWrap=document.getElementById('progressWrap'),progress=document.getElementById('progress');
+  const status=document.getElementById('status');
   const filenameInput=document.getElementById('filename');
   let currentFiles = [];
 
@@ -475,18 +1625,52 @@ INDEX_HTML = """
     dropText.textContent = currentFiles.length + " file(s) ready: " + currentFiles.map(f=>f.name).join(", ");
   };
 
-  async function sendRequest(url, formData, dl){
-    loader.style.display="inline";
+  function showProgress(pct, msg){
+    progressWrap.style.display="block";
+    progress.value = pct;
+    setStatus(msg);
+  }
+
+  function describeJob(job){
+    let p = job.progress;
+    if(job.status === "queued") return "Menunggu antrian...";
+    if(p.stage === "writing") return "Menulis hasil... " + p.lines_out + " baris";
+    let msg = "Memproses " + p.files_parsed + "/" + p.files_total + " file, "
+            + p.messages_seen + " pesan (" + p.messages_kept + " disimpan)";
+    if(job.eta_seconds != null) msg += ", sisa ~" + Math.ceil(job.eta_seconds) + " detik";
+    return msg;
+  }
+
+  const sleep = ms => new Promise(res => setTimeout(res, ms));
+
+  // submit a background job, poll its progress, then download the result
+  async function runJob(formData, dl){
     btn.disabled = btnZip.disabled = true;
+    showProgress(0, "Mengunggah...");
     try{
-      let r = await fetch(url, { method: "POST", body: formData });
+      let r = await fetch("/jobs", { method: "POST", body: formData });
       if(!r.ok){
         let txt = "";
         try { txt = await r.text(); } catch(e){ txt = "unknown error"; }
         setStatus("Error: " + txt);
         return;
       }
-      let blob = await r.blob();
+      let job = await r.json();
+      while(true){
+        await sleep(1000);
+        let s = await fetch(job.status_url);
+        if(!s.ok){ setStatus("Error: " + await s.text()); return; }
+        let info = await s.json();
+        if(info.status === "failed"){ setStatus("Error: " + info.error); return; }
+        if(info.status === "done") break;
+        let p = info.progress;
+        let pct = p.stage === "writing" ? 100 : (p.bytes_total ? Math.floor(100 * p.bytes_parsed / p.bytes_total) : 0);
+        showProgress(pct, describeJob(info));
+      }
+      showProgress(100, "Mengunduh hasil...");
+      let res = await fetch(job.result_url);
+      if(!res.ok){ setStatus("Error: " + await res.text()); return; }
+      let blob = await res.blob();
       let a = document.createElement("a");
       a.href = URL.createObjectURL(blob);
       a.download = dl;
@@ -498,7 +1682,7 @@ INDEX_HTML = """
     }catch(err){
       setStatus("Exception: " + err.toString());
     } finally {
-      loader.style.display="none";
+      progressWrap.style.display="none";
       btn.disabled = btnZip.disabled = false;
     }
   }
@@ -512,7 +1696,8 @@ INDEX_HTML = """
       fd.append("file", currentFiles[i], currentFiles[i].name);
     }
     fd.append("filename", txt);
-    sendRequest("/convert", fd, txt);
+    fd.append("format", "txt");
+    runJob(fd, txt);
   };
 
   btnZip.onclick=()=>{
@@ -526,7 +1711,9 @@ INDEX_HTML = """
     }
     fd.append("filename", txt);
     fd.append("password", document.getElementById('zipPass').value || "");
-    sendRequest("/convert_zip", fd, zip);
+    fd.append("encryption", document.getElementById('zipEnc').value || "zipcrypto");
+    fd.append("format", "zip");
+    runJob(fd, zip);
   };
 })();
 </script>
@@ -537,9 +1724,57 @@ INDEX_HTML = """
 # -----------------------
 # Routes (multi-file handling)
 # -----------------------
+def attachment_headers(download_name):
+    """Content-Disposition for a download, encoded the same way send_file does it."""
+    try:
+        download_name.encode("ascii")
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", download_name).encode("ascii", "ignore").decode("ascii")
+        value = {"filename": simple, "filename*": "UTF-8''" + quote(download_name, safe="!#$&+^`|~")}
+    else:
+        value = {"filename": download_name}
+    return {"Content-Disposition": dump_options_header("attachment", value)}
+
+# the page is static: rendered once, then served with an ETag and, to
+# clients that accept it, gzip-compressed
+StaticPage = namedtuple("StaticPage", ["body", "gzipped", "etag"])
+_index_page = None
+
+def index_page():
+    global _index_page
+    if _index_page is None:
+        body = render_template_string(INDEX_HTML).encode("utf-8")
+        _index_page = StaticPage(body, gzip.compress(body, 9, mtime=0), hashlib.sha1(body).hexdigest()[:16])
+    return _index_page
+
 @app.route("/", methods=["GET"])
 def index():
-    return render_template_string(INDEX_HTML)
+    page = index_page()
+    if request.accept_encodings["gzip"]:
+        resp = Response(page.gzipped, mimetype="text/html")
+        resp.headers["Content-Encoding"] = "gzip"
+        resp.set_etag(page.etag + "-gz")
+    else:
+        resp = Response(page.body, mimetype="text/html")
+        resp.set_etag(page.etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "entry_cache": ENTRY_CACHE.stats(),
+        "sender_names": sender_cache_stats(),
+        "rules": RULES.stats(),
+        "upload_budget": UPLOAD_BUDGET.stats(),
+    })
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.route("/convert", methods=["POST"])
@@ -549,15 +1784,57 @@ def convert_txt():
         if not files or len(files) == 0:
             return "file not found", 400
 
-        requested_name = sanitize_filename(request.form.get("filename", "converted_whatsapp.txt"))
-        if not requested_name.lower().endswith(".txt"):
-            requested_name += ".txt"
+        out_format = (request.args.get("format") or request.form.get("format") or "txt").lower()
+        if out_format not in ("txt", "ndjson"):
+            return "unsupported format", 400
+        extension = "." + out_format
+        requested_name = sanitize_filename(request.form.get("filename", "converted_whatsapp" + extension))
+        if requested_name.lower().endswith(".txt"):
+            requested_name = requested_name[:-4]
+        if not requested_name.lower().endswith(extension):
+            requested_name += extension
+        dropped = out_format == "ndjson" and dropped_requested()
 
-        merged_text, earliest = process_and_merge_files(files)
+        try:
+            resume, previous = request_resume()
+        except ValueError as e:
+            return str(e), 400
+        if previous is not None and out_format != "txt":
+            previous.close()
+            return "an earlier TXT can only be continued as TXT; send its checkpoint instead", 400
 
-        buf = io.BytesIO(merged_text.encode("utf-8"))
-        buf.seek(0)
-        return send_file(buf, mimetype="text/plain; charset=utf-8", as_attachment=True, download_name=requested_name)
+        try:
+            sources, exports = expand_uploads(files, request_exports_dir())
+        except ValueError as e:
+            return str(e), 400
+
+        # the whole conversion uses the rules active now, even if they are reloaded meanwhile
+        rules = RULES.current()
+        profile = RequestProfile("convert").start() if profile_requested() else None
+        progress = ConversionProgress(files_total=len(sources))
+        started = time.perf_counter()
+        # parse up front so parse errors still return a 500, then stream the merge
+        try:
+            runs = parse_uploads(sources, progress, out_format, started, profile, resume, rules,
+                                 keep_dropped=dropped)
+        except Exception:
+            if exports is not None:
+                exports.close()
+            raise
+        body = iter_conversion_output(runs, progress, started, out_format=out_format, profile=profile,
+                                      previous=previous, exports=exports,
+                                      sources=[upload_name(s, exports) for s in sources], dropped=dropped)
+        headers = attachment_headers(requested_name)
+        headers[CHECKPOINT_HEADER] = conversion_checkpoint(runs, resume)
+        if resume is not None and resume.dedupe_partial:
+            headers[DEDUPE_HEADER] = "partial"
+        headers[RULES_HEADER] = rules.id
+        if profile is not None:
+            headers[PROFILE_HEADER] = profile.name
+        if progress.files_skipped:
+            headers[SKIPPED_FILES_HEADER] = str(progress.files_skipped)
+        mimetype = "application/x-ndjson" if out_format == "ndjson" else "text/plain; charset=utf-8"
+        return Response(body, mimetype=mimetype, headers=headers)
 
     except Exception as e:
         tb = traceback.format_exc()
@@ -579,35 +1856,169 @@ def convert_zip():
 
         zip_basename = requested_name[:-4] if requested_name.lower().endswith(".txt") else requested_name
 
-        tmpdir = tempfile.mkdtemp()
+        encryption = (request.form.get("encryption") or ENCRYPTION_ZIPCRYPTO).lower()
+        if encryption not in ZIP_ENCRYPTIONS:
+            return "unsupported encryption", 400
+        if password and encryption == ENCRYPTION_AES and not aes_available():
+            return "AES encryption is not available on this server", 400
+
         try:
-            txt_path = os.path.join(tmpdir, requested_name)
-            merged_text, earliest = process_and_merge_files(files)
-            with open(txt_path, "w", encoding="utf-8") as wf:
-                wf.write(merged_text)
-            zip_path = os.path.join(tmpdir, zip_basename + ".zip")
-            pyminizip.compress(txt_path, None, zip_path, password, 5)
-            with open(zip_path, "rb") as zf:
-                data = zf.read()
-            bio = io.BytesIO(data)
-            bio.seek(0)
-            shutil.rmtree(tmpdir)
-            return send_file(bio, mimetype="application/zip", as_attachment=True, download_name=zip_basename + ".zip")
+            resume, previous = request_resume()
+        except ValueError as e:
+            return str(e), 400
+
+        try:
+            sources, exports = expand_uploads(files, request_exports_dir())
+        except ValueError as e:
+            return str(e), 400
+        keep_media = False
+        if exports is not None:
+            keep_media = exports.passthrough = media_requested()
+
+        # the whole conversion uses the rules active now, even if they are reloaded meanwhile
+        rules = RULES.current()
+        profile = RequestProfile("convert_zip").start() if profile_requested() else None
+        progress = ConversionProgress(files_total=len(sources))
+        started = time.perf_counter()
+        # the archive is built from the merged line stream straight into the
+        # response: one compressed chunk in memory at a time, attachments
+        # copied from the uploaded export after the TXT
+        try:
+            runs = parse_uploads(sources, progress, "zip", started, profile, resume, rules, keep_media)
         except Exception:
+            if exports is not None:
+                exports.close()
+            raise
+        body = iter_conversion_output(runs, progress, started, out_format="zip",
+                                      txt_name=requested_name, password=password,
+                                      encryption=encryption, profile=profile, previous=previous,
+                                      exports=exports)
+        headers = attachment_headers(zip_basename + ".zip")
+        headers[CHECKPOINT_HEADER] = conversion_checkpoint(runs, resume)
+        if resume is not None and resume.dedupe_partial:
+            headers[DEDUPE_HEADER] = "partial"
+        headers[RULES_HEADER] = rules.id
+        if profile is not None:
+            headers[PROFILE_HEADER] = profile.name
+        if progress.files_skipped:
+            headers[SKIPPED_FILES_HEADER] = str(progress.files_skipped)
+        return Response(body, mimetype="application/zip", headers=headers)
+
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(tb, file=sys.stderr)
+        return jsonify({"error": str(e), "trace": tb}), 500
+
+
+def busy_response(message, retry_after=JOB_RETRY_AFTER):
+    resp = jsonify({"error": message})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    try:
+        files = request.files.getlist("file")
+        if not files or len(files) == 0:
+            return "file not found", 400
+
+        out_format = (request.form.get("format") or "txt").lower()
+        if out_format not in ("txt", "zip"):
+            return "unsupported format", 400
+
+        requested_name = sanitize_filename(request.form.get("filename", "converted_whatsapp.txt"))
+        if not requested_name.lower().endswith(".txt"):
+            requested_name += ".txt"
+        options = {"format": out_format, "txt_name": requested_name, "rules": RULES.current()}
+
+        if out_format == "zip":
+            encryption = (request.form.get("encryption") or ENCRYPTION_ZIPCRYPTO).lower()
+            if encryption not in ZIP_ENCRYPTIONS:
+                return "unsupported encryption", 400
+            password = request.form.get("password", "")
+            if password and encryption == ENCRYPTION_AES and not aes_available():
+                return "AES encryption is not available on this server", 400
+            options.update(password=password, encryption=encryption, media=media_requested())
+            result_name, mimetype = requested_name[:-4] + ".zip", "application/zip"
+        else:
+            result_name, mimetype = requested_name, "text/plain; charset=utf-8"
+        token = request.form.get("checkpoint")
+        if token:
             try:
-                shutil.rmtree(tmpdir)
-            except:
-                pass
+                Checkpoint.from_token(token)
+            except ValueError as e:
+                return str(e), 400
+            options["checkpoint"] = token
+        if profile_requested():
+            options["profile"] = RequestProfile("job")
+
+        try:
+            workdir = JOB_MANAGER.new_workdir()
+        except JobQueueFull:
+            return busy_response("too many conversions in progress, try again later")
+
+        try:
+            input_paths = []
+            for i, f in enumerate(files):
+                path = os.path.join(workdir, "input_%03d.%s" % (i, "zip" if is_zip_upload(f) else "html"))
+                save_upload(f, path)
+                input_paths.append(path)
+            previous = request.files.get("previous")
+            if previous is not None and previous.filename:
+                options["previous"] = os.path.join(workdir, "previous.txt")
+                save_upload(previous, options["previous"])
+            job = Job(workdir, options, input_paths, result_name, mimetype)
+            job.rules_version = options["rules"].id
+            job = JOB_MANAGER.submit(job)
+        except JobQueueFull:
+            return busy_response("too many conversions in progress, try again later")
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
             raise
 
+        resp = jsonify({
+            "id": job.id,
+            "status": job.status,
+            "status_url": "/jobs/%s" % job.id,
+            "result_url": "/jobs/%s/result" % job.id,
+        })
+        if "profile" in options:
+            resp.headers[PROFILE_HEADER] = options["profile"].name
+        return resp, 202
+
     except Exception as e:
         tb = traceback.format_exc()
         print(tb, file=sys.stderr)
         return jsonify({"error": str(e), "trace": tb}), 500
 
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    if job.status == STATUS_FAILED:
+        return jsonify({"error": job.error}), 500
+    if job.status != STATUS_DONE:
+        return jsonify({"error": "job not finished", "status": job.status}), 409
+    return send_file(job.result_path, mimetype=job.mimetype, as_attachment=True,
+                     download_name=job.result_name)
+
+
 # -----------------------
-# Run
+# Run: development server (CONVERTER_DEBUG=1 turns on the debugger and
+# reloader); production serving is serve.py
 # -----------------------
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=os.environ.get("CONVERTER_DEBUG", "0") not in ("0", "false", "no"),
+            host="0.0.0.0", port=5000)
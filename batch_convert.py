@@ -0,0 +1,266 @@
+# batch_convert.py — convert many Telegram exports offline, without the web app
+#
+#   python batch_convert.py EXPORTS... --out DIR [--format txt|zip|ndjson]
+#                           [--include-dropped]
+#                           [--password PW] [--encryption zipcrypto|aes]
+#                           [--workers N] [--rules FILE] [--force]
+#
+# EXPORTS are export folders, directories holding export folders (searched
+# recursively), messages*.html files or glob patterns of any of these. Every
+# folder (messages.html, messages2.html, ...) is one merge job, converted by
+# the same pipeline as /convert and written to DIR/<folder name>.txt (or
+# .zip, or .ndjson with one JSON record per line; --include-dropped adds the
+# dropped messages with the rule that dropped them). Jobs run in a process
+# pool, one export per process.
+#
+# Progress is kept in DIR/.batch-state.json: a rerun after an interruption
+# skips every job whose output exists and whose inputs (sizes and mtimes),
+# filter rules and ZIP protection (encryption and a hash of the password)
+# are unchanged. Outputs are written to a temp name and renamed when done,
+# so an interrupted job never leaves a truncated file behind.
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import app
+from jobs import ConversionProgress
+from media import page_number
+from result_cache import EntryCache
+from rules import load_rules
+from zipstream import ENCRYPTION_AES, ENCRYPTION_ZIPCRYPTO, aes_available
+
+STATE_FILE = ".batch-state.json"
+
+
+def export_pages(folder):
+    """messages.html, messages2.html, ... of an export folder in page order."""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    pages = [(n, name) for name, n in ((name, page_number(name)) for name in names) if n is not None]
+    return [os.path.join(folder, name) for _, name in sorted(pages)]
+
+
+def find_exports(patterns):
+    """Export folders (absolute, in order of discovery, no repeats) for the given paths/globs."""
+    folders = []
+    seen = set()
+
+    def add(folder):
+        folder = os.path.abspath(folder)
+        if folder not in seen and export_pages(folder):
+            seen.add(folder)
+            folders.append(folder)
+
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                if page_number(os.path.basename(path)) is not None:
+                    add(os.path.dirname(path) or ".")
+            elif os.path.isdir(path):
+                for root, dirs, _ in os.walk(path):
+                    dirs.sort()
+                    add(root)
+    return folders
+
+
+def input_fingerprint(pages):
+    return [[os.path.basename(p), os.path.getsize(p), int(os.path.getmtime(p))] for p in pages]
+
+
+def protection(out_format, password, encryption):
+    """What the state records about a ZIP's protection: (encryption, password hash) or None."""
+    if out_format != "zip" or not password:
+        return None
+    digest = hashlib.sha256(b"batch-convert\x00" + password.encode("utf-8")).hexdigest()
+    return [encryption or ENCRYPTION_ZIPCRYPTO, digest]
+
+
+def output_names(folders, ext):
+    """Output file name per folder: the folder name, made unique."""
+    names = {}
+    taken = set()
+    for folder in folders:
+        base = app.sanitize_filename(os.path.basename(folder.rstrip(os.sep)) or "export")
+        name, n = base + ext, 2
+        while name.lower() in taken:
+            name, n = "%s-%d%s" % (base, n, ext), n + 1
+        taken.add(name.lower())
+        names[folder] = name
+    return names
+
+
+def convert_export(folder, out_path, out_format="txt", password=None, encryption=None, rules=None,
+                   include_dropped=False):
+    """
+    Pool task: merge one export folder into out_path. Returns a summary
+    dict; failures are reported in it instead of raised.
+    """
+    pages = export_pages(folder)
+    started = time.perf_counter()
+    progress = ConversionProgress(files_total=len(pages),
+                                  bytes_total=sum(os.path.getsize(p) for p in pages))
+    if rules is None:
+        rules = app.RULES.current()
+    summary = {"folder": folder, "output": out_path, "files": len(pages),
+               "bytes": progress.bytes_total, "fingerprint": input_fingerprint(pages),
+               "rules_version": rules.id, "include_dropped": include_dropped,
+               "protection": protection(out_format, password, encryption)}
+    tmp = None
+    try:
+        # one export per process: parse its pages serially, no shared cache
+        runs = app.parse_files_to_runs(pages, workers=0, cache=EntryCache(0), progress=progress,
+                                       rules=rules, keep_dropped=include_dropped)
+        txt_name = os.path.splitext(os.path.basename(out_path))[0] + ".txt"
+        chunks = app.iter_conversion_output(
+            runs, progress, started, out_format=out_format, txt_name=txt_name,
+            password=password, encryption=encryption or ENCRYPTION_ZIPCRYPTO,
+            sources=[os.path.basename(p) for p in pages], dropped=include_dropped)
+        tmp = out_path + ".part"
+        with open(tmp, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+        os.replace(tmp, out_path)
+        tmp = None
+        summary["status"] = "done"
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["error"] = "%s: %s" % (type(e).__name__, e)
+    finally:
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+    summary.update(seconds=round(time.perf_counter() - started, 3),
+                   messages=progress.messages_seen, lines=progress.lines_out,
+                   dropped=dict(progress.dropped))
+    return summary
+
+
+class BatchState:
+    """Finished jobs by folder, saved after every job (atomic replace)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                self.jobs = json.load(fh).get("jobs", {})
+        except (OSError, ValueError, AttributeError):
+            self.jobs = {}
+
+    def is_done(self, folder, pages, out_path, rules, include_dropped=False, protected=None):
+        job = self.jobs.get(folder)
+        return (job is not None and job.get("status") == "done" and os.path.exists(out_path)
+                and job.get("output") == out_path and job.get("fingerprint") == input_fingerprint(pages)
+                and job.get("rules_version") == rules.id
+                and job.get("include_dropped", False) == include_dropped
+                and job.get("protection") == protected)
+
+    def record(self, summary):
+        self.jobs[summary["folder"]] = summary
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"jobs": self.jobs}, fh, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def _rate(n, seconds):
+    return n / seconds if seconds > 0 else 0.0
+
+
+def print_job(i, total, s):
+    if s["status"] != "done":
+        print("[%d/%d] FAILED %s: %s" % (i, total, s["folder"], s.get("error")), flush=True)
+        return
+    print("[%d/%d] %s  %d files  %.1f MB  %d msgs -> %d lines  %.2f s  %.0f msgs/s  %.2f MB/s"
+          % (i, total, os.path.basename(s["output"]), s["files"], s["bytes"] / 1e6, s["messages"],
+             s["lines"], s["seconds"], _rate(s["messages"], s["seconds"]),
+             _rate(s["bytes"] / 1e6, s["seconds"])), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Telegram HTML exports to WhatsApp TXT/ZIP in bulk.")
+    parser.add_argument("exports", nargs="+", help="export folders, parent directories, messages*.html or globs")
+    parser.add_argument("--out", required=True, help="output directory (also holds the resume state)")
+    parser.add_argument("--format", choices=("txt", "zip", "ndjson"), default="txt")
+    parser.add_argument("--include-dropped", action="store_true",
+                        help="with --format ndjson: also list dropped messages and their rule")
+    parser.add_argument("--password", default=os.environ.get("CONVERTER_ZIP_PASSWORD"),
+                        help="ZIP password (default: $CONVERTER_ZIP_PASSWORD)")
+    parser.add_argument("--encryption", choices=(ENCRYPTION_ZIPCRYPTO, ENCRYPTION_AES),
+                        default=ENCRYPTION_ZIPCRYPTO)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="exports converted in parallel (default: CPU count)")
+    parser.add_argument("--rules", help="JSON filter rules (default: $CONVERTER_RULES_FILE or built-in)")
+    parser.add_argument("--force", action="store_true", help="convert again even if already done")
+    args = parser.parse_args(argv)
+
+    if args.include_dropped and args.format != "ndjson":
+        parser.error("--include-dropped needs --format ndjson")
+    if args.format == "zip" and args.password and args.encryption == ENCRYPTION_AES and not aes_available():
+        parser.error("AES encryption needs the 'cryptography' package")
+
+    try:
+        rules = load_rules(args.rules) if args.rules else app.RULES.current()
+    except (OSError, ValueError) as e:
+        parser.error("cannot load rules: %s" % e)
+
+    folders = find_exports(args.exports)
+    if not folders:
+        print("no Telegram exports found", file=sys.stderr)
+        return 2
+    os.makedirs(args.out, exist_ok=True)
+    out_dir = os.path.abspath(args.out)
+    state = BatchState(os.path.join(out_dir, STATE_FILE))
+    names = output_names(folders, "." + args.format)
+    protected = protection(args.format, args.password, args.encryption)
+
+    todo = []
+    resumed = 0
+    for folder in folders:
+        out_path = os.path.join(out_dir, names[folder])
+        if not args.force and state.is_done(folder, export_pages(folder), out_path, rules,
+                                            args.include_dropped, protected):
+            resumed += 1
+        else:
+            todo.append((folder, out_path))
+    if resumed:
+        print("%d of %d exports already converted, skipping them" % (resumed, len(folders)))
+
+    wall = time.perf_counter()
+    results = []
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(todo)))) as pool:
+            futures = [pool.submit(convert_export, folder, out_path, args.format, args.password,
+                                   args.encryption, rules, args.include_dropped)
+                       for folder, out_path in todo]
+            for i, fut in enumerate(as_completed(futures), 1):
+                summary = fut.result()
+                results.append(summary)
+                if summary["status"] == "done":
+                    state.record(summary)
+                print_job(i, len(todo), summary)
+    wall = time.perf_counter() - wall
+
+    done = [s for s in results if s["status"] == "done"]
+    failed = len(results) - len(done)
+    messages = sum(s["messages"] for s in done)
+    size = sum(s["bytes"] for s in done)
+    print("\n%d converted, %d failed, %d skipped in %.2f s: %d msgs (%.0f msgs/s), %.1f MB (%.2f MB/s)"
+          % (len(done), failed, resumed, wall, messages, _rate(messages, wall), size / 1e6,
+             _rate(size / 1e6, wall)))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
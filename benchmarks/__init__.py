@@ -0,0 +1,6 @@
+# benchmarks — performance checks for the converter
+#
+#   python -m benchmarks.bench_pipeline      end-to-end, per stage, JSON results
+#   python -m benchmarks.export_generator    synthetic Telegram exports
+#   python benchmarks/bench_timestamps.py    timestamp parse/format micro-benchmark
+#   python -m benchmarks.bench_imports       cold import time per module, first-use cost
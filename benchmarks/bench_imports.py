@@ -0,0 +1,117 @@
+# bench_imports.py — startup cost of the converter and its subsystems
+#
+#   python -m benchmarks.bench_imports [--repeat 5] [--top 15] [--output FILE]
+#                                      [--modules app,rules,...]
+#
+# Every module is imported in a fresh interpreter under `python -X importtime`
+# (repeat times; the median is reported), so each number is a cold import:
+# the module's cumulative time including everything it pulls in that the
+# interpreter had not loaded yet. For app, the heaviest imports below it are
+# listed too, and the modules that are meant to load lazily (bs4,
+# cryptography) are checked to still be absent after `import app`.
+#
+# The first conversion pays for what the import left out; that cost is
+# measured as app.warm_up() in a fresh process, per step.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the web app, then its subsystems roughly in pipeline order
+MODULES = (
+    "app", "flask", "stream_parser", "message_record", "timestamps", "rules", "content_filter",
+    "entry_store", "overlap", "checkpoint", "result_cache", "admission", "media", "zipstream",
+    "jobs", "metrics",
+)
+# imported on first use, never by `import app`
+LAZY_MODULES = ("bs4", "cryptography")
+
+
+def parse_importtime(stderr):
+    """[(depth, self µs, cumulative µs, module)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2][1:]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((depth, int(fields[0]), int(fields[1]), name.strip()))
+    return rows
+
+
+def import_once(module, code=""):
+    """(importtime rows, stdout) of importing module in a fresh interpreter, then running code."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import %s\n%s" % (module, code)],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    return parse_importtime(proc.stderr), proc.stdout
+
+
+def module_time(rows, module):
+    """Cumulative µs of the top-level import of module."""
+    for depth, _, cumulative, name in rows:
+        if depth == 0 and name == module:
+            return cumulative
+    return 0
+
+
+def heaviest(rows, top):
+    """The top modules by self time: [(name, self µs, cumulative µs)]."""
+    return [(name, own, cumulative) for _, own, cumulative, name in
+            sorted(rows, key=lambda r: r[1], reverse=True)[:top]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import time of the converter's modules.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=15, help="heaviest imports listed under app")
+    parser.add_argument("--modules", default=",".join(MODULES), help="comma-separated modules")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    args = parser.parse_args(argv)
+    modules = [m for m in args.modules.split(",") if m]
+
+    result = {"python": sys.version.split()[0], "repeat": args.repeat, "modules": {}}
+    print("%-16s %10s %10s %10s" % ("module", "median ms", "min ms", "max ms"))
+    for module in modules:
+        times = [module_time(import_once(module)[0], module) for _ in range(args.repeat)]
+        result["modules"][module] = {"median_ms": round(statistics.median(times) / 1000, 2),
+                                     "min_ms": round(min(times) / 1000, 2),
+                                     "max_ms": round(max(times) / 1000, 2)}
+        print("%-16s %10.2f %10.2f %10.2f" % (module, statistics.median(times) / 1000,
+                                              min(times) / 1000, max(times) / 1000))
+
+    check = "import sys, json\nprint(json.dumps([m for m in %r if m in sys.modules]))" % (LAZY_MODULES,)
+    rows, out = import_once("app", check)
+    loaded = json.loads(out)
+    result["app_heaviest"] = [{"module": name, "self_ms": round(own / 1000, 2),
+                               "cumulative_ms": round(cumulative / 1000, 2)}
+                              for name, own, cumulative in heaviest(rows, args.top)]
+    result["lazy_loaded_by_import"] = loaded
+    print("\nheaviest imports under app (self ms / cumulative ms):")
+    for name, own, cumulative in heaviest(rows, args.top):
+        print("  %-40s %8.2f %10.2f" % (name, own / 1000, cumulative / 1000))
+    print("lazy modules loaded by `import app`: %s" % (", ".join(loaded) or "none"))
+
+    warm = []
+    for _ in range(args.repeat):
+        warm.append(json.loads(import_once("app", "import json\nprint(json.dumps(app.warm_up()))")[1]))
+    steps = {step: round(statistics.median(w[step] for w in warm) * 1000, 2) for step in warm[0]}
+    result["warm_up_ms"] = steps
+    print("first-use cost (app.warm_up(), median ms): %s, total %.2f"
+          % (", ".join("%s %.2f" % kv for kv in steps.items()), sum(steps.values())))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+    return 1 if loaded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
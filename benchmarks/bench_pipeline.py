@@ -0,0 +1,261 @@
+# bench_pipeline.py — end-to-end conversion benchmark with a per-stage breakdown
+#
+#   python -m benchmarks.bench_pipeline [--sizes 10k,100k,1m] [--files 3]
+#                                       [--output results.json] [--compare old.json]
+#
+# For every size a synthetic export (benchmarks/export_generator.py) is
+# written to a scratch directory and converted in a fresh interpreter, so
+# peak RSS is per size. Stages:
+#
+#   parse   HTML tokenizing and message tree building (stream_parser)
+#   filter  date/sender/bot/spam rules and line formatting
+#   sort    per-file sort and the k-way merge
+#   encode  joining lines into UTF-8 response chunks
+#   zip     deflate (+ ZipCrypto with --zip-password) of the encoded text
+#
+# The parse/filter split comes from timing the message iterator that feeds
+# parse_messages_to_store. Memory is reported as the EntryStore bytes of all
+# runs next to what the same lines cost as the old (datetime, line) tuple
+# lists. Results are written as JSON; --compare prints the change against an
+# earlier results file.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.export_generator import add_mix_arguments, mix_from_args, write_exports  # noqa: E402
+
+STAGES = ("parse", "filter", "sort", "encode", "zip")
+# a size is reported as a regression when its msgs/s drops by more than this
+REGRESSION_THRESHOLD = 0.10
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    mult = 1
+    if text.endswith("k"):
+        mult, text = 1000, text[:-1]
+    elif text.endswith("m"):
+        mult, text = 1000000, text[:-1]
+    return int(float(text) * mult)
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class TimedIterator:
+    """Wraps an iterator and adds the time spent producing items to .elapsed."""
+
+    def __init__(self, it):
+        self._it = iter(it)
+        self.elapsed = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._it)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+
+def tuple_entries_bytes(store):
+    """Size of the store's rows as a list of (datetime, line) tuples, built one at a time."""
+    size = sys.getsizeof([None] * len(store))
+    for dt, line in store.iter_entries():
+        size += sys.getsizeof((dt, line)) + sys.getsizeof(dt) + sys.getsizeof(line)
+    return size
+
+
+def measure(paths, zip_password=None):
+    """Convert `paths` once, stage by stage, in this process. Returns a result dict."""
+    import app
+    from jobs import ConversionProgress
+    from stream_parser import iter_message_elements
+    from zipstream import iter_zip_single
+
+    rss_start = peak_rss_bytes()
+    seconds = dict.fromkeys(STAGES, 0.0)
+    progress = ConversionProgress(files_total=len(paths),
+                                  bytes_total=sum(os.path.getsize(p) for p in paths))
+    wall = time.perf_counter()
+
+    runs = []
+    for path in paths:
+        fallback_dt = datetime.datetime.now()
+        with open(path, "rb") as fh:
+            messages = TimedIterator(iter_message_elements(fh, chunk_size=app.STREAM_CHUNK_SIZE))
+            start = time.perf_counter()
+            store = app.parse_messages_to_store(messages, fallback_dt, progress=progress)
+            elapsed = time.perf_counter() - start
+        seconds["parse"] += messages.elapsed
+        seconds["filter"] += elapsed - messages.elapsed
+
+        start = time.perf_counter()
+        store.sort()
+        seconds["sort"] += time.perf_counter() - start
+        runs.append(store)
+        progress.files_parsed += 1
+
+    start = time.perf_counter()
+    lines = list(app.iter_merged_lines(runs))
+    seconds["sort"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = list(app.iter_encoded_chunks(lines))
+    seconds["encode"] += time.perf_counter() - start
+    output_bytes = sum(len(c) for c in chunks)
+
+    start = time.perf_counter()
+    zip_bytes = 0
+    for part in iter_zip_single("chat.txt", chunks, password=zip_password):
+        zip_bytes += len(part)
+    seconds["zip"] += time.perf_counter() - start
+
+    total = time.perf_counter() - wall
+    store_bytes = sum(run.nbytes for run in runs)
+    tuple_bytes = sum(tuple_entries_bytes(run) for run in runs)
+    seconds = {k: round(v, 4) for k, v in seconds.items()}
+    seconds["total"] = round(total, 4)
+    input_bytes = progress.bytes_total
+    return {
+        "files": len(paths),
+        "input_bytes": input_bytes,
+        "messages_seen": progress.messages_seen,
+        "messages_kept": progress.messages_kept,
+        "output_lines": len(lines),
+        "output_bytes": output_bytes,
+        "zip_bytes": zip_bytes,
+        "seconds": seconds,
+        "messages_per_s": round(progress.messages_seen / total, 1) if total else None,
+        "mb_per_s": round(input_bytes / total / 1e6, 2) if total else None,
+        "store_bytes": store_bytes,
+        "tuple_entries_bytes": tuple_bytes,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "rss_after_import_bytes": rss_start,
+    }
+
+
+def measure_in_subprocess(paths, zip_password=None):
+    cmd = [sys.executable, "-m", "benchmarks.bench_pipeline", "--measure", *paths]
+    if zip_password:
+        cmd += ["--zip-password", zip_password]
+    out = subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(r):
+    s = r["seconds"]
+    print("%9d msgs  %7.1f MB  %8.2f s  %10.0f msgs/s  %6.2f MB/s  peak %6.0f MB"
+          % (r["messages"], r["input_bytes"] / 1e6, s["total"], r["messages_per_s"],
+             r["mb_per_s"], (r["peak_rss_bytes"] or 0) / 1e6))
+    print("                 " + "  ".join("%s %.2fs" % (k, s[k]) for k in STAGES))
+    if r.get("store_bytes"):
+        print("                 entries %.1f MB (as tuples %.1f MB, %.1fx)"
+              % (r["store_bytes"] / 1e6, r["tuple_entries_bytes"] / 1e6,
+                 r["tuple_entries_bytes"] / r["store_bytes"]))
+
+
+def compare(results, old_path):
+    with open(old_path, "r", encoding="utf-8") as fh:
+        old = {r["messages"]: r for r in json.load(fh)["results"]}
+    print("\ncompared with %s" % old_path)
+    regressions = 0
+    for r in results:
+        prev = old.get(r["messages"])
+        if prev is None:
+            continue
+        change = r["messages_per_s"] / prev["messages_per_s"] - 1
+        flag = ""
+        if change < -REGRESSION_THRESHOLD:
+            flag = "  <-- regression"
+            regressions += 1
+        stages = "  ".join("%s %+.0f%%" % (k, 100 * (r["seconds"][k] / prev["seconds"][k] - 1))
+                           for k in STAGES if prev["seconds"].get(k))
+        print("%9d msgs  msgs/s %+6.1f%%  rss %+6.1f%%%s\n                 %s"
+              % (r["messages"], 100 * change,
+                 100 * ((r["peak_rss_bytes"] or 0) / (prev["peak_rss_bytes"] or 1) - 1), flag, stages))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Telegram -> WhatsApp conversion.")
+    parser.add_argument("--sizes", default="10k,100k,1m", help="message counts, e.g. 10k,100k,1m")
+    parser.add_argument("--zip-password", default=None, help="also time ZipCrypto encryption")
+    parser.add_argument("--workdir", default=None, help="where exports are generated (default: temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated exports")
+    parser.add_argument("--output", default=None, help="results JSON (default: bench-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--measure", nargs="+", default=None, help=argparse.SUPPRESS)
+    add_mix_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, zip_password=args.zip_password)))
+        return 0
+
+    mix = mix_from_args(args)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="converter-bench-")
+    results = []
+    try:
+        for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            export_dir = os.path.join(workdir, "export-%d" % size)
+            paths = write_exports(export_dir, size, files=args.files, seed=args.seed, **mix)
+            result = {"messages": size}
+            result.update(measure_in_subprocess(paths, zip_password=args.zip_password))
+            results.append(result)
+            print_result(result)
+            if not args.keep:
+                shutil.rmtree(export_dir, ignore_errors=True)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": dict(mix, files=args.files, seed=args.seed, zip_password=bool(args.zip_password)),
+        "results": results,
+    }
+    output = args.output or "bench-%s.json" % datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print("results written to %s" % output)
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# bench_timestamps.py — strptime/strftime vs timestamps.py fast paths
+#
+#   python benchmarks/bench_timestamps.py [N]
+#
+# Parses N Telegram date titles (plus a share of fallback-format texts) and
+# formats the WhatsApp prefix for each, once with the old strptime/strftime
+# code and once with timestamps.py.
+
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timestamps import format_prefix, parse_telegram_datetime  # noqa: E402
+
+
+def legacy_parse(t):
+    if not t:
+        return None
+    try:
+        parts = t.split(" UTC")[0]
+        return datetime.datetime.strptime(parts, "%d.%m.%Y %H:%M:%S")
+    except Exception:
+        try:
+            return datetime.datetime.strptime(t.strip(), "%m/%d/%y, %I:%M %p")
+        except Exception:
+            return None
+
+
+def legacy_fmt(dt):
+    return dt.strftime("%m/%d/%y, %I:%M %p")
+
+
+def make_titles(n, seed=0):
+    rnd = random.Random(seed)
+    dt = datetime.datetime(2025, 1, 1, 8, 0, 0)
+    titles = []
+    for _ in range(n):
+        dt += datetime.timedelta(seconds=rnd.choice([0, 4, 20, 61, 300]))
+        if rnd.random() < 0.05:
+            titles.append(dt.strftime("%m/%d/%y, %I:%M %p"))
+        else:
+            titles.append(dt.strftime("%d.%m.%Y %H:%M:%S") + " UTC+07:00")
+    return titles
+
+
+def run(label, parse, fmt, titles):
+    start = time.perf_counter()
+    out = 0
+    for t in titles:
+        dt = parse(t)
+        if dt is not None:
+            out += len(fmt(dt))
+    elapsed = time.perf_counter() - start
+    print("%-12s %8.3f s  %10.0f titles/s" % (label, elapsed, len(titles) / elapsed))
+    return elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    titles = make_titles(n)
+
+    # same wall-clock results as the legacy path
+    for t in titles[:5000]:
+        a = legacy_parse(t)
+        b = parse_telegram_datetime(t)
+        assert a == (b.replace(tzinfo=None) if b else b), t
+        assert legacy_fmt(a) == format_prefix(b), t
+
+    old = run("strptime", legacy_parse, legacy_fmt, titles)
+    new = run("timestamps", parse_telegram_datetime, format_prefix, titles)
+    print("speedup      %8.1fx" % (old / new))
+
+
+if __name__ == "__main__":
+    main()
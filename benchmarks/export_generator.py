@@ -0,0 +1,251 @@
+# export_generator.py — deterministic synthetic Telegram HTML exports
+#
+#   python -m benchmarks.export_generator OUT_DIR --messages 100000 --files 3
+#
+# Produces exports shaped like Telegram Desktop's "messages.html": a service
+# date line per day, then one .message.default block per message with the
+# same markup Telegram emits (userpic, .date title with UTC offset,
+# .from_name, .text with <br>, .media_wrap, .reply_to, bot buttons, and
+# "joined" follow-ups without a .from_name). The same arguments and seed
+# always give byte-identical files.
+
+import argparse
+import datetime
+import html
+import os
+import random
+
+START = datetime.datetime(2024, 1, 1, 8, 0, 0)
+UTC_OFFSET = "+07:00"
+
+FIRST_NAMES = [
+    "Andi", "Budi", "Citra", "Dewi", "Eko", "Fajar", "Gita", "Hana", "Indra", "Joko",
+    "Kiki", "Lala", "Mira", "Nanda", "Oki", "Putri", "Rina", "Sari", "Tono", "Wati",
+]
+LAST_NAMES = [
+    "Saputra", "Wijaya", "Lestari", "Pratama", "Hidayat", "Nugroho", "Kurniawan",
+    "Santoso", "Permata", "Utami",
+]
+# decorations the name cleanup has to strip
+NAME_DECORATIONS = ["", "", "", "", " 🔥", " | Admin", " [Me]", " (Store)", " ⭐", "​"]
+BOT_SENDERS = ["Rose Helper", "Group Help Bot", "Uxuy Agent"]
+
+WORDS = (
+    "aku kamu dia kita mereka sudah belum nanti besok kemarin makan minum kerja "
+    "rumah kantor jalan macet hujan panas dingin kopi teh nasi goreng mantap "
+    "oke sip siap terima kasih tolong bisa tidak mau lagi dong sih kok ya "
+    "the meeting is moved see you later thanks for sharing good morning night "
+    "photo video link file update project deadline done"
+).split()
+
+SPAM_TEMPLATES = [
+    "up",
+    "PING!!",
+    "PROMO VPS murah {n}k garansi 1 bulan",
+    "jual akun premium {n}rb",
+    "{n} ip {d} hari ready",
+    "proxy residential ready, port {n}, masa aktif {d} hari",
+    "cek www.promo{n}.com sekarang",
+    "MURAH BANGET HARI INI SAJA",
+    "wkwkwkwkwkwk",
+    "kenapa????",
+    "🔥 diskon {n}% 🔥",
+    "speed download {n} mbps ubuntu server rdp",
+]
+
+BOT_BLOCKS = [
+    '   <table class="bot_buttons_table"><tr><td class="bot_button_row"><div class="bot_button"><div>Claim</div></div></td></tr></table>',
+    '   <div class="text"><a href="" onclick="return ShowBotCommand(&quot;start&quot;)">/start</a></div>',
+    '   <div class="bot_inline_keyboard"><div class="bot_button">Join now</div></div>',
+]
+
+HEADER = """<!DOCTYPE html>
+<html>
+ <head>
+  <meta charset="utf-8"/>
+<title>Exported Data</title>
+  <meta content="width=device-width, initial-scale=1.0" name="viewport"/>
+  <link href="css/style.css" rel="stylesheet"/>
+ </head>
+ <body onload="CheckLocation();">
+  <div class="page_wrap">
+   <div class="page_header">
+    <div class="content">
+     <div class="text bold">Benchmark Group</div>
+    </div>
+   </div>
+   <div class="page_body chat_page">
+    <div class="history">
+"""
+
+FOOTER = """    </div>
+   </div>
+  </div>
+ </body>
+</html>
+"""
+
+
+def make_senders(count, rnd):
+    names = []
+    for i in range(count):
+        base = "%s %s" % (FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)])
+        if i >= len(FIRST_NAMES) * len(LAST_NAMES):
+            base += " %d" % i
+        names.append(base + rnd.choice(NAME_DECORATIONS))
+    return names
+
+
+def _sentence(rnd, lo=2, hi=14):
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(lo, hi)))
+
+
+def _text_body(rnd):
+    lines = [_sentence(rnd) for _ in range(1 if rnd.random() < 0.8 else rnd.randint(2, 4))]
+    return "<br>".join(html.escape(line) for line in lines)
+
+
+def _spam_body(rnd):
+    tpl = rnd.choice(SPAM_TEMPLATES)
+    return html.escape(tpl.format(n=rnd.randint(1, 500), d=rnd.choice([7, 30, 90])))
+
+
+def render_message(msg_id, dt, sender, body, joined=False, media=False, reply_to=None, bot_block=None):
+    cls = "message default clearfix joined" if joined else "message default clearfix"
+    parts = ['     <div class="%s" id="message%d">' % (cls, msg_id)]
+    if not joined:
+        parts.append('      <div class="pull_left userpic_wrap">\n'
+                     '       <div class="userpic userpic%d" style="width: 42px; height: 42px">\n'
+                     '        <div class="initials" style="line-height: 42px">%s</div>\n'
+                     '       </div>\n'
+                     '      </div>' % (msg_id % 8 + 1, html.escape(sender[:1])))
+    parts.append('      <div class="body">')
+    parts.append('       <div class="pull_right date details" title="%s UTC%s">\n%s\n       </div>'
+                 % (dt.strftime("%d.%m.%Y %H:%M:%S"), UTC_OFFSET, dt.strftime("%H:%M")))
+    if not joined:
+        parts.append('       <div class="from_name">\n%s\n       </div>' % html.escape(sender))
+    if reply_to is not None:
+        parts.append('       <div class="reply_to details">\nIn reply to <a href="#go_to_message%d" '
+                     'onclick="return GoToMessage(%d)">this message</a>\n       </div>' % (reply_to, reply_to))
+    if media:
+        parts.append('       <div class="media_wrap clearfix">\n'
+                     '        <a class="photo_wrap clearfix pull_left" href="photos/photo_%d@%s.jpg">\n'
+                     '         <img class="photo" src="photos/photo_%d@%s_thumb.jpg" style="width: 260px; height: 195px"/>\n'
+                     '        </a>\n'
+                     '       </div>' % (msg_id, dt.strftime("%d-%m-%Y_%H-%M-%S"), msg_id, dt.strftime("%d-%m-%Y_%H-%M-%S")))
+    if body:
+        parts.append('       <div class="text">\n%s\n       </div>' % body)
+    if bot_block is not None:
+        parts.append(bot_block)
+    parts.append('      </div>')
+    parts.append('     </div>')
+    return "\n".join(parts) + "\n"
+
+
+def render_service_date(msg_id, dt):
+    return ('     <div class="message service" id="message-%d">\n'
+            '      <div class="body details">\n%s\n      </div>\n'
+            '     </div>\n' % (msg_id, dt.strftime("%d %B %Y")))
+
+
+def iter_messages(messages, senders=50, media=0.05, bot=0.02, spam=0.1, joined=0.2,
+                  reply=0.05, seed=0):
+    """
+    Yield (msg_id, dt, sender, body, is_joined, has_media, reply_to, bot_block)
+    in time order. Fractions are per-message probabilities; `joined` is the
+    share of messages that continue the previous sender's run.
+    """
+    rnd = random.Random(seed)
+    names = make_senders(max(1, senders), rnd)
+    dt = START
+    last_sender = None
+    for msg_id in range(1, messages + 1):
+        dt += datetime.timedelta(seconds=rnd.choice((0, 2, 5, 15, 40, 90, 300, 1200)))
+        is_joined = last_sender is not None and rnd.random() < joined
+        bot_block = None
+        if is_joined:
+            sender = last_sender
+        elif rnd.random() < bot:
+            sender = rnd.choice(BOT_SENDERS)
+            bot_block = rnd.choice(BOT_BLOCKS)
+        else:
+            sender = rnd.choice(names)
+        has_media = rnd.random() < media
+        if rnd.random() < spam:
+            body = _spam_body(rnd)
+        elif has_media and rnd.random() < 0.5:
+            body = None
+        else:
+            body = _text_body(rnd)
+        reply_to = msg_id - rnd.randint(1, 20) if msg_id > 20 and rnd.random() < reply else None
+        last_sender = sender
+        yield msg_id, dt, sender, body, is_joined, has_media, reply_to, bot_block
+
+
+def write_exports(out_dir, messages, files=1, seed=0, **mix):
+    """
+    Write `messages` messages spread over `files` exports in out_dir and
+    return their paths. Messages are dealt to files at random, so every file
+    covers the whole time range and the merge has real interleaving work.
+    mix: senders, media, bot, spam, joined, reply (see iter_messages).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = max(1, files)
+    paths = [os.path.join(out_dir, "messages%s.html" % ("" if i == 0 else i + 1)) for i in range(files)]
+    handles = [open(p, "w", encoding="utf-8", newline="\n") for p in paths]
+    try:
+        for fh in handles:
+            fh.write(HEADER)
+        pick = random.Random(seed + 1)
+        last_sender = [None] * files
+        last_day = [None] * files
+        for msg_id, dt, sender, body, is_joined, has_media, reply_to, bot_block in iter_messages(
+                messages, seed=seed, **mix):
+            i = pick.randrange(files)
+            if last_day[i] != dt.date():
+                handles[i].write(render_service_date(msg_id, dt))
+                last_day[i] = dt.date()
+                last_sender[i] = None
+            # Telegram only joins messages that follow the same sender in the same file
+            joined_here = is_joined and last_sender[i] == sender
+            handles[i].write(render_message(msg_id, dt, sender, body, joined=joined_here,
+                                            media=has_media, reply_to=reply_to, bot_block=bot_block))
+            last_sender[i] = sender
+        for fh in handles:
+            fh.write(FOOTER)
+    finally:
+        for fh in handles:
+            fh.close()
+    return paths
+
+
+def add_mix_arguments(parser):
+    parser.add_argument("--senders", type=int, default=50, help="distinct senders (default 50)")
+    parser.add_argument("--files", type=int, default=1, help="exports to split the messages over")
+    parser.add_argument("--media", type=float, default=0.05, help="share of media messages")
+    parser.add_argument("--bot", type=float, default=0.02, help="share of bot messages with buttons")
+    parser.add_argument("--spam", type=float, default=0.1, help="share of spam/promo texts")
+    parser.add_argument("--joined", type=float, default=0.2, help="share of joined follow-up messages")
+    parser.add_argument("--reply", type=float, default=0.05, help="share of replies")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def mix_from_args(args):
+    return {"senders": args.senders, "media": args.media, "bot": args.bot,
+            "spam": args.spam, "joined": args.joined, "reply": args.reply}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic Telegram HTML exports.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--messages", type=int, default=10000)
+    add_mix_arguments(parser)
+    args = parser.parse_args(argv)
+    paths = write_exports(args.out_dir, args.messages, files=args.files, seed=args.seed,
+                          **mix_from_args(args))
+    for p in paths:
+        print("%s  %d bytes" % (p, os.path.getsize(p)))
+
+
+if __name__ == "__main__":
+    main()
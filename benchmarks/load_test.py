@@ -0,0 +1,248 @@
+# load_test.py — concurrent upload load test against the HTTP server
+#
+#   python -m benchmarks.load_test [--url http://host:port] [--endpoint /convert]
+#                                  [--concurrency 8] [--requests 200 | --duration 30]
+#                                  [--messages 2000] [--files 2] [--server-args "..."]
+#
+# A synthetic export (benchmarks/export_generator.py) is generated once and
+# POSTed as a multipart upload by `concurrency` client threads, each request
+# on a fresh connection, until `requests` have completed or `duration`
+# seconds have passed. --endpoint / does plain GETs of the index page (with
+# gzip and If-None-Match when --revalidate is given) instead.
+#
+# Without --url, serve.py is started on a free local port (extra options via
+# --server-args), and stopped with SIGTERM at the end so the drain is timed
+# too. Reported: requests/s, upload MB/s, latency p50/p90/p99/max and status
+# counts; --output writes them as JSON.
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.export_generator import add_mix_arguments, mix_from_args, write_exports  # noqa: E402
+
+
+def multipart_body(paths, fields=None):
+    """(content type, body bytes) of a form with every path as a "file" part."""
+    boundary = "----load-test-%s" % uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                      % (boundary, name, value)).encode("utf-8"))
+    for path in paths:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        parts.append(('--%s\r\nContent-Disposition: form-data; name="file"; filename="%s"\r\n'
+                      'Content-Type: text/html\r\n\r\n' % (boundary, os.path.basename(path))).encode("utf-8"))
+        parts.append(data + b"\r\n")
+    parts.append(("--%s--\r\n" % boundary).encode("ascii"))
+    return "multipart/form-data; boundary=%s" % boundary, b"".join(parts)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class LoadRun:
+    def __init__(self, host, port, method, path, body=b"", headers=None, timeout=600.0):
+        self.host, self.port = host, port
+        self.method, self.path = method, path
+        self.body = body
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.latencies = []
+        self.statuses = {}
+        self.bytes_out = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def one(self):
+        start = time.perf_counter()
+        status = None
+        received = 0
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.request(self.method, self.path, body=self.body or None, headers=self.headers)
+            resp = conn.getresponse()
+            while True:
+                chunk = resp.read(64 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+            status = resp.status
+            conn.close()
+        except (OSError, http.client.HTTPException):
+            pass
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if status is None:
+                self.errors += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                self.latencies.append(elapsed)
+                self.bytes_out += received
+
+    def run(self, concurrency, requests=None, duration=None):
+        issued = [0]
+        stop_at = time.monotonic() + duration if duration else None
+        lock = threading.Lock()
+
+        def client():
+            while True:
+                with lock:
+                    if requests is not None and issued[0] >= requests:
+                        return
+                    if stop_at is not None and time.monotonic() >= stop_at:
+                        return
+                    issued[0] += 1
+                self.one()
+
+        wall = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - wall
+
+
+def report(run, wall, concurrency):
+    lat = sorted(run.latencies)
+    done = len(lat)
+    ms = lambda v: round(v * 1000, 1) if v is not None else None  # noqa: E731
+    return {
+        "concurrency": concurrency,
+        "requests": done,
+        "errors": run.errors,
+        "statuses": {str(k): v for k, v in sorted(run.statuses.items())},
+        "seconds": round(wall, 3),
+        "requests_per_s": round(done / wall, 2) if wall else None,
+        "upload_mb_per_s": round(done * len(run.body) / wall / 1e6, 2) if wall else None,
+        "response_bytes": run.bytes_out,
+        "latency_ms": {"p50": ms(percentile(lat, 50)), "p90": ms(percentile(lat, 90)),
+                       "p99": ms(percentile(lat, 99)), "max": ms(lat[-1] if lat else None)},
+    }
+
+
+def print_report(r):
+    lat = r["latency_ms"]
+    print("%d requests in %.2f s at concurrency %d: %.1f req/s, %.2f MB/s uploaded"
+          % (r["requests"], r["seconds"], r["concurrency"], r["requests_per_s"] or 0,
+             r["upload_mb_per_s"] or 0))
+    print("latency ms  p50 %s  p90 %s  p99 %s  max %s" % (lat["p50"], lat["p90"], lat["p99"], lat["max"]))
+    print("statuses %s  errors %d" % (r["statuses"], r["errors"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the converter over HTTP.")
+    parser.add_argument("--url", default=None, help="server to test (default: start serve.py locally)")
+    parser.add_argument("--endpoint", default="/convert", help="/convert, /convert_zip, /jobs or /")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=None, help="requests to send (default 200)")
+    parser.add_argument("--duration", type=float, default=None, help="run for this many seconds instead")
+    parser.add_argument("--messages", type=int, default=2000, help="messages in the uploaded export")
+    parser.add_argument("--password", default=None, help="ZIP password for /convert_zip")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="with --endpoint /: send If-None-Match and Accept-Encoding: gzip")
+    parser.add_argument("--server-args", default="", help="extra serve.py options for the local server")
+    parser.add_argument("--output", default=None, help="write the results as JSON")
+    add_mix_arguments(parser)
+    args = parser.parse_args(argv)
+    requests = args.requests if args.requests is not None or args.duration else 200
+
+    workdir = tempfile.mkdtemp(prefix="converter-load-")
+    server = None
+    try:
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = "127.0.0.1", free_port()
+            cmd = [sys.executable, os.path.join(ROOT, "serve.py"), "--host", host, "--port", str(port)]
+            server = subprocess.Popen(cmd + args.server_args.split(), cwd=ROOT)
+            if not wait_until_up(host, port):
+                print("server did not come up", file=sys.stderr)
+                return 2
+
+        if args.endpoint == "/":
+            headers = {}
+            if args.revalidate:
+                conn = http.client.HTTPConnection(host, port, timeout=10)
+                conn.request("GET", "/", headers={"Accept-Encoding": "gzip"})
+                resp = conn.getresponse()
+                resp.read()
+                headers = {"Accept-Encoding": "gzip", "If-None-Match": resp.getheader("ETag") or ""}
+                conn.close()
+            run = LoadRun(host, port, "GET", "/", headers=headers)
+        else:
+            paths = write_exports(os.path.join(workdir, "export"), args.messages, files=args.files,
+                                  seed=args.seed, **mix_from_args(args))
+            fields = {}
+            if args.endpoint == "/convert_zip" and args.password:
+                fields["password"] = args.password
+            content_type, body = multipart_body(paths, fields)
+            run = LoadRun(host, port, "POST", args.endpoint, body=body,
+                          headers={"Content-Type": content_type})
+
+        wall = run.run(args.concurrency, requests=requests, duration=args.duration)
+        result = report(run, wall, args.concurrency)
+        print_report(result)
+
+        if server is not None:
+            start = time.perf_counter()
+            server.send_signal(signal.SIGTERM)
+            result["server_exit"] = server.wait(timeout=120)
+            result["drain_seconds"] = round(time.perf_counter() - start, 3)
+            server = None
+            print("server stopped in %.2f s (exit %d)" % (result["drain_seconds"], result["server_exit"]))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as fh:
+                json.dump(result, fh, indent=2)
+        return 0 if not result["errors"] else 1
+    finally:
+        if server is not None:
+            server.kill()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+# checkpoint.py — where a conversion stopped, so the next one can append
+#
+# Group exports grow every day and re-converting the whole history each time
+# parses the same messages again. A Checkpoint holds the parser state at the
+# end of a conversion:
+#
+#   - the boundary: highest message id and latest instant (or, when the
+#     checkpoint was rebuilt from a previously produced TXT, which has
+#     neither, the latest wall-clock minute)
+#   - the sender a leading "joined" message continues
+#   - the consecutive-sender counter
+#   - digests of the (sender key, content) pairs already written, for the
+#     per-sender dedupe
+#
+# The converter hands the state of every run back as a compact token
+# ("cp1." + base64url(zlib(...))). Sent with the next, larger export, the
+# token lets the parser skip the old part of the file before tokenizing it
+# and continue the counter and dedupe across the boundary. A token only
+# carries the most recent dedupe digests; rebuilding the checkpoint from the
+# previous TXT (from_txt) restores all of them. A token that carried a full
+# window of digests may have lost older ones: its checkpoint has
+# dedupe_partial set, and the converter says so in the response, because a
+# line repeating one of the lost digests is kept where a full conversion
+# drops it.
+
+import base64
+import datetime
+import hashlib
+import itertools
+import json
+import re
+import zlib
+from collections import deque
+
+from timestamps import parse_telegram_datetime
+
+TOKEN_PREFIX = "cp1."
+DIGEST_SIZE = 8
+# dedupe digests carried from one token to the next
+DEFAULT_RECENT = 256
+# tokens are sent back by clients; refuse anything unreasonably large
+MAX_TOKEN_CHARS = 64 * 1024
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_US = datetime.timedelta(microseconds=1)
+
+# a line written by the converter: "MM/DD/YY, HH:MM AM - Name: content"
+_TXT_LINE_RE = re.compile(r"^(\d\d/\d\d/\d\d, \d\d:\d\d [AP]M) - (.*?): (.*)$")
+# start of a message block in the raw export, and the date title after it
+_MESSAGE_RE = re.compile(
+    rb'<div class="message\b([^"]*)" id="message(-?\d+)"|\bclass="[^"]*\bdate\b[^"]*" title="([^"]*)"')
+
+
+def seen_digest(key, content):
+    return hashlib.blake2b(("%s\x00%s" % (key, content)).encode("utf-8"),
+                           digest_size=DIGEST_SIZE).digest()
+
+
+def instant_us(dt):
+    return (dt - _EPOCH) // _US
+
+
+def message_id(msg):
+    """Telegram message id from the element's id="message123" attribute, or None."""
+    value = msg.get("id")
+    if value and value.startswith("message"):
+        try:
+            return int(value[7:])
+        except ValueError:
+            return None
+    return None
+
+
+class Checkpoint:
+    """
+    Parser state at the end of a conversion (see module comment).
+
+    last_id      highest message id parsed, None when unknown
+    last_ts      latest message instant in µs since the epoch (UTC), None when unknown
+    last_wall    latest wall-clock minute (naive datetime), for checkpoints from a TXT
+    last_sender  raw sender name a following "joined" message continues
+    run_key      normalized sender of the current consecutive run, run_count its length
+    seen         digests written before this conversion (read-only, shared by copies)
+    recent       digests of the latest lines, oldest first; what a token carries on
+    dedupe_partial  seen may lack digests of older lines (loaded from a token alone)
+    """
+
+    def __init__(self, recent_max=DEFAULT_RECENT):
+        self.last_id = None
+        self.last_ts = None
+        self.last_wall = None
+        self.last_sender = None
+        self.run_key = None
+        self.run_count = 0
+        self.seen = frozenset()
+        self.recent = deque(maxlen=recent_max)
+        self.dedupe_partial = False
+        # identifies what the checkpoint was loaded from (cache keys); None when built here
+        self.fingerprint = None
+
+    def __repr__(self):
+        return "Checkpoint(id=%r, ts=%r, wall=%r, sender=%r, run=%r/%d, seen=%d)" % (
+            self.last_id, self.last_ts, self.last_wall, self.last_sender, self.run_key,
+            self.run_count, len(self.seen))
+
+    @property
+    def has_boundary(self):
+        return self.last_id is not None or self.last_ts is not None or self.last_wall is not None
+
+    def resume(self):
+        """Copy to continue from: same boundary and counter, every known digest in seen."""
+        cp = Checkpoint(self.recent.maxlen)
+        cp.last_id = self.last_id
+        cp.last_ts = self.last_ts
+        cp.last_wall = self.last_wall
+        cp.last_sender = self.last_sender
+        cp.run_key = self.run_key
+        cp.run_count = self.run_count
+        cp.seen = self.seen if self.seen.issuperset(self.recent) else self.seen.union(self.recent)
+        cp.recent.extend(self.recent)
+        cp.dedupe_partial = self.dedupe_partial
+        cp.fingerprint = self.fingerprint
+        return cp
+
+    # -- boundary tests --
+    def is_old_id(self, msg_id):
+        """True/False when the id decides it, None when there is no id to compare."""
+        if msg_id is None or self.last_id is None:
+            return None
+        return msg_id <= self.last_id
+
+    def is_old_time(self, dt):
+        """
+        True when dt is before the boundary. Messages at the boundary
+        instant (or minute, for a TXT checkpoint) are not old; the dedupe
+        digests decide about them.
+        """
+        if self.last_ts is not None and dt.tzinfo is not None:
+            return instant_us(dt) < self.last_ts
+        if self.last_wall is not None:
+            return dt.replace(tzinfo=None, second=0, microsecond=0) < self.last_wall
+        return False
+
+    def was_seen(self, digest):
+        return digest in self.seen
+
+    # -- updates while parsing --
+    def note_message(self, msg_id, dt):
+        if msg_id is not None and (self.last_id is None or msg_id > self.last_id):
+            self.last_id = msg_id
+        if dt.tzinfo is not None:
+            ts = instant_us(dt)
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+        wall = dt.replace(tzinfo=None, second=0, microsecond=0)
+        if self.last_wall is None or wall > self.last_wall:
+            self.last_wall = wall
+
+    # -- several runs into one --
+    @classmethod
+    def combine(cls, checkpoints):
+        """End state of a merge: the latest boundary; sender and counter of the run ending last."""
+        checkpoints = [cp for cp in checkpoints if cp is not None]
+        out = cls(max((cp.recent.maxlen for cp in checkpoints), default=DEFAULT_RECENT))
+        last = None
+        recent = {}  # ordered set: runs resumed from one token share its digests
+        for cp in sorted(checkpoints, key=lambda c: (c.last_ts is not None, c.last_ts or 0)):
+            if cp.last_id is not None and (out.last_id is None or cp.last_id > out.last_id):
+                out.last_id = cp.last_id
+            if cp.last_wall is not None and (out.last_wall is None or cp.last_wall > out.last_wall):
+                out.last_wall = cp.last_wall
+            recent.update(dict.fromkeys(cp.recent))
+            last = cp
+        out.recent.extend(recent)
+        if last is not None:
+            out.last_ts = last.last_ts
+            out.last_sender = last.last_sender
+            out.run_key = last.run_key
+            out.run_count = last.run_count
+        return out
+
+    # -- token --
+    def to_token(self):
+        header = {
+            "id": self.last_id,
+            "ts": self.last_ts,
+            "wall": self.last_wall.isoformat() if self.last_wall is not None else None,
+            "sender": self.last_sender,
+            "run": [self.run_key, self.run_count],
+        }
+        payload = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        payload += b"\n" + b"".join(self.recent)
+        return TOKEN_PREFIX + base64.urlsafe_b64encode(zlib.compress(payload, 9)).decode("ascii").rstrip("=")
+
+    @classmethod
+    def from_token(cls, token, recent_max=DEFAULT_RECENT):
+        """Raises ValueError for anything that is not a token written by to_token()."""
+        token = (token or "").strip()
+        if not token.startswith(TOKEN_PREFIX) or len(token) > MAX_TOKEN_CHARS:
+            raise ValueError("not a checkpoint token")
+        body = token[len(TOKEN_PREFIX):]
+        try:
+            payload = zlib.decompress(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+            header, _, digests = payload.partition(b"\n")
+            header = json.loads(header.decode("utf-8"))
+            cp = cls(recent_max)
+            cp.last_id = None if header["id"] is None else int(header["id"])
+            cp.last_ts = None if header["ts"] is None else int(header["ts"])
+            if header["wall"] is not None:
+                cp.last_wall = datetime.datetime.fromisoformat(header["wall"])
+            cp.last_sender = header["sender"]
+            cp.run_key, cp.run_count = header["run"][0], int(header["run"][1])
+        except (zlib.error, ValueError, KeyError, TypeError, IndexError, UnicodeDecodeError) as e:
+            raise ValueError("corrupt checkpoint token") from e
+        if len(digests) % DIGEST_SIZE:
+            raise ValueError("corrupt checkpoint token")
+        cp.recent.extend(digests[i:i + DIGEST_SIZE] for i in range(0, len(digests), DIGEST_SIZE))
+        # fewer digests than the window holds: every line so far is in it
+        cp.dedupe_partial = len(cp.recent) >= cp.recent.maxlen
+        cp.fingerprint = "t" + hashlib.sha1(token.encode("ascii")).hexdigest()
+        return cp
+
+    # -- from a previously produced TXT --
+    @classmethod
+    def from_txt(cls, lines, resolve_sender, recent_max=DEFAULT_RECENT):
+        """
+        Rebuild the state from the lines of a TXT this converter wrote.
+        resolve_sender(name) -> (display name, key, ...) like app.resolve_sender;
+        the display names in the TXT resolve to the same keys. The TXT has
+        no ids and no UTC offsets, so the boundary is its last minute, and
+        the counter only sees kept messages (lines of one message share a
+        minute and count once).
+        """
+        cp = cls(recent_max)
+        seen = set()
+        fingerprint = hashlib.sha1()
+        prev_prefix = prev_key = None
+        for line in lines:
+            fingerprint.update(line.encode("utf-8"))
+            m = _TXT_LINE_RE.match(line.rstrip("\r\n"))
+            if m is None:
+                continue
+            prefix, name, content = m.groups()
+            sender = resolve_sender(name)
+            key = sender[1]
+            digest = seen_digest(key, content)
+            seen.add(digest)
+            cp.recent.append(digest)
+            wall = parse_telegram_datetime(prefix)
+            if wall is not None and (cp.last_wall is None or wall > cp.last_wall):
+                cp.last_wall = wall
+            if key != cp.run_key:
+                cp.run_key, cp.run_count = key, 1
+            elif (prefix, key) != (prev_prefix, prev_key):
+                cp.run_count += 1
+            cp.last_sender = name
+            prev_prefix, prev_key = prefix, key
+        cp.seen = frozenset(seen)
+        cp.fingerprint = "x" + fingerprint.hexdigest()
+        return cp
+
+
+def find_resume_offset(chunks, checkpoint):
+    """
+    Scan a raw export for the first message that is not before the
+    checkpoint. Returns (header_end, resume_at): byte offsets of the first
+    message block and of that message, or None when nothing can be skipped.
+    Messages are siblings in the export, so parsing the header followed by
+    data[resume_at:] gives the same elements as parsing all of it and
+    dropping the old ones. resume_at is len(data) when every message is old.
+    """
+    header_end = None
+    pending = None   # (offset, id) of a message waiting for its date title
+    base = 0
+    carry = b""
+    for chunk in itertools.chain(chunks, (None,)):
+        if chunk is None:
+            buf = carry   # end of input: scan what is left
+            cut = len(buf)
+        else:
+            buf = carry + chunk
+            # matches never span a tag: keep the last, maybe unfinished, tag for the next chunk
+            # (all of buf while that tag is the only one in it)
+            cut = buf.rfind(b"<")
+            if cut < 0:
+                cut = len(buf)
+        for m in _MESSAGE_RE.finditer(buf, 0, cut):
+            if m.group(2) is not None:
+                if header_end is None:
+                    header_end = base + m.start()
+                if b"default" not in m.group(1).split():
+                    continue   # service message (date separator)
+                start, msg_id = base + m.start(), int(m.group(2))
+                old = checkpoint.is_old_id(msg_id)
+                if old is False:
+                    return _resume(header_end, start)
+                pending = None if old else (start, msg_id)
+            elif pending is not None:
+                dt = parse_telegram_datetime(m.group(3).decode("utf-8", "replace"))
+                if dt is not None and not checkpoint.is_old_time(dt):
+                    return _resume(header_end, pending[0])
+                pending = None
+        base += cut
+        carry = buf[cut:]
+    if header_end is None:
+        return None
+    return _resume(header_end, pending[0] if pending is not None else base)
+
+
+def _resume(header_end, resume_at):
+    if resume_at <= header_end:
+        return None
+    return header_end, resume_at
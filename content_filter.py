@@ -0,0 +1,273 @@
+# content_filter.py — precompiled per-line content filter
+#
+# The per-line spam rules used to be a chain of separate `any(k in lc ...)`
+# scans and regex searches. ContentFilter compiles all of them once into
+# two alternation regexes (one over the lowercased line, one over the line
+# as written, because a few rules look at the original casing) and returns
+# the id of the rule that rejected the line, or None when the line is kept.
+#
+# check_many() does the same for a batch of lines: the run rules (repeated
+# characters, punctuation runs) are found by one regex scan over the whole
+# batch, and the caps ratio of ASCII lines is counted with two bytes
+# translations of the batch instead of a per-character loop. spam_mask() is
+# the batched form of the per-line spam check the chain ended with;
+# tests/test_content_filter.py keeps that check as legacy_is_spam_like().
+
+import re
+from bisect import bisect_right
+
+# rule ids, in the order the old if-chain checked them
+RULE_BOT_PHRASE = "bot_phrase"
+RULE_SINGLE_WORD = "single_word"
+RULE_SHORT = "short"
+RULE_BULLET = "bullet"
+RULE_PRICE = "price"
+RULE_IP_COUNT = "ip_count"
+RULE_CATALOG = "catalog"
+RULE_DURATION = "duration"
+RULE_RDP = "rdp"
+RULE_LINK = "link"
+RULE_PROMO = "promo"
+RULE_PROMO_EMOJI = "promo_emoji"
+RULE_SPAM_REPEAT = "spam_repeat"
+RULE_SPAM_PUNCT = "spam_punct"
+RULE_SPAM_CAPS = "spam_caps"
+RULE_SPAM_LENGTH = "spam_length"
+
+ALL_RULES = (
+    RULE_BOT_PHRASE, RULE_SINGLE_WORD, RULE_SHORT, RULE_BULLET, RULE_PRICE,
+    RULE_IP_COUNT, RULE_CATALOG, RULE_DURATION, RULE_RDP, RULE_LINK,
+    RULE_PROMO, RULE_PROMO_EMOJI, RULE_SPAM_REPEAT, RULE_SPAM_PUNCT,
+    RULE_SPAM_CAPS, RULE_SPAM_LENGTH,
+)
+
+BULLET_PATTERN = r"\A\s*[-•*]\s+"
+SPAM_REPEAT_PATTERN = r"(?P<_rep>.)(?P=_rep){4,}"
+SPAM_PUNCT_PATTERN = r"(?P<_punct>[!?.,])(?P=_punct){3,}"
+SPAM_MAX_LEN = 350
+SPAM_CAPS_RATIO = 0.6
+
+_SPAM_REPEAT_RE = re.compile(r"(.)\1{4,}")
+_SPAM_PUNCT_RE = re.compile(r"([!?.,])\1{3,}")
+_ASCII_LETTERS = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+# bytes.translate delete sets: everything but the letters (or capitals), and "\n"
+_DELETE_NON_LETTERS = bytes(b for b in range(128) if b not in _ASCII_LETTERS and b != 10)
+_DELETE_NON_CAPITALS = bytes(b for b in range(128) if not (65 <= b <= 90) and b != 10)
+
+
+def first_match_starts(regex, texts):
+    """
+    Start of the first match of regex in each text, or -1, from a single
+    scan over the texts joined by "\n". Only valid for patterns whose
+    matches cannot contain "\n" and that use no anchors or lookarounds.
+    """
+    starts = [-1] * len(texts)
+    if not texts:
+        return starts
+    line_starts = []
+    pos = 0
+    for t in texts:
+        line_starts.append(pos)
+        pos += len(t) + 1
+    for m in regex.finditer("\n".join(texts)):
+        i = bisect_right(line_starts, m.start()) - 1
+        if starts[i] < 0:
+            starts[i] = m.start() - line_starts[i]
+    return starts
+
+
+def _caps_heavy(t):
+    letters = [c for c in t if c.isalpha()]
+    if letters:
+        caps = sum(1 for c in letters if c.isupper())
+        return caps > len(letters) * SPAM_CAPS_RATIO
+    return False
+
+
+def caps_flags(texts):
+    """[more than SPAM_CAPS_RATIO of the letters in t are capitals, for t in texts]."""
+    flags = [False] * len(texts)
+    ascii_rows = []
+    for i, t in enumerate(texts):
+        if t.isascii() and "\n" not in t:
+            ascii_rows.append(i)
+        else:
+            flags[i] = _caps_heavy(t)
+    if ascii_rows:
+        blob = "\n".join([texts[i] for i in ascii_rows]).encode("ascii")
+        letters = blob.translate(None, _DELETE_NON_LETTERS).split(b"\n")
+        capitals = blob.translate(None, _DELETE_NON_CAPITALS).split(b"\n")
+        for i, n, caps in zip(ascii_rows, map(len, letters), map(len, capitals)):
+            if n:
+                flags[i] = caps > n * SPAM_CAPS_RATIO
+    return flags
+
+
+def spam_mask(texts):
+    """Per text: repeated characters, punctuation runs, mostly capitals or too long; one pass per batch."""
+    stripped = [t.strip() if t else "" for t in texts]
+    repeats = first_match_starts(_SPAM_REPEAT_RE, [t.lower() for t in stripped])
+    puncts = first_match_starts(_SPAM_PUNCT_RE, stripped)
+    caps = caps_flags(stripped)
+    return [bool(t) and (r >= 0 or p >= 0 or c or len(t) > SPAM_MAX_LEN)
+            for t, r, p, c in zip(stripped, repeats, puncts, caps)]
+
+
+def trie_pattern(words):
+    """
+    Build a regex alternation for literal words, factored as a prefix trie
+    so the regex engine does not retry every keyword at every position.
+    """
+    trie = {}
+    for w in set(words):
+        if not w:
+            continue
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        ends = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if ends else body
+
+    return build(trie)
+
+
+def _inline_flags(pattern):
+    """Wrap a compiled regex's source so it keeps its IGNORECASE flag when embedded."""
+    if pattern.flags & re.IGNORECASE:
+        return "(?i:" + pattern.pattern + ")"
+    return "(?:" + pattern.pattern + ")"
+
+
+class ContentFilter:
+    """
+    Compiled, immutable set of per-line rules.
+
+    check(content) takes one stripped line of message text and returns the
+    rule id that rejects it, or None. The accept/reject decision is the same
+    as the original if-chain; when several rules match, the reported id is
+    the one whose match starts first in the line.
+    """
+    __slots__ = ("single_word_re", "short_whitelist", "_lc_re", "_content_re",
+                 "_lc_words_re", "_content_words_re")
+
+    def __init__(self, bot_phrases, single_word_re, short_whitelist,
+                 price_re, ip_count_re, duration_re, link_re,
+                 catalog_keywords, rdp_keywords, promo_keywords, promo_emoji):
+        self.single_word_re = single_word_re
+        self.short_whitelist = frozenset(short_whitelist)
+
+        # rules that the chain evaluated on the lowercased line
+        lc_groups = [
+            (RULE_BOT_PHRASE, trie_pattern(bot_phrases)),
+            (RULE_PRICE, _inline_flags(price_re)),
+            (RULE_IP_COUNT, _inline_flags(ip_count_re)),
+            (RULE_CATALOG, trie_pattern(catalog_keywords)),
+            (RULE_DURATION, _inline_flags(duration_re)),
+            (RULE_RDP, trie_pattern(rdp_keywords)),
+            (RULE_PROMO, trie_pattern(promo_keywords)),
+            (RULE_SPAM_REPEAT, SPAM_REPEAT_PATTERN),
+        ]
+        # rules that looked at the line as written
+        content_groups = [
+            (RULE_BULLET, BULLET_PATTERN),
+            (RULE_LINK, _inline_flags(link_re)),
+            (RULE_PROMO_EMOJI, trie_pattern(promo_emoji)),
+            (RULE_SPAM_PUNCT, SPAM_PUNCT_PATTERN),
+        ]
+        self._lc_re = self._compile(lc_groups)
+        self._content_re = self._compile(content_groups)
+        # check_many() scans the run rules over the whole batch instead
+        self._lc_words_re = self._compile([g for g in lc_groups if g[0] != RULE_SPAM_REPEAT])
+        self._content_words_re = self._compile([g for g in content_groups if g[0] != RULE_SPAM_PUNCT])
+
+    @staticmethod
+    def _compile(groups):
+        parts = ["(?P<%s>%s)" % (rule, pat) for rule, pat in groups if pat]
+        if not parts:
+            return None
+        return re.compile("|".join(parts))
+
+    def check(self, content):
+        lc = content.lower().strip()
+
+        if self.single_word_re.fullmatch(lc):
+            return RULE_SINGLE_WORD
+        if len(lc) <= 3 and lc not in self.short_whitelist:
+            return RULE_SHORT
+
+        if self._lc_re is not None:
+            m = self._lc_re.search(lc)
+            if m:
+                return m.lastgroup
+        if self._content_re is not None:
+            m = self._content_re.search(content)
+            if m:
+                return m.lastgroup
+
+        t = content.strip()
+        letters = [c for c in t if c.isalpha()]
+        if letters:
+            caps = sum(1 for c in letters if c.isupper())
+            if caps > len(letters) * SPAM_CAPS_RATIO:
+                return RULE_SPAM_CAPS
+        if len(t) > SPAM_MAX_LEN:
+            return RULE_SPAM_LENGTH
+        return None
+
+    def check_many(self, contents):
+        """
+        [check(c) for c in contents], with the run and caps rules evaluated
+        for the whole batch. The run rules are the last group of their
+        regex, so a word rule matching at or before the first run wins, as
+        in check().
+        """
+        lcs = [c.lower().strip() for c in contents]
+        repeats = first_match_starts(_SPAM_REPEAT_RE, lcs)
+        puncts = first_match_starts(_SPAM_PUNCT_RE, contents)
+        stripped = [c.strip() for c in contents]
+        caps = caps_flags(stripped)
+        single_word = self.single_word_re.fullmatch
+        whitelist = self.short_whitelist
+        lc_search = self._lc_words_re.search if self._lc_words_re is not None else None
+        content_search = self._content_words_re.search if self._content_words_re is not None else None
+
+        rules = []
+        for content, lc, rep, punct, heavy, t in zip(contents, lcs, repeats, puncts, caps, stripped):
+            if single_word(lc):
+                rules.append(RULE_SINGLE_WORD)
+                continue
+            if len(lc) <= 3 and lc not in whitelist:
+                rules.append(RULE_SHORT)
+                continue
+            m = lc_search(lc) if lc_search is not None else None
+            if m is not None and (rep < 0 or m.start() <= rep):
+                rules.append(m.lastgroup)
+                continue
+            if rep >= 0:
+                rules.append(RULE_SPAM_REPEAT)
+                continue
+            m = content_search(content) if content_search is not None else None
+            if m is not None and (punct < 0 or m.start() <= punct):
+                rules.append(m.lastgroup)
+                continue
+            if punct >= 0:
+                rules.append(RULE_SPAM_PUNCT)
+            elif heavy:
+                rules.append(RULE_SPAM_CAPS)
+            elif len(t) > SPAM_MAX_LEN:
+                rules.append(RULE_SPAM_LENGTH)
+            else:
+                rules.append(None)
+        return rules
+
+    def accepts(self, content):
+        return self.check(content) is None
@@ -0,0 +1,277 @@
+# entry_store.py — columnar storage for parsed chat lines
+#
+# A (datetime, "MM/DD/YY, HH:MM AM - Name: text") tuple per kept line costs
+# a few hundred bytes of object overhead before the text itself, which adds
+# up to gigabytes for multi-million line merges. EntryStore keeps one row per
+# line in typed arrays instead:
+#
+#   ts       array('q')  UTC instant in microseconds (the sort key)
+#   tzoff    array('i')  UTC offset in seconds, for the wall-clock prefix
+#   sender   array('I')  index into the interned sender table
+#   offset   array('q')  start of the content in the shared UTF-8 buffer
+#   length   array('I')  content length in bytes
+#   media    array('B')  1 when the content stands for an attachment
+#                        (media.MEDIA_OMITTED or a media.media_ref())
+#
+# and formats the output line only when it is written. DroppedStore keeps
+# the messages the parser dropped the same way, with the rule of each.
+
+import datetime
+import json
+import struct
+from array import array
+
+from checkpoint import Checkpoint
+from timestamps import format_prefix_wall
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+_US = datetime.timedelta(microseconds=1)
+
+_MAGIC = b"ESTORE2\n"
+_COLUMNS = ("ts", "tzoff", "sender", "offset", "length", "media")
+_TYPECODES = {"ts": "q", "tzoff": "i", "sender": "I", "offset": "q", "length": "I", "media": "B"}
+
+
+class EntryStore:
+    """
+    Lines of one parsed export. Rows are appended with add() while parsing;
+    sort() orders them by instant (stable). Stores are read-only once they
+    are shared (entry cache, merge).
+    """
+    columns = _COLUMNS
+
+    def __init__(self):
+        self.ts = array("q")
+        self.tzoff = array("i")
+        self.sender = array("I")
+        self.offset = array("q")
+        self.length = array("I")
+        self.media = array("B")
+        self.names = []       # sender id -> display name
+        self.keys = []        # sender id -> normalized counting key
+        self._sender_ids = {}
+        self._buf = bytearray()
+        self._text = None     # bytes, once frozen
+        self._naive = []      # rows added with a naive datetime
+        # checkpoint.Checkpoint: parser state after the last row, when parsed
+        self.checkpoint = None
+        # DroppedStore of what the parser dropped, when it was asked to keep it
+        self.dropped = None
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getstate__(self):
+        self._freeze()
+        return {"columns": {name: getattr(self, name) for name in self.columns},
+                "names": self.names, "keys": self.keys, "text": self._text,
+                "checkpoint": self.checkpoint, "dropped": self.dropped}
+
+    def __setstate__(self, state):
+        self.__init__()
+        for name in self.columns:
+            setattr(self, name, state["columns"][name])
+        self.names = state["names"]
+        self.keys = state["keys"]
+        self._sender_ids = {(n, k): i for i, (n, k) in enumerate(zip(self.names, self.keys))}
+        self._text = state["text"]
+        self._buf = None
+        self.checkpoint = state.get("checkpoint")
+        self.dropped = state.get("dropped")
+
+    # -- building --
+    def sender_id(self, display_name, key):
+        ident = (display_name, key)
+        sid = self._sender_ids.get(ident)
+        if sid is None:
+            sid = self._sender_ids[ident] = len(self.names)
+            self.names.append(display_name)
+            self.keys.append(key)
+        return sid
+
+    def add(self, dt, sid, content, media=False):
+        """
+        Append a row; a naive dt gets its offset later from resolve_naive().
+        media marks content that stands for an attachment, not message text.
+        """
+        off = dt.utcoffset()
+        if off is None:
+            self._naive.append(len(self.ts))
+            self.ts.append((dt - _EPOCH_NAIVE) // _US)
+            self.tzoff.append(0)
+        else:
+            self.ts.append((dt - _EPOCH) // _US)
+            self.tzoff.append(off.days * 86400 + off.seconds)
+        data = content.encode("utf-8")
+        self.sender.append(sid)
+        self.offset.append(len(self._buf))
+        self.length.append(len(data))
+        self.media.append(1 if media else 0)
+        self._buf += data
+
+    def resolve_naive(self, tz):
+        """Give rows added without an offset the timezone tz."""
+        for i in self._naive:
+            wall = _EPOCH_NAIVE + self.ts[i] * _US
+            off = tz.utcoffset(wall)
+            secs = off.days * 86400 + off.seconds
+            self.ts[i] -= secs * 1000000
+            self.tzoff[i] = secs
+        self._naive = []
+
+    @property
+    def has_naive(self):
+        return bool(self._naive)
+
+    def _freeze(self):
+        if self._text is None:
+            self._text = bytes(self._buf)
+            self._buf = None
+
+    def sort(self):
+        """Order rows by instant; equal instants keep their order."""
+        self._freeze()
+        ts = self.ts
+        if all(ts[i] <= ts[i + 1] for i in range(len(ts) - 1)):
+            return
+        order = sorted(range(len(ts)), key=ts.__getitem__)
+        for name in self.columns:
+            col = getattr(self, name)
+            setattr(self, name, array(col.typecode, [col[i] for i in order]))
+
+    # -- reading --
+    def line(self, i):
+        self._freeze()
+        start = self.offset[i]
+        content = self._text[start:start + self.length[i]].decode("utf-8")
+        prefix = format_prefix_wall(self.ts[i] // 1000000 + self.tzoff[i])
+        return "%s - %s: %s" % (prefix, self.names[self.sender[i]], content)
+
+    def iter_lines(self):
+        self._freeze()
+        text, names = self._text, self.names
+        for us, off, sid, start, n in zip(self.ts, self.tzoff, self.sender, self.offset, self.length):
+            yield "%s - %s: %s" % (format_prefix_wall(us // 1000000 + off), names[sid],
+                                   text[start:start + n].decode("utf-8"))
+
+    def iter_keyed_lines(self):
+        """(instant in µs, line) per row, for merging stores."""
+        return zip(self.ts, self.iter_lines())
+
+    def iter_dedupe_rows(self):
+        """(instant in µs, line, sender key, content bytes) per row, for the cross-file dedupe."""
+        self._freeze()
+        text, keys = self._text, self.keys
+        for us, line, sid, start, n in zip(self.ts, self.iter_lines(), self.sender,
+                                           self.offset, self.length):
+            yield us, line, keys[sid], text[start:start + n]
+
+    def iter_rows(self):
+        """(instant in µs, UTC offset in seconds, sender id, content bytes) per row."""
+        self._freeze()
+        text = self._text
+        for us, off, sid, start, n in zip(self.ts, self.tzoff, self.sender, self.offset, self.length):
+            yield us, off, sid, text[start:start + n]
+
+    def datetime_at(self, i):
+        tz = datetime.timezone(datetime.timedelta(seconds=self.tzoff[i]))
+        return (_EPOCH + self.ts[i] * _US).astimezone(tz)
+
+    def iter_entries(self):
+        """(aware datetime, line) per row, like the old entry tuples."""
+        for i, line in enumerate(self.iter_lines()):
+            yield self.datetime_at(i), line
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the store."""
+        self._freeze()
+        size = sum(col.itemsize * len(col) for col in (getattr(self, n) for n in self.columns))
+        size += len(self._text)
+        size += sum(len(n) + len(k) + 120 for n, k in zip(self.names, self.keys))
+        return size
+
+    # -- serialization (entry cache disk tier) --
+    def dump(self, fh):
+        self._freeze()
+        header = json.dumps({
+            "rows": len(self),
+            "names": self.names,
+            "keys": self.keys,
+            "text": len(self._text),
+            "checkpoint": self.checkpoint.to_token() if self.checkpoint is not None else None,
+        }, ensure_ascii=False).encode("utf-8")
+        fh.write(_MAGIC)
+        fh.write(struct.pack("<I", len(header)))
+        fh.write(header)
+        for name in _COLUMNS:
+            fh.write(getattr(self, name).tobytes())
+        fh.write(self._text)
+
+    @classmethod
+    def load(cls, fh):
+        if fh.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError("not an entry store")
+        raw = fh.read(4)
+        if len(raw) != 4:
+            raise ValueError("truncated entry store")
+        (header_len,) = struct.unpack("<I", raw)
+        header = json.loads(fh.read(header_len).decode("utf-8"))
+        rows = header["rows"]
+        columns = {}
+        for name in _COLUMNS:
+            col = array(_TYPECODES[name])
+            data = fh.read(col.itemsize * rows)
+            if len(data) != col.itemsize * rows:
+                raise ValueError("truncated entry store")
+            col.frombytes(data)
+            columns[name] = col
+        text = fh.read(header["text"])
+        if len(text) != header["text"]:
+            raise ValueError("truncated entry store")
+        checkpoint = header.get("checkpoint")
+        store = cls()
+        store.__setstate__({"columns": columns, "names": header["names"],
+                            "keys": header["keys"], "text": text,
+                            "checkpoint": Checkpoint.from_token(checkpoint) if checkpoint else None})
+        return store
+
+
+class DroppedStore(EntryStore):
+    """
+    Messages and lines the parser dropped: an EntryStore with one more
+    column, the rule that dropped the row (index into rule_names). Not
+    cached, so it has no dump()/load() of its own.
+    """
+    columns = _COLUMNS + ("rule",)
+
+    def __init__(self):
+        super().__init__()
+        self.rule = array("H")
+        self.rule_names = []
+        self._rule_ids = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["rule_names"] = self.rule_names
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.rule_names = state["rule_names"]
+        self._rule_ids = {name: i for i, name in enumerate(self.rule_names)}
+
+    def add(self, dt, sid, content, rule=None, media=False):
+        rid = self._rule_ids.get(rule)
+        if rid is None:
+            rid = self._rule_ids[rule] = len(self.rule_names)
+            self.rule_names.append(rule)
+        super().add(dt, sid, content, media)
+        self.rule.append(rid)
+
+    def iter_rows(self):
+        """(instant in µs, UTC offset in seconds, sender id, content bytes, rule) per row."""
+        names = self.rule_names
+        for (us, off, sid, content), rid in zip(super().iter_rows(), self.rule):
+            yield us, off, sid, content, names[rid]
@@ -0,0 +1,222 @@
+# jobs.py — background conversion jobs
+#
+# Large merges take minutes; holding a Flask worker and the browser's fetch
+# for that long runs into proxy timeouts. A job is submitted with its uploads
+# already spooled to a private directory, runs on a small bounded thread
+# pool, reports progress while it runs and leaves its result on disk until
+# the TTL expires.
+
+import os
+import shutil
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import StageClock
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised by JobManager.submit() when max_pending jobs are queued or running, or while draining."""
+
+
+class ConversionProgress:
+    """
+    Counters updated by the parser while a conversion runs (single writer).
+    dropped counts messages (or text lines, for content rules) per rule id;
+    files_skipped counts uploads left out because another upload contains them;
+    clock (metrics.StageClock) collects time per pipeline stage.
+    """
+    __slots__ = ("stage", "files_total", "files_parsed", "files_skipped", "bytes_total",
+                 "bytes_parsed", "messages_seen", "messages_kept", "lines_out", "dropped", "clock")
+
+    def __init__(self, files_total=0, bytes_total=0):
+        self.stage = STATUS_QUEUED
+        self.files_total = files_total
+        self.files_parsed = 0
+        self.files_skipped = 0
+        self.bytes_total = bytes_total
+        self.bytes_parsed = 0
+        self.messages_seen = 0
+        self.messages_kept = 0
+        self.lines_out = 0
+        self.dropped = {}
+        self.clock = StageClock()
+
+    def drop(self, rule, n=1):
+        self.dropped[rule] = self.dropped.get(rule, 0) + n
+
+    def absorb(self, other):
+        """Add the message counters and stage times of a file parsed in a worker."""
+        self.messages_seen += other.messages_seen
+        self.messages_kept += other.messages_kept
+        for rule, n in other.dropped.items():
+            self.drop(rule, n)
+        self.clock.add(other.clock.totals)
+
+    def to_dict(self):
+        d = {name: getattr(self, name) for name in self.__slots__ if name != "clock"}
+        d["dropped"] = dict(self.dropped)
+        d["stage_seconds"] = {k: round(v, 4) for k, v in self.clock.totals.items()}
+        return d
+
+
+class Job:
+    def __init__(self, workdir, options, input_paths, result_name, mimetype):
+        self.id = os.path.basename(workdir)
+        self.workdir = workdir
+        self.options = options
+        self.input_paths = input_paths
+        self.result_name = result_name
+        self.result_path = os.path.join(workdir, "result")
+        self.mimetype = mimetype
+        self.status = STATUS_QUEUED
+        self.error = None
+        # checkpoint token for continuing after this conversion, once parsed
+        self.checkpoint = None
+        # continued from a token whose dedupe digests may be incomplete
+        self.dedupe_partial = False
+        # id of the rules.RuleSet the job filters with, fixed at submission
+        self.rules_version = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = ConversionProgress(
+            files_total=len(input_paths),
+            bytes_total=sum(os.path.getsize(p) for p in input_paths))
+
+    def eta_seconds(self):
+        p = self.progress
+        if self.status != STATUS_RUNNING or not self.started or not p.bytes_parsed:
+            return None
+        if p.bytes_parsed >= p.bytes_total:
+            return None
+        elapsed = time.time() - self.started
+        return round(elapsed * (p.bytes_total - p.bytes_parsed) / p.bytes_parsed, 1)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "eta_seconds": self.eta_seconds(),
+            "result_name": self.result_name,
+            "checkpoint": self.checkpoint,
+            "dedupe_partial": self.dedupe_partial,
+            "rules_version": self.rules_version,
+            "progress": self.progress.to_dict(),
+        }
+
+
+class JobManager:
+    """
+    Bounded job runner. run_job(job) does the work and writes job.result_path;
+    at most max_workers jobs run at once and at most max_pending are queued or
+    running. Finished jobs (and their files) are dropped ttl seconds after
+    they finish.
+    """
+
+    def __init__(self, run_job, base_dir, max_workers=2, max_pending=8, ttl=3600):
+        self.run_job = run_job
+        self.base_dir = base_dir
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._draining = False
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="convert-job")
+        return self._executor
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status in (STATUS_QUEUED, STATUS_RUNNING))
+
+    def new_workdir(self):
+        """Reserve a directory for the uploads of a job that is about to be submitted."""
+        self.cleanup()
+        if self._draining or self.pending_count() >= self.max_pending:
+            raise JobQueueFull()
+        os.makedirs(self.base_dir, exist_ok=True)
+        workdir = os.path.join(self.base_dir, uuid.uuid4().hex)
+        os.mkdir(workdir)
+        return workdir
+
+    def submit(self, job):
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in (STATUS_QUEUED, STATUS_RUNNING))
+            if self._draining or pending >= self.max_pending:
+                shutil.rmtree(job.workdir, ignore_errors=True)
+                raise JobQueueFull()
+            self._jobs[job.id] = job
+        self._get_executor().submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.status = STATUS_RUNNING
+        job.started = time.time()
+        try:
+            self.run_job(job)
+        except Exception as e:
+            # the status only carries the message; the traceback goes to the log
+            print("job %s failed:\n%s" % (job.id, traceback.format_exc()), file=sys.stderr)
+            job.error = str(e)
+            job.status = STATUS_FAILED
+        else:
+            job.status = STATUS_DONE
+            job.progress.stage = STATUS_DONE
+        finally:
+            job.finished = time.time()
+            # uploads are not needed once the job is over
+            for p in job.input_paths:
+                try:
+                    os.unlink(p)
+                except OSError:
+                    pass
+
+    def get(self, job_id):
+        self.cleanup()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cleanup(self):
+        now = time.time()
+        with self._lock:
+            expired = [j for j in self._jobs.values()
+                       if j.finished is not None and now - j.finished > self.ttl]
+            for j in expired:
+                del self._jobs[j.id]
+        for j in expired:
+            shutil.rmtree(j.workdir, ignore_errors=True)
+
+    def drain(self, timeout):
+        """
+        Stop taking jobs and wait up to timeout seconds for the queued and
+        running ones to finish. True when none is left.
+        """
+        self._draining = True
+        deadline = time.monotonic() + timeout
+        while self.pending_count():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
@@ -0,0 +1,306 @@
+# media.py — export folders uploaded as a zip, and their attachments
+#
+# A Telegram export keeps the attachments next to messages.html, in
+# photos/, video_files/, voice_messages/, files/, stickers/ ...; a message's
+# .media_wrap links to its file ("photos/photo_3@03-06-2025_19-12-00.jpg"),
+# or has no link when media were not exported. Uploading the whole folder as
+# a zip gives the converter both:
+#
+# - ExportArchive finds the chat pages (messages.html, messages2.html, ...)
+#   in the archive; they are extracted to temp files and parsed like
+#   uploaded pages.
+# - With media passthrough, the parser stores a media line as a reference
+#   (media_ref(): day of the message and link) instead of "<Media omitted>".
+#   While the TXT is written, MediaLibrary gives every referenced file a
+#   WhatsApp name with a per-day counter in chat order (IMG-20250603-WA0000.jpg)
+#   and rewrites the line to "IMG-20250603-WA0000.jpg (file attached)"; after
+#   the TXT, the files are copied from the upload into the output ZIP one
+#   chunk at a time. Formats that are already compressed (images, video,
+#   audio, archives) are stored, not deflated again. Identical files are
+#   stored once: the input archive's size and CRC-32 pick out candidates
+#   and SHA-256 of the content decides. A link to a file missing from the
+#   upload stays "<Media omitted>", and so does a link to a new file once
+#   the attachments stored so far reach the library's max_bytes.
+
+import datetime
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+import zipfile
+from collections import namedtuple
+from urllib.parse import unquote
+
+MEDIA_OMITTED = "<Media omitted>"
+# content of a media line that keeps its attachment: MEDIA_REF + "YYYYMMDD:" + link
+MEDIA_REF = "\x00media:"
+ATTACHED_SUFFIX = " (file attached)"
+COPY_CHUNK_SIZE = 1 << 20
+
+_PAGE_RE = re.compile(r"^messages(\d*)\.html$", re.IGNORECASE)
+_ZIP_MAGIC = b"PK\x03\x04"
+
+# WhatsApp file name prefix by export folder, then by extension
+_FOLDER_PREFIX = {
+    "photos": "IMG", "video_files": "VID", "round_video_messages": "VID",
+    "voice_messages": "PTT", "audio_files": "AUD", "stickers": "STK",
+}
+_EXTENSION_PREFIX = {}
+for _prefix, _extensions in (("IMG", ".jpg .jpeg .png .gif .webp .heic .bmp"),
+                             ("VID", ".mp4 .mov .mkv .webm .3gp .avi"),
+                             ("AUD", ".mp3 .m4a .aac .ogg .oga .opus .wav .flac")):
+    _EXTENSION_PREFIX.update(dict.fromkeys(_extensions.split(), _prefix))
+
+# already compressed: deflating them again costs CPU and saves nothing
+STORED_EXTENSIONS = frozenset(
+    ".jpg .jpeg .png .gif .webp .heic .mp4 .mov .mkv .webm .3gp .avi .mp3 .m4a .aac .ogg .oga"
+    " .opus .flac .zip .rar .7z .gz .tgz .bz2 .xz .apk .tgs .docx .xlsx .pptx .epub".split())
+
+
+def page_number(name):
+    """1 for messages.html, n for messages<n>.html, None for other names."""
+    m = _PAGE_RE.match(name)
+    return int(m.group(1) or 1) if m else None
+
+
+def media_ref(dt, link):
+    """Content of a media line that keeps its attachment (see MEDIA_REF)."""
+    return "%s%s:%s" % (MEDIA_REF, dt.strftime("%Y%m%d"), link)
+
+
+def whatsapp_prefix(member_name):
+    parts = member_name.split("/")
+    if len(parts) > 1 and parts[-2] in _FOLDER_PREFIX:
+        return _FOLDER_PREFIX[parts[-2]]
+    return _EXTENSION_PREFIX.get(posixpath.splitext(member_name)[1].lower(), "DOC")
+
+
+def is_zip_upload(upload):
+    """True when an upload (werkzeug FileStorage, binary file or path) is a ZIP archive."""
+    if isinstance(upload, (str, os.PathLike)):
+        try:
+            with open(upload, "rb") as fh:
+                return fh.read(4) == _ZIP_MAGIC
+        except OSError:
+            return False
+    stream = getattr(upload, "stream", upload)
+    try:
+        pos = stream.tell()
+        head = stream.read(4)
+        stream.seek(pos)
+    except (AttributeError, OSError, ValueError):
+        return False
+    return head == _ZIP_MAGIC
+
+
+class ExportArchive:
+    """
+    A ZIP of one or more export folders. pages are the chat pages in page
+    order, folder by folder; find() resolves a page's link to a member.
+    Raises zipfile.BadZipFile for an unreadable archive.
+    """
+
+    def __init__(self, fileobj):
+        self._fh = fileobj
+        self.zip = zipfile.ZipFile(fileobj)
+        members = [info for info in self.zip.infolist() if not info.is_dir()]
+        self._members = {info.filename: info for info in members}
+        pages = []
+        for info in members:
+            folder, base = posixpath.split(info.filename)
+            n = page_number(base)
+            if n is not None:
+                pages.append((folder, n, info))
+        pages.sort(key=lambda p: (p[0], p[1]))
+        self.pages = [info for _, _, info in pages]
+        self.folders = sorted(set(folder for folder, _, _ in pages))
+
+    def extract_pages(self, dest, prefix="page"):
+        """Copy the chat pages to dest/<prefix>_<n>.html; the paths, in page order."""
+        paths = []
+        for n, info in enumerate(self.pages):
+            path = os.path.join(dest, "%s_%03d.html" % (prefix, n))
+            with self.zip.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+            paths.append(path)
+        return paths
+
+    def find(self, link):
+        """ZipInfo of the file a page links to, or None (not in the archive, or not a file link)."""
+        if not link or link.startswith(("#", "/")) or re.match(r"^[A-Za-z][A-Za-z0-9+.-]*:", link):
+            return None
+        for candidate in (link, unquote(link)):
+            for folder in self.folders:
+                name = posixpath.normpath(posixpath.join(folder, candidate))
+                info = self._members.get(name)
+                if info is not None:
+                    return info
+        return None
+
+    def iter_member(self, info):
+        with self.zip.open(info) as fh:
+            while True:
+                chunk = fh.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def digest(self, info):
+        h = hashlib.sha256()
+        for chunk in self.iter_member(info):
+            h.update(chunk)
+        return h.digest()
+
+    def close(self):
+        self.zip.close()
+        close = getattr(self._fh, "close", None)
+        if close is not None:
+            close()
+
+
+MediaFile = namedtuple("MediaFile", ["name", "archive", "info"])
+
+
+class MediaLibrary:
+    """
+    Attachments referenced by one conversion, named in chat order as the
+    TXT is written (rewrite_lines) and copied into the ZIP afterwards
+    (iter_zip_entries). max_bytes caps the attachment bytes stored
+    (0 = no limit); set it before the first line is rewritten.
+    """
+
+    def __init__(self, archives, max_bytes=0):
+        self.archives = archives
+        self.max_bytes = max_bytes
+        self.files = []       # MediaFile per stored attachment
+        self.bytes = 0        # their uncompressed size
+        self.duplicates = 0   # links to a file identical to one already stored
+        self.missing = 0      # links to files that are not in the upload
+        self.over_budget = 0  # links to files left out because of max_bytes
+        self._by_member = {}  # (archive index, member name) -> output name
+        self._by_crc = {}     # (size, CRC-32) -> indexes into files
+        self._digests = {}    # (archive index, member name) -> SHA-256
+        self._day_counts = {}
+
+    def _digest(self, archive_index, info):
+        member = (archive_index, info.filename)
+        digest = self._digests.get(member)
+        if digest is None:
+            digest = self._digests[member] = self.archives[archive_index].digest(info)
+        return digest
+
+    def attachment_name(self, day, link):
+        """Output name of the file linked from a message of day ("YYYYMMDD"), or None."""
+        for archive_index, archive in enumerate(self.archives):
+            info = archive.find(link)
+            if info is not None:
+                break
+        else:
+            self.missing += 1
+            return None
+        member = (archive_index, info.filename)
+        name = self._by_member.get(member)
+        if name is not None:
+            return name
+
+        same_crc = self._by_crc.setdefault((info.file_size, info.CRC), [])
+        if same_crc:
+            digest = self._digest(archive_index, info)
+            for i in same_crc:
+                f = self.files[i]
+                if self._digest(f.archive, f.info) == digest:
+                    self.duplicates += 1
+                    self._by_member[member] = f.name
+                    return f.name
+
+        if self.max_bytes > 0 and self.bytes + info.file_size > self.max_bytes:
+            self.over_budget += 1
+            return None
+        n = self._day_counts.get(day, 0)
+        self._day_counts[day] = n + 1
+        name = "%s-%s-WA%04d%s" % (whatsapp_prefix(info.filename), day, n,
+                                   posixpath.splitext(info.filename)[1].lower())
+        same_crc.append(len(self.files))
+        self.files.append(MediaFile(name, archive_index, info))
+        self.bytes += info.file_size
+        self._by_member[member] = name
+        return name
+
+    def rewrite_lines(self, lines):
+        """Output lines with every media reference replaced by its attachment name."""
+        for line in lines:
+            i = line.find(MEDIA_REF)
+            if i < 0:
+                yield line
+                continue
+            day, _, link = line[i + len(MEDIA_REF):].partition(":")
+            name = self.attachment_name(day, link)
+            yield line[:i] + (name + ATTACHED_SUFFIX if name is not None else MEDIA_OMITTED)
+
+    def iter_zip_entries(self, wrap_chunks=None):
+        """
+        zipstream.iter_zip_entries() entries for the attachments named so
+        far; wrap_chunks, when given, wraps each file's chunk iterator.
+        """
+        for f in self.files:
+            chunks = self.archives[f.archive].iter_member(f.info)
+            if wrap_chunks is not None:
+                chunks = wrap_chunks(chunks)
+            stored = posixpath.splitext(f.name)[1] in STORED_EXTENSIONS
+            yield f.name, chunks, not stored, datetime.datetime(*f.info.date_time)
+
+    def stats(self):
+        return {"files": len(self.files), "bytes": self.bytes, "duplicates": self.duplicates,
+                "missing": self.missing, "over_budget": self.over_budget}
+
+
+class ExportUploads:
+    """
+    The zip uploads of one conversion: their chat pages extracted under
+    workdir for the parser, the archives kept open for the attachments.
+    passthrough is set by the caller when the output carries the media.
+    page_names maps every extracted page to "<upload name>/<member>".
+    close() closes the archives and removes workdir.
+    """
+
+    def __init__(self, workdir, max_page_bytes=0):
+        self.workdir = workdir
+        self.max_page_bytes = max_page_bytes
+        self.archives = []
+        self.library = MediaLibrary(self.archives)
+        self.passthrough = False
+        self.page_names = {}
+        self._page_bytes = 0
+
+    def add(self, fileobj, name=""):
+        """
+        Open one uploaded archive (taking ownership of fileobj) and extract
+        its pages; their paths. Raises ValueError for an archive that is
+        unreadable, has no chat pages or too many page bytes.
+        """
+        try:
+            archive = ExportArchive(fileobj)
+        except (zipfile.BadZipFile, OSError, ValueError) as e:
+            fileobj.close()
+            raise ValueError("unreadable zip upload: %s" % e) from e
+        self.archives.append(archive)
+        if not archive.pages:
+            raise ValueError("no messages.html found in the zip upload")
+        self._page_bytes += sum(info.file_size for info in archive.pages)
+        if self.max_page_bytes > 0 and self._page_bytes > self.max_page_bytes:
+            raise ValueError("chat pages in the zip uploads exceed %d bytes" % self.max_page_bytes)
+        os.makedirs(self.workdir, exist_ok=True)
+        try:
+            paths = archive.extract_pages(self.workdir, prefix="archive%02d" % (len(self.archives) - 1))
+        except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+            # corrupt members, unsupported compression or encrypted archives
+            raise ValueError("cannot extract the chat pages: %s" % e) from e
+        for path, info in zip(paths, archive.pages):
+            self.page_names[path] = "%s/%s" % (name, info.filename) if name else info.filename
+        return paths
+
+    def close(self):
+        for archive in self.archives:
+            archive.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
@@ -0,0 +1,201 @@
+# message_record.py — everything the filters need from one message, in one walk
+#
+# The converter used to query every message element with up to nine
+# select_one()/find() calls (.date, .from_name, .media_wrap, .text and the
+# bot markers), each of them re-parsing its selector and walking the subtree
+# again. extract_record() walks the element once, remembers the first match
+# of each of those queries (document order, like select_one/find) and keeps
+# only the strings the rules look at.
+#
+# Works on stream_parser.MessageNode and on bs4 Tags.
+#
+# Also home of the export edge probes: a Telegram export split into
+# messages.html, messages2.html, ... can start a page with "joined"
+# follow-ups of the previous page's last sender. probe_head()/probe_tail()
+# find the first/last message of a page from a few KiB of raw HTML, so the
+# sender can be carried across pages without parsing them in order.
+
+import io
+import re
+from collections import namedtuple
+
+from stream_parser import MessageNode, iter_message_elements
+
+# bot_markers bits
+BOT_BUTTONS = 1     # table.bot_buttons_table
+BOT_QUOTE = 2       # <blockquote>
+BOT_COMMAND = 4     # first <a onclick> runs ShowBotCommand
+BOT_KEYBOARD = 8    # .bot_inline_keyboard / .bot-buttons
+
+_DATE = "date"
+_FROM_NAME = "from_name"
+_MEDIA = "media_wrap"
+_TEXT = "text"
+_REPLY = "reply_to"
+_WANTED_CLASSES = frozenset([_DATE, _FROM_NAME, _MEDIA, _TEXT, _REPLY,
+                             "bot_buttons_table", "bot_inline_keyboard", "bot-buttons"])
+
+
+class MessageRecord:
+    """
+    Fields of one .message.default element.
+
+    date_title   title attribute of the first .date ("" when missing), None without .date
+    date_text    text of the first .date, None without .date
+    sender       text of the first .from_name, None without .from_name
+    joined       the element has the "joined" class (follow-up without .from_name)
+    text         text of the first .text joined with "\\n", None without .text
+    reply_text   text of the first .reply_to, None without .reply_to
+    has_media    the message has a .media_wrap
+    media_link   href of the first link inside the first .media_wrap (the
+                 attachment, relative to the export folder), None without one
+    bot_markers  BOT_* bits for the bot elements found
+    """
+    __slots__ = ("date_title", "date_text", "sender", "joined", "text", "reply_text",
+                 "has_media", "media_link", "bot_markers")
+
+    def __init__(self, date_title=None, date_text=None, sender=None, joined=False, text=None,
+                 reply_text=None, has_media=False, media_link=None, bot_markers=0):
+        self.date_title = date_title
+        self.date_text = date_text
+        self.sender = sender
+        self.joined = joined
+        self.text = text
+        self.reply_text = reply_text
+        self.has_media = has_media
+        self.media_link = media_link
+        self.bot_markers = bot_markers
+
+    def __repr__(self):
+        return "MessageRecord(%s)" % ", ".join("%s=%r" % (k, getattr(self, k)) for k in self.__slots__)
+
+
+def _is_joined(msg):
+    if isinstance(msg, MessageNode):
+        return "joined" in msg.classes
+    return "joined" in (msg.get("class") or ())
+
+
+def _iter_nodes(msg):
+    """(element, tag name, classes, attrs) for every descendant element, in document order."""
+    if isinstance(msg, MessageNode):
+        for node in msg.descendants():
+            yield node, node.name, node.classes, node.attrs
+    else:
+        for node in msg.descendants:
+            name = getattr(node, "name", None)
+            if name is None:
+                continue  # NavigableString
+            yield node, name, node.get("class") or (), node.attrs
+
+
+def _first_link(element):
+    for _, name, _, attrs in _iter_nodes(element):
+        if name == "a":
+            href = attrs.get("href")
+            if href:
+                return href
+    return None
+
+
+def extract_record(msg):
+    date_el = name_el = text_el = reply_el = media_el = None
+    markers = 0
+    onclick_seen = False
+
+    for node, name, classes, attrs in _iter_nodes(msg):
+        if classes:
+            hits = _WANTED_CLASSES.intersection(classes)
+            if hits:
+                if _DATE in hits and date_el is None:
+                    date_el = node
+                if _FROM_NAME in hits and name_el is None:
+                    name_el = node
+                if _TEXT in hits and text_el is None:
+                    text_el = node
+                if _REPLY in hits and reply_el is None:
+                    reply_el = node
+                if _MEDIA in hits and media_el is None:
+                    media_el = node
+                if name == "table" and "bot_buttons_table" in hits:
+                    markers |= BOT_BUTTONS
+                if "bot_inline_keyboard" in hits or "bot-buttons" in hits:
+                    markers |= BOT_KEYBOARD
+        if name == "blockquote":
+            markers |= BOT_QUOTE
+        elif name == "a" and not onclick_seen:
+            onclick = attrs.get("onclick")
+            if onclick is not None:
+                # like find("a", onclick=True): only the first such link counts
+                onclick_seen = True
+                if "ShowBotCommand" in onclick:
+                    markers |= BOT_COMMAND
+
+    rec = MessageRecord(joined=_is_joined(msg), has_media=media_el is not None, bot_markers=markers)
+    if date_el is not None:
+        rec.date_title = date_el.get("title") or ""
+        rec.date_text = date_el.get_text(" ", strip=True)
+    if name_el is not None:
+        rec.sender = name_el.get_text(strip=True)
+    if text_el is not None:
+        rec.text = text_el.get_text("\n", strip=True)
+    if reply_el is not None:
+        rec.reply_text = reply_el.get_text(" ", strip=True)
+    if media_el is not None:
+        rec.media_link = _first_link(media_el)
+    return rec
+
+
+# -----------------------
+# Export edge probes
+# -----------------------
+_DIV_CLASS_RE = re.compile(r'<div\b[^>]*?\bclass="([^"]*)"', re.IGNORECASE)
+
+ExportHead = namedtuple("ExportHead", ["joined", "date_title"])
+ExportTail = namedtuple("ExportTail", ["sender", "date_title"])
+
+
+def _message_starts(text):
+    """(offset, joined) of every .message.default start tag in text."""
+    for m in _DIV_CLASS_RE.finditer(text):
+        classes = m.group(1).split()
+        if "message" in classes and "default" in classes:
+            yield m.start(), "joined" in classes
+
+
+def _records(html_text):
+    return [extract_record(msg) for msg in iter_message_elements(io.StringIO(html_text))]
+
+
+def probe_head(text):
+    """ExportHead of the first message in the start of an export, or None."""
+    starts = _message_starts(text)
+    first = next(starts, None)
+    if first is None:
+        return None
+    nxt = next(starts, None)
+    recs = _records(text[first[0]:nxt[0] if nxt else len(text)])
+    if not recs:
+        return None
+    return ExportHead(first[1], recs[0].date_title or recs[0].date_text)
+
+
+def probe_tail(text):
+    """
+    ExportTail (sender still in effect after the last message, its date) of
+    the end of an export, or None when the window holds no message that
+    names its sender.
+    """
+    starts = list(_message_starts(text))
+    for start, joined in reversed(starts):
+        if joined:
+            continue
+        sender = None
+        title = None
+        for rec in _records(text[start:]):
+            if rec.sender is not None:
+                sender = rec.sender
+            title = rec.date_title or rec.date_text or title
+        if sender is not None:
+            return ExportTail(sender, title)
+    return None
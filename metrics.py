@@ -0,0 +1,187 @@
+# metrics.py — pipeline counters, stage timers and Prometheus text output
+#
+# Deliberately tiny (no prometheus_client dependency): counters and
+# histograms with labels, a per-conversion StageClock that splits wall time
+# between nested stages, and render() producing the text exposition format
+# served on /metrics.
+
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; a conversion stage ranges from milliseconds (cache hit) to minutes
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = ['%s="%s"' % (n, _escape_label(v)) for n, v in zip(names, values)]
+    pairs.extend('%s="%s"' % (n, _escape_label(v)) for n, v in extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+def _format_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer():
+        return repr(int(v)) if abs(v) < 1e15 else repr(v)
+    return repr(v)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labelvalues):
+        if amount <= 0:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s counter" % self.name]
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0)]
+        for labelvalues, v in items:
+            lines.append("%s%s %s" % (self.name, _format_labels(self.labelnames, labelvalues),
+                                      _format_value(v)))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labelvalues, series in items:
+            for bound, n in zip(self.buckets + (float("inf"),), series[:len(self.buckets)] + [series[-1]]):
+                lines.append("%s_bucket%s %d" % (
+                    self.name, _format_labels(self.labelnames, labelvalues, (("le", _format_value(float(bound))),)), n))
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append("%s_sum%s %s" % (self.name, labels, repr(series[-2])))
+            lines.append("%s_count%s %d" % (self.name, labels, series[-1]))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """
+        collect() -> iterable of (name, type, help, [(labels dict, value), ...]),
+        evaluated at scrape time (cache sizes, queue lengths, ...).
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append("# HELP %s %s" % (name, help))
+                lines.append("# TYPE %s %s" % (name, kind))
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append("%s%s %s" % (name, _format_labels(names, [labels[n] for n in names]),
+                                              _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+class StageClock:
+    """
+    Splits the wall time of one conversion between named stages. Stages nest
+    (the zip stage pulls from encode, which pulls from merge) and time is
+    charged to the innermost active stage only, so the totals add up to the
+    instrumented wall time. Not thread-safe: one clock per conversion.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self._stack = []   # [stage, started]
+
+    def _enter(self, stage):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.totals[outer[0]] = self.totals.get(outer[0], 0.0) + now - outer[1]
+        self._stack.append([stage, now])
+
+    def _exit(self):
+        now = time.perf_counter()
+        stage, started = self._stack.pop()
+        self.totals[stage] = self.totals.get(stage, 0.0) + now - started
+        if self._stack:
+            self._stack[-1][1] = now
+
+    @contextmanager
+    def stage(self, name):
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def timed_iter(self, iterable, name):
+        """Yield from iterable, charging the time spent producing items to `name`."""
+        it = iter(iterable)
+        enter, exit_ = self._enter, self._exit
+        while True:
+            enter(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                exit_()
+            yield item
+
+    def add(self, totals):
+        """Fold in stage totals measured elsewhere (e.g. in a pool worker)."""
+        for stage, seconds in totals.items():
+            self.totals[stage] = self.totals.get(stage, 0.0) + seconds
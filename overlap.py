@@ -0,0 +1,152 @@
+# overlap.py — duplicate messages across overlapping exports
+#
+# Two exports of the same group taken a week apart share every message up to
+# the end of the older one; merged naively, the overlap shows up twice. The
+# per-file `seen` set in the parser cannot catch that, so there are two
+# checks at the merge level:
+#
+# - ExportIndex / find_contained(): one regex pass over the raw HTML collects
+#   the message id and date title of every message. An upload whose
+#   (id, title) pairs all appear in another upload is skipped before it is
+#   parsed at all.
+# - OverlapIndex: while the per-file runs are merged in time order, every
+#   line's (instant, sender key, content hash) is looked up in a set that
+#   only holds the keys of the last `window` microseconds, so memory is
+#   bounded by the busiest window instead of the chat length.
+
+import hashlib
+import re
+import zlib
+from array import array
+from collections import deque
+
+_SCAN_RE = re.compile(rb'\bid="message(\d+)"|\bclass="[^"]*\bdate\b[^"]*" title="([^"]*)"')
+_CHAT_TITLE_RE = re.compile(rb'class="page_header".*?class="text bold">\s*([^<]*?)\s*<', re.DOTALL)
+
+
+class ExportIndex:
+    """Message ids (ascending) and crc32 of their date titles, for one export."""
+
+    def __init__(self, chat=None):
+        self.chat = chat
+        self.ids = array("q")
+        self.titles = array("I")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def scan(cls, chunks):
+        """Index an export from an iterable of raw byte chunks."""
+        index = cls()
+        pairs = []
+        pending = None   # id still waiting for its date title
+
+        def feed(buf, end):
+            nonlocal pending
+            for m in _SCAN_RE.finditer(buf, 0, end):
+                if m.group(1) is not None:
+                    if pending is not None:
+                        pairs.append((pending, 0))
+                    pending = int(m.group(1))
+                elif pending is not None:
+                    pairs.append((pending, zlib.crc32(m.group(2))))
+                    pending = None
+
+        carry = b""
+        head = b""       # the page header, until the chat title is found
+        for chunk in chunks:
+            buf = carry + chunk
+            if index.chat is None and not pairs:
+                head += chunk
+                m = _CHAT_TITLE_RE.search(head)
+                if m:
+                    index.chat = m.group(1)
+            # matches never span a tag: keep the last, maybe unfinished, tag for the
+            # next chunk (all of buf while that tag is the only one in it)
+            cut = buf.rfind(b"<")
+            if cut < 0:
+                cut = len(buf)
+            feed(buf, cut)
+            carry = buf[cut:]
+        feed(carry, len(carry))
+        if pending is not None:
+            pairs.append((pending, 0))
+        if any(pairs[i][0] > pairs[i + 1][0] for i in range(len(pairs) - 1)):
+            pairs.sort()
+        index.ids.extend(p[0] for p in pairs)
+        index.titles.extend(p[1] for p in pairs)
+        return index
+
+    def covers(self, other):
+        """True when every message of `other` is in this export with the same date title."""
+        n = len(self.ids)
+        if not other.ids or len(other.ids) > n:
+            return False
+        if self.chat is not None and other.chat is not None and self.chat != other.chat:
+            return False
+        if other.ids[0] < self.ids[0] or other.ids[-1] > self.ids[-1]:
+            return False
+        i = 0
+        ids, titles = self.ids, self.titles
+        for mid, title in zip(other.ids, other.titles):
+            while i < n and ids[i] < mid:
+                i += 1
+            if i == n or ids[i] != mid or titles[i] != title:
+                return False
+            i += 1
+        return True
+
+
+def find_contained(indexes):
+    """
+    {i: j} for every export i whose messages are all in export j. Of two
+    identical exports the later one counts as contained. Only containment
+    in a single other export is detected, not in the union of several.
+    """
+    contained = {}
+    for i, inner in enumerate(indexes):
+        if inner is None or not len(inner):
+            continue
+        for j, outer in enumerate(indexes):
+            if j == i or outer is None or j in contained:
+                continue
+            if outer.covers(inner) and (len(outer) > len(inner) or j < i):
+                contained[i] = j
+                break
+    return contained
+
+
+def content_digest(content):
+    return hashlib.blake2b(content, digest_size=8).digest()
+
+
+class OverlapIndex:
+    """
+    Time-windowed set of (sender key, content hash) over a merge in time
+    order. seen() is true when the same sender sent the same content at most
+    window_us microseconds earlier; with the default window of 0 only lines
+    at the very same instant match.
+    """
+
+    def __init__(self, window_us=0):
+        self.window_us = window_us
+        self._last = {}        # (sender key, digest) -> latest instant
+        self._order = deque()  # (instant, key), oldest first
+        self.dropped = 0
+
+    def seen(self, ts, sender_key, content):
+        horizon = ts - self.window_us
+        order, last = self._order, self._last
+        while order and order[0][0] < horizon:
+            old_ts, old_key = order.popleft()
+            if last.get(old_key) == old_ts:
+                del last[old_key]
+        key = (sender_key, content_digest(content))
+        prev = last.get(key)
+        if prev is not None and prev >= horizon:
+            self.dropped += 1
+            return True
+        last[key] = ts
+        order.append((ts, key))
+        return False
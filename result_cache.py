@@ -0,0 +1,170 @@
+# result_cache.py — parsed-entry cache keyed by file content
+#
+# Operators often upload the same export again with only a different output
+# name or ZIP password. The parsed lines of a file (an entry_store.EntryStore)
+# only depend on its bytes and on the filter rules, so they are cached under
+# sha256(file bytes) + rules version. Memory tier is an LRU bounded by the
+# stores' nbytes; an optional directory keeps results across restarts (one
+# binary .store file per key, written atomically).
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from entry_store import EntryStore
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_digest(f, chunk_size=HASH_CHUNK_SIZE):
+    """
+    sha256 hex digest of a seekable file-like object (bytes or str), read in
+    chunks; the position is restored afterwards. Returns None when the
+    stream cannot be rewound, so the caller can skip the cache.
+    """
+    try:
+        if not f.seekable():
+            return None
+        start = f.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    h = hashlib.sha256()
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        h.update(chunk)
+    f.seek(start)
+    return h.hexdigest()
+
+
+def bytes_digest(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def path_digest(path, chunk_size=HASH_CHUNK_SIZE):
+    with open(path, "rb") as fh:
+        return file_digest(fh, chunk_size)
+
+
+class EntryCache:
+    """
+    Thread-safe LRU of parsed EntryStores.
+
+    Keys are built with make_key(digest, rules_version). Cached stores are
+    shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._items = OrderedDict()  # key -> (store, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(digest, rules_version):
+        return "%s-%s" % (digest, rules_version)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or bool(self.disk_dir)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+
+        store = self._disk_get(key)
+        with self._lock:
+            if store is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, store)
+        return store
+
+    def put(self, key, store):
+        with self._lock:
+            self.stores += 1
+            self._insert(key, store)
+        self._disk_put(key, store)
+
+    def _insert(self, key, store):
+        size = store.nbytes
+        if size > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._items[key] = (store, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._items:
+            _, (_, evicted_size) = self._items.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    # -- disk tier --
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + ".store")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as fh:
+                return EntryStore.load(fh)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _disk_put(self, key, store):
+        if not self.disk_dir:
+            return
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                store.dump(fh)
+            os.replace(tmp, self._disk_path(key))
+        except OSError:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,324 @@
+# rules.py — filter rule sets: config file, compiled matcher, hot reload
+#
+# The keyword lists and patterns the converter filters with used to be
+# hard-coded in app.py. A RuleSet is an immutable, compiled version of them
+# (the content rules as content_filter.ContentFilter, the sender lists as
+# trie regexes), built from DEFAULT_RULES overridden by a JSON file:
+#
+#   {
+#     "version": "community-a-2024-06",
+#     "promo_keywords": ["jual", "promo", ...],
+#     "sender_hard_block": ["deleted", "burnfp"],
+#     "single_word_re": "^[/\\\\]?(up|ok|ping)[!?.]*$"
+#   }
+#
+# "version" is required; every other key of DEFAULT_RULES is optional and
+# replaces the built-in value. Lists are literal substrings (the ones tested
+# against lowercased text are lowercased on load, empty entries are
+# ignored); *_re values are regexes compiled case-insensitively. They run
+# as alternatives of one combined regex, so they may not use named groups or
+# backreferences (group numbers shift once they are combined); a config is
+# only accepted once its whole RuleSet compiles.
+#
+# RuleStore holds the active RuleSet. current() checks the file's stat at
+# most every check_interval seconds and, when it changed, compiles the new
+# file and swaps the reference; a file that fails to load leaves the old
+# rules in place. A conversion takes current() once when it starts and uses
+# that RuleSet throughout, so a reload never changes rules mid-conversion.
+# Keyword count only affects compile time: each line is still one regex
+# search per rule group, and pool workers compile a given rule set once.
+
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from content_filter import ContentFilter, trie_pattern
+
+try:
+    import re._parser as _sre_parse
+except ImportError:  # before Python 3.11
+    import sre_parse as _sre_parse
+
+# sender rule ids, next to the content_filter RULE_* ids
+RULE_SENDER_HARD_BLOCK = "sender_hard_block"
+RULE_SENDER_BOT_NAME = "sender_bot_name"
+
+BUILTIN_VERSION = "builtin"
+
+DEFAULT_RULES = {
+    "single_word_re": r"^[/\\]?(up|yo|ok|utc|cek|check|ping|pm|bump|push|help|upvote|vote|voteup)[!?.]*$",
+    "short_whitelist": ["hai", "iya"],
+    "price_re": r"\b\d+(\.\d+)?\s*(k|rb)\b",
+    "ip_count_re": r"\b\d+\s*ip\b",
+    "duration_re": r"\b\d+\s*(hari|day|bulan|month)\b",
+    "link_re": r"(http|https|www\.|\.com|\.net|\.id|\.co)",
+    "catalog_keywords": [
+        "proxy", "ip:", "port", "user:pass", "residential", "static",
+        "bandwidth", "masa aktif", "ready", "note:", "package", "bandwith",
+    ],
+    "promo_keywords": [
+        "jual", "jualan", "promosi", "promo", "lowongan", "loker",
+        "jasa", "sewa", "autoscript install rdp", "vps", "garansi", "1 bulan",
+    ],
+    "promo_emoji": ["💥", "🔥", "⚡", "💸", "⭐", "🎁", "🎉"],
+    "rdp_keywords": [
+        "detail information", "speed download", "speed upload",
+        "linux", "ubuntu", "debian", "centos", "rockylinux", "almalinux",
+        "windows server", "cpu", "ram", "bandwidth", "rdp", "server", "vps",
+        "speed", "download", "upload", "durasi",
+    ],
+    "bot_phrases": [
+        "click below", "see details", "join now", "congrat", "congrats",
+        "already checked", "you have won", "check in", "daily reward", "bonus claim",
+    ],
+    "sender_hard_block": ["deleted", "burnfp"],
+    "bot_name_substrings": ["uxuy", "rose", "agent", "bot"],
+}
+
+# lists matched against lowercased text
+_LOWERCASED = frozenset(["short_whitelist", "catalog_keywords", "promo_keywords", "rdp_keywords",
+                         "bot_phrases", "sender_hard_block", "bot_name_substrings"])
+# distinct sender names whose verdict a RuleSet remembers
+SENDER_VERDICTS_MAX = 65536
+
+
+def _has_backreference(parsed):
+    for op, arg in parsed:
+        if op in (_sre_parse.GROUPREF, _sre_parse.GROUPREF_EXISTS):
+            return True
+        for value in arg if isinstance(arg, (list, tuple)) else (arg,):
+            if isinstance(value, _sre_parse.SubPattern) and _has_backreference(value):
+                return True
+            if isinstance(value, (list, tuple)) and any(
+                    isinstance(v, _sre_parse.SubPattern) and _has_backreference(v) for v in value):
+                return True
+    return False
+
+
+def check_rule_regex(key, value):
+    """Raise ValueError unless value can be one alternative of the combined rule regex."""
+    try:
+        compiled = re.compile(value, re.IGNORECASE)
+        parsed = _sre_parse.parse(value, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError("%s: %s" % (key, e)) from e
+    if compiled.groupindex:
+        raise ValueError("%s: named groups are not supported, use (?:...)" % key)
+    if _has_backreference(parsed):
+        raise ValueError("%s: backreferences are not supported" % key)
+
+
+def normalize_config(raw):
+    """Validated config dict with every key of DEFAULT_RULES. Raises ValueError."""
+    if not isinstance(raw, dict):
+        raise ValueError("rules config must be a JSON object")
+    version = raw.get("version")
+    if not isinstance(version, str) or not version.strip():
+        raise ValueError("rules config needs a non-empty \"version\" string")
+    unknown = sorted(set(raw) - set(DEFAULT_RULES) - {"version"})
+    if unknown:
+        raise ValueError("unknown rules config keys: %s" % ", ".join(unknown))
+    config = {"version": version.strip()}
+    for key, default in DEFAULT_RULES.items():
+        value = raw.get(key, default)
+        if key.endswith("_re"):
+            if not isinstance(value, str):
+                raise ValueError("%s must be a regex string" % key)
+            check_rule_regex(key, value)
+        else:
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError("%s must be a list of strings" % key)
+            if key in _LOWERCASED:
+                value = [v.lower() for v in value]
+            value = [v for v in value if v]
+        config[key] = value
+    return config
+
+
+def _compile_words(words):
+    pattern = trie_pattern(words)
+    return re.compile(pattern) if pattern else None
+
+
+class RuleSet:
+    """
+    Compiled, immutable filter rules of one config version.
+
+    version      the config's "version" label
+    fingerprint  hash of the normalized rules (not the label); equal rules, equal fingerprint
+    content      content_filter.ContentFilter for the per-line rules
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.version = config["version"]
+        body = {k: (sorted(v) if isinstance(v, list) else v) for k, v in config.items() if k != "version"}
+        self.fingerprint = hashlib.sha1(
+            json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+        def regex(key):
+            return re.compile(config[key], re.IGNORECASE)
+
+        self.content = ContentFilter(
+            bot_phrases=config["bot_phrases"],
+            single_word_re=regex("single_word_re"),
+            short_whitelist=config["short_whitelist"],
+            price_re=regex("price_re"),
+            ip_count_re=regex("ip_count_re"),
+            duration_re=regex("duration_re"),
+            link_re=regex("link_re"),
+            catalog_keywords=config["catalog_keywords"],
+            rdp_keywords=config["rdp_keywords"],
+            promo_keywords=config["promo_keywords"],
+            promo_emoji=config["promo_emoji"],
+        )
+        self._hard_block_re = _compile_words(config["sender_hard_block"])
+        self._bot_name_re = _compile_words(config["bot_name_substrings"])
+        self._sender_verdicts = {}
+
+    def __repr__(self):
+        return "RuleSet(version=%r, fingerprint=%r)" % (self.version, self.fingerprint)
+
+    def __reduce__(self):
+        # pool workers rebuild from the config, compiling each rule set once per process
+        return (_compiled_rules, (self.config,))
+
+    @property
+    def id(self):
+        """"<version>@<fingerprint>": what cache keys and job metadata record."""
+        return "%s@%s" % (self.version, self.fingerprint)
+
+    def sender_block_rule(self, name_key):
+        """Rule id blocking a sender by its normalized name, or None."""
+        verdicts = self._sender_verdicts
+        try:
+            return verdicts[name_key]
+        except KeyError:
+            pass
+        lc = name_key.lower()
+        rule = None
+        if self._hard_block_re is not None and self._hard_block_re.search(lc):
+            rule = RULE_SENDER_HARD_BLOCK
+        elif self._bot_name_re is not None and self._bot_name_re.search(lc):
+            rule = RULE_SENDER_BOT_NAME
+        if len(verdicts) >= SENDER_VERDICTS_MAX:
+            verdicts.clear()
+        verdicts[name_key] = rule
+        return rule
+
+    def mentions_bot_name(self, text):
+        """True when the lowercased text contains one of the bot name substrings."""
+        return self._bot_name_re is not None and self._bot_name_re.search(text.lower()) is not None
+
+    def to_dict(self):
+        return {"version": self.version, "fingerprint": self.fingerprint}
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def _compiled_rules(config):
+    key = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    with _compiled_lock:
+        rules = _compiled.get(key)
+        if rules is None:
+            try:
+                rules = RuleSet(config)
+            except re.error as e:
+                raise ValueError("rules do not compile: %s" % e) from e
+            if len(_compiled) >= 4:
+                _compiled.clear()
+            rules = _compiled[key] = rules
+        return rules
+
+
+def builtin_rules():
+    return _compiled_rules(normalize_config(dict(DEFAULT_RULES, version=BUILTIN_VERSION)))
+
+
+def load_rules(path):
+    """RuleSet from a JSON config file. Raises OSError or ValueError."""
+    with open(path, "r", encoding="utf-8") as fh:
+        raw = json.load(fh)
+    return _compiled_rules(normalize_config(raw))
+
+
+def _stat_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class RuleStore:
+    """
+    The active RuleSet, reloaded from path when the file changes (see the
+    module comment). Without a path it always holds the built-in rules.
+    """
+
+    def __init__(self, path=None, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._failed_stamp = None  # a file version that failed to load, not retried
+        if path is None:
+            # the built-in rules compile on first use (or in app.warm_up())
+            self._stamp = None
+            self._current = None
+        else:
+            # a broken file at startup is a deployment error: fail loudly
+            self._stamp = _stat_stamp(path)
+            self._current = load_rules(path)
+        self.loaded_at = time.time()
+
+    def current(self):
+        """The RuleSet to use for a conversion starting now."""
+        if self._current is None:
+            self._current = builtin_rules()
+        elif self.path is not None and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._current
+
+    def _maybe_reload(self):
+        # whoever gets the lock checks; everyone else keeps using the current set
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            stamp = _stat_stamp(self.path)
+            if stamp is None or stamp == self._stamp or stamp == self._failed_stamp:
+                return
+            try:
+                rules = load_rules(self.path)
+            except (OSError, ValueError) as e:
+                self._failed_stamp = stamp
+                self.last_error = "%s: %s" % (type(e).__name__, e)
+                print("rules: keeping %s, could not load %s: %s" % (self._current.id, self.path,
+                                                                   self.last_error), file=sys.stderr)
+                return
+            self._stamp = stamp
+            self._failed_stamp = None
+            self.last_error = None
+            if rules is not self._current:
+                self._current = rules
+                self.reloads += 1
+                self.loaded_at = time.time()
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        if self._current is None:
+            self.current()
+        d = self._current.to_dict()
+        d.update(path=self.path, reloads=self.reloads, loaded_at=self.loaded_at,
+                 last_error=self.last_error)
+        return d
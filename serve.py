@@ -0,0 +1,251 @@
+# serve.py — production server for the converter
+#
+#   python serve.py [--host H] [--port P] [--workers N] [--threads T]
+#                   [--timeout S] [--drain S] [--backend auto|gunicorn|threaded]
+#                   [--warm-up]
+#
+# Settings default to the environment:
+#
+#   CONVERTER_HOST / CONVERTER_PORT   listen address (0.0.0.0:5000)
+#   CONVERTER_WEB_WORKERS             worker processes (1)
+#   CONVERTER_WEB_THREADS             request threads per process (8)
+#   CONVERTER_REQUEST_TIMEOUT         seconds a request may stall before its
+#                                     connection (threaded) or worker
+#                                     (gunicorn) is dropped (300)
+#   CONVERTER_DRAIN_SECONDS           grace period on SIGTERM/SIGINT (60)
+#   CONVERTER_WARM_UP                 run app.warm_up() in every process before
+#                                     it serves (0): bs4, the filter rules and
+#                                     the parser are then ready for the first
+#                                     conversion instead of loaded by it
+#
+# Two backends, picked by create_server():
+#
+# - gunicorn (when installed): gthread workers, `workers` processes with
+#   `threads` threads each; timeout and graceful_timeout from the settings.
+# - threaded: werkzeug's threaded WSGI server in this process, with at most
+#   `threads` requests in flight (further connections wait in the listen
+#   backlog) and a socket timeout. Only one process.
+#
+# Shutdown drains: the listener is closed, requests in flight (including
+# streamed conversions) and background jobs get the drain period to finish,
+# then the pools are stopped. Background jobs live in the process that took
+# them: with several worker processes, /jobs/<id> only works when the same
+# worker serves the status request, so keep one process (and more threads)
+# when jobs are used, or route by job id.
+
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from collections import namedtuple
+
+ServerConfig = namedtuple("ServerConfig", ["host", "port", "workers", "threads", "timeout", "drain_seconds",
+                                           "warm_up"])
+
+
+def config_from_env(env=None):
+    env = os.environ if env is None else env
+    return ServerConfig(
+        host=env.get("CONVERTER_HOST", "0.0.0.0"),
+        port=int(env.get("CONVERTER_PORT", 5000)),
+        workers=max(1, int(env.get("CONVERTER_WEB_WORKERS", 1))),
+        threads=max(1, int(env.get("CONVERTER_WEB_THREADS", 8))),
+        timeout=float(env.get("CONVERTER_REQUEST_TIMEOUT", 300)),
+        drain_seconds=float(env.get("CONVERTER_DRAIN_SECONDS", 60)),
+        warm_up=env.get("CONVERTER_WARM_UP", "0") not in ("0", "false", "no"),
+    )
+
+
+def warm_up_app():
+    import app
+    timings = app.warm_up()
+    print("serve: warmed up in %.3fs (%s)" % (sum(timings.values()),
+                                             ", ".join("%s %.3fs" % kv for kv in timings.items())),
+          file=sys.stderr)
+
+
+def gunicorn_available():
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class InFlight:
+    """WSGI middleware counting requests until their response has been sent (or abandoned)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._cond = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+        with self._cond:
+            self.count += 1
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return ClosingIterator(result, self._done)
+
+    def _done(self):
+        with self._cond:
+            self.count -= 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """True once no request is in flight, False if timeout seconds pass first."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.count > 0:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+
+class ThreadedServer:
+    """werkzeug threaded WSGI server with a bounded thread count and a draining stop()."""
+
+    def __init__(self, wsgi_app, config):
+        from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+        class Handler(WSGIRequestHandler):
+            timeout = config.timeout  # socket timeout of every connection
+
+        slots = threading.BoundedSemaphore(config.threads)
+
+        class Server(ThreadedWSGIServer):
+            def process_request(self, request, client_address):
+                slots.acquire()   # blocks accepting while all threads are busy
+                try:
+                    super().process_request(request, client_address)
+                except BaseException:
+                    slots.release()
+                    raise
+
+            def process_request_thread(self, request, client_address):
+                try:
+                    super().process_request_thread(request, client_address)
+                finally:
+                    slots.release()
+
+        self.config = config
+        self.in_flight = InFlight(wsgi_app)
+        self.server = Server(config.host, config.port, self.in_flight, handler=Handler)
+
+    @property
+    def port(self):
+        return self.server.server_port
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self, drain_seconds):
+        """Close the listener, wait for requests in flight, then drain the app. True when clean."""
+        self.server.shutdown()
+        self.server.server_close()
+        deadline = time.monotonic() + drain_seconds
+        clean = self.in_flight.wait_idle(drain_seconds)
+        import app
+        return app.drain(max(0.0, deadline - time.monotonic())) and clean
+
+    def run(self):
+        stopping = threading.Event()
+
+        def on_signal(signum, frame):
+            if stopping.is_set():
+                return
+            stopping.set()
+            print("serve: %s, draining for up to %gs" % (signal.Signals(signum).name,
+                                                        self.config.drain_seconds), file=sys.stderr)
+            # shutdown() waits for serve_forever(), which runs in this (the main) thread
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, on_signal)
+        signal.signal(signal.SIGINT, on_signal)
+        print("serve: threaded on http://%s:%d (%d threads)" % (self.config.host, self.port,
+                                                                 self.config.threads), file=sys.stderr)
+        self.serve_forever()
+        clean = self.stop(self.config.drain_seconds)
+        print("serve: stopped%s" % ("" if clean else " (drain period ran out)"), file=sys.stderr)
+        return 0 if clean else 1
+
+
+def gunicorn_server(config):
+    """A gunicorn application running app:app with the given settings."""
+    from gunicorn.app.base import BaseApplication
+
+    def worker_exit(server, worker):
+        import app
+        app.drain(config.drain_seconds)
+
+    class ConverterApplication(BaseApplication):
+        def load_config(self):
+            settings = {
+                "bind": "%s:%d" % (config.host, config.port),
+                "workers": config.workers,
+                "worker_class": "gthread",
+                "threads": config.threads,
+                "timeout": config.timeout,
+                "graceful_timeout": config.drain_seconds,
+                "worker_exit": worker_exit,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import app
+            if config.warm_up:
+                warm_up_app()
+            return app.app
+
+    return ConverterApplication()
+
+
+def create_server(config=None, backend="auto"):
+    """Server for the converter app; .run() serves until SIGTERM/SIGINT, then drains."""
+    if config is None:
+        config = config_from_env()
+    if backend == "auto":
+        backend = "gunicorn" if gunicorn_available() else "threaded"
+    if backend == "gunicorn":
+        return gunicorn_server(config)
+    if config.workers > 1:
+        print("serve: the threaded backend runs one process; install gunicorn for %d workers"
+              % config.workers, file=sys.stderr)
+    import app
+    if config.warm_up:
+        warm_up_app()
+    return ThreadedServer(app.app, config)
+
+
+def main(argv=None):
+    defaults = config_from_env()
+    parser = argparse.ArgumentParser(description="Run the converter with a production WSGI server.")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--workers", type=int, default=defaults.workers, help="worker processes (gunicorn)")
+    parser.add_argument("--threads", type=int, default=defaults.threads, help="request threads per process")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout, help="request timeout in seconds")
+    parser.add_argument("--drain", type=float, default=defaults.drain_seconds,
+                        help="seconds in-flight work may take to finish on shutdown")
+    parser.add_argument("--backend", choices=("auto", "gunicorn", "threaded"), default="auto")
+    parser.add_argument("--warm-up", action="store_true", default=defaults.warm_up,
+                        help="load the parser and filter rules before serving")
+    args = parser.parse_args(argv)
+    if args.backend == "gunicorn" and not gunicorn_available():
+        parser.error("gunicorn is not installed")
+    config = ServerConfig(args.host, args.port, max(1, args.workers), max(1, args.threads),
+                          args.timeout, args.drain, args.warm_up)
+    return create_server(config, args.backend).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# stream_parser.py — incremental Telegram export parser
+#
+# Reads an uploaded HTML export in chunks and hands out every
+# `.message.default` element as soon as it is closed, instead of building a
+# full BeautifulSoup tree for the whole file. The tokenizer is the same
+# stdlib html.parser that BeautifulSoup(..., "html.parser") uses, and the
+# tree rules below (void elements, pop-to-tag on end tags, entity handling,
+# ignored script/style/comment strings) follow bs4 so that field extraction
+# gives the same result as the soup path.
+#
+# One difference: a `.message.default` element nested inside another one is
+# part of the outer message and is not handed out again on its own, while
+# soup.select(".message.default") returns both. Telegram never nests
+# messages, so real exports parse the same either way.
+#
+# bs4 itself is only needed for its entity table, and importing it costs
+# more than the rest of the parser: html_entities() imports it when the
+# first parser is created, not when this module is imported.
+
+import codecs
+import html
+import re
+from html.parser import HTMLParser
+
+STREAM_CHUNK_SIZE = 1 << 20  # 1 MiB per read from the upload stream
+
+# tags that never have children (bs4 closes them right after the start tag)
+VOID_ELEMENTS = frozenset([
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen",
+    "link", "menuitem", "meta", "param", "source", "track", "wbr",
+    "basefont", "bgsound", "command", "frame", "image", "isindex",
+    "nextid", "spacer",
+])
+
+# strings inside these tags are not returned by bs4's get_text()
+STRING_CONTAINER_TAGS = frozenset(["rt", "rp", "style", "script", "template"])
+
+MESSAGE_CLASSES = frozenset(["message", "default"])
+
+_NUMERIC_REF_RE = {
+    10: re.compile(r"^([0-9]+)(.*)"),
+    16: re.compile(r"^([0-9a-f]+)(.*)"),
+}
+
+
+# -----------------------
+# Minimal element tree (one per message)
+# -----------------------
+_SELECTOR_CACHE = {}
+
+def _parse_selector(selector):
+    """
+    Parse a simple compound selector like ".date" or "table.bot_buttons_table"
+    into (tag_name or None, frozenset(classes)). Only what the converter uses.
+    """
+    parsed = _SELECTOR_CACHE.get(selector)
+    if parsed is not None:
+        return parsed
+    if not re.fullmatch(r"[A-Za-z0-9_-]*(\.[A-Za-z0-9_-]+)*", selector) or not selector:
+        raise ValueError("unsupported selector: %r" % selector)
+    parts = selector.split(".")
+    parsed = (parts[0].lower() or None, frozenset(parts[1:]))
+    _SELECTOR_CACHE[selector] = parsed
+    return parsed
+
+
+class MessageNode:
+    """
+    Lightweight stand-in for a bs4 Tag inside one message element.
+    Supports the subset of the Tag API used by the converter:
+    get(), select_one(), select(), find() and get_text().
+    """
+    __slots__ = ("name", "attrs", "classes", "children")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        cls = attrs.get("class")
+        self.classes = frozenset(cls.split()) if cls else frozenset()
+        self.children = []
+
+    def __repr__(self):
+        return "<MessageNode %s %r>" % (self.name, self.attrs)
+
+    def get(self, key, default=None):
+        if key == "class":
+            cls = self.attrs.get("class")
+            return cls.split() if cls is not None else default
+        return self.attrs.get(key, default)
+
+    def descendants(self):
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, MessageNode):
+                    yield child
+                    stack.append(iter(child.children))
+                    break
+            else:
+                stack.pop()
+
+    def _matches(self, tag, classes):
+        return (tag is None or self.name == tag) and classes <= self.classes
+
+    def select(self, selector):
+        tag, classes = _parse_selector(selector)
+        return [n for n in self.descendants() if n._matches(tag, classes)]
+
+    def select_one(self, selector):
+        tag, classes = _parse_selector(selector)
+        for n in self.descendants():
+            if n._matches(tag, classes):
+                return n
+        return None
+
+    def find(self, name=None, **attrs):
+        for n in self.descendants():
+            if name is not None and n.name != name:
+                continue
+            ok = True
+            for key, want in attrs.items():
+                have = n.attrs.get(key)
+                if want is True:
+                    ok = have is not None
+                elif want is False or want is None:
+                    ok = have is None
+                else:
+                    ok = have == want
+                if not ok:
+                    break
+            if ok:
+                return n
+        return None
+
+    def strings(self):
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, MessageNode):
+                    stack.append(iter(child.children))
+                    break
+                yield child
+            else:
+                stack.pop()
+
+    def get_text(self, separator="", strip=False):
+        if strip:
+            return separator.join(s for s in (s.strip() for s in self.strings()) if s)
+        return separator.join(self.strings())
+
+
+_html_entities = None
+
+
+def html_entities():
+    """bs4's entity name -> character table (bs4 is imported on the first call)."""
+    global _html_entities
+    if _html_entities is None:
+        from bs4.dammit import EntitySubstitution
+        _html_entities = EntitySubstitution.HTML_ENTITY_TO_CHARACTER
+    return _html_entities
+
+
+# -----------------------
+# Incremental parser
+# -----------------------
+class MessageStreamParser(HTMLParser):
+    """
+    Push parser: feed() text chunks, then call drain() to collect the
+    message elements that were closed so far. Only message subtrees are
+    materialized; outside of them just the open tag names are kept.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self._entities = html_entities()
+        self._stack = []           # open tag names for the whole document
+        self._nodes = []           # open MessageNode objects of the current message
+        self._capture_depth = None  # len(self._stack) when the message opened
+        self._containers = []      # open string-container tags inside the message
+        self._data = []
+        # void tags seen so far, by name, so a stray </br> can be ignored like
+        # bs4 does; counts instead of bs4's list keep end tags O(1)
+        self._already_closed_empty = {}
+        self._done = []
+
+    # -- text buffering (bs4 merges adjacent data into one string) --
+    def _flush(self):
+        if not self._data:
+            return
+        text = "".join(self._data)
+        self._data = []
+        if self._nodes and not self._containers:
+            self._nodes[-1].children.append(text)
+
+    def handle_data(self, data):
+        if self._nodes:
+            self._data.append(data)
+
+    def handle_charref(self, name):
+        base = 10
+        digits = name
+        if name[:1] in ("x", "X"):
+            base = 16
+            digits = name[1:]
+        extra = ""
+        try:
+            num = int(digits, base)
+        except ValueError:
+            m = _NUMERIC_REF_RE[base].search(digits)
+            if m is None:
+                self.handle_data(name)
+                return
+            num = int(m.group(1), base)
+            extra = m.group(2)
+        self.handle_data(html.unescape("&#%d;" % num))
+        if extra:
+            self.handle_data(extra)
+
+    def handle_entityref(self, name):
+        character = self._entities.get(name)
+        self.handle_data(character if character is not None else "&%s" % name)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith("CDATA["):
+            self.handle_data(data[len("CDATA["):])
+            self._flush()
+
+    # -- tags --
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush()
+        attr_dict = {}
+        for key, value in attrs:
+            attr_dict[key] = "" if value is None else value
+
+        if self._nodes:
+            node = MessageNode(tag, attr_dict)
+            self._nodes[-1].children.append(node)
+        elif self._capture_depth is None and tag not in VOID_ELEMENTS:
+            cls = attr_dict.get("class")
+            if cls and MESSAGE_CLASSES <= set(cls.split()):
+                node = MessageNode(tag, attr_dict)
+                self._capture_depth = len(self._stack)
+            else:
+                node = None
+        else:
+            node = None
+
+        if tag in VOID_ELEMENTS and handle_empty_element:
+            # never pushed: no children, and a stray </br> is ignored later
+            closed = self._already_closed_empty
+            closed[tag] = closed.get(tag, 0) + 1
+            return
+
+        self._stack.append(tag)
+        if node is not None:
+            self._nodes.append(node)
+            if tag in STRING_CONTAINER_TAGS:
+                self._containers.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed_empty:
+            closed = self._already_closed_empty
+            if closed[tag] == 1:
+                del closed[tag]
+            else:
+                closed[tag] -= 1
+            return
+        self._flush()
+        stack = self._stack
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i] == tag:
+                break
+        else:
+            return
+        del stack[i:]
+        if self._capture_depth is None:
+            return
+        keep = max(len(stack) - self._capture_depth, 0)
+        while len(self._nodes) > keep:
+            node = self._nodes.pop()
+            if self._containers and self._containers[-1] is node:
+                self._containers.pop()
+        if not self._nodes:
+            self._done.append(node)
+            self._capture_depth = None
+
+    def close(self):
+        super().close()
+        self._flush()
+        if self._nodes:
+            # unclosed message at end of input: bs4 keeps it in the tree too
+            self._done.append(self._nodes[0])
+            self._nodes = []
+            self._containers = []
+            self._capture_depth = None
+
+    def drain(self):
+        done = self._done
+        self._done = []
+        return done
+
+
+def iter_message_elements(fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield `.message.default` elements from a file-like object (bytes or str),
+    reading at most chunk_size units at a time.
+    """
+    parser = MessageStreamParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        parser.feed(chunk)
+        yield from parser.drain()
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        parser.feed(tail)
+    parser.close()
+    yield from parser.drain()
+
@@ -0,0 +1,140 @@
+# test_admission.py — the in-flight upload budget and the request hooks that
+# reserve from it: 413 for a request over the limit, 503 when the budget is
+# used up, and every reservation given back however the request ends
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from admission import ByteBudget  # noqa: E402
+
+
+# -- ByteBudget --
+def test_budget_admits_until_the_limit():
+    budget = ByteBudget(100)
+    first = budget.try_acquire(60)
+    assert first is not None and budget.in_use == 60
+    assert budget.try_acquire(41) is None
+    second = budget.try_acquire(40)
+    assert second is not None and budget.in_use == 100
+    first.release()
+    first.release()  # idempotent
+    assert budget.in_use == 40
+    second.release()
+    assert budget.stats() == {"limit": 100, "in_use": 0, "peak": 100, "admitted": 2, "rejected": 1}
+
+
+def test_budget_without_limit_admits_everything():
+    budget = ByteBudget(0)
+    held = [budget.try_acquire(1 << 40) for _ in range(3)]
+    assert all(r is not None for r in held)
+    for r in held:
+        r.release()
+    assert budget.in_use == 0 and budget.rejected == 0
+
+
+# -- request hooks --
+@pytest.fixture
+def budget(monkeypatch):
+    budget = ByteBudget(1 << 20)
+    monkeypatch.setattr(app, "UPLOAD_BUDGET", budget)
+    monkeypatch.setattr(app.ENTRY_CACHE, "max_bytes", 0)
+    return budget
+
+
+def _post(path="/convert", data=app.WARM_UP_HTML, **kwargs):
+    return app.app.test_client().post(path, content_type="multipart/form-data",
+                                      data={"file": (io.BytesIO(data), "messages.html")}, **kwargs)
+
+
+def test_upload_is_released_once_the_response_is_closed(budget):
+    response = _post()
+    assert response.status_code == 200
+    # a streamed conversion holds its reservation until the stream is closed
+    assert budget.in_use > 0
+    assert "Warm Up: good morning & welcome" in response.get_data(as_text=True)
+    response.close()
+    assert budget.in_use == 0 and budget.admitted == 1
+
+
+def test_client_disconnect_releases_the_upload(budget):
+    response = _post()
+    assert budget.in_use > 0
+    response.close()  # the server closes the body iterator without reading it
+    assert budget.in_use == 0
+
+
+def test_too_large_upload_is_refused_without_reserving(budget, monkeypatch):
+    monkeypatch.setattr(app, "UPLOAD_LIMIT", 1000)
+    response = _post(data=b"x" * 2000)
+    assert response.status_code == 413
+    assert response.get_json()["limit"] == 1000
+    response.close()
+    assert budget.in_use == 0 and budget.admitted == 0
+
+
+def test_full_budget_is_refused_with_retry_after(budget):
+    held = budget.try_acquire(budget.limit - 100)
+    response = _post()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(app.ADMISSION_RETRY_AFTER)
+    response.close()
+    assert budget.rejected == 1
+    held.release()
+    assert budget.in_use == 0
+    # admitted again once the budget has room
+    response = _post()
+    assert response.status_code == 200
+    response.close()
+    assert budget.in_use == 0
+
+
+def test_failed_conversion_releases_the_upload(budget, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("parse failed")
+    monkeypatch.setattr(app, "parse_uploads", fail)
+    response = _post()
+    assert response.status_code == 500
+    response.close()
+    assert budget.in_use == 0
+
+
+def test_error_while_streaming_releases_the_upload(budget, monkeypatch):
+    def output(*args, **kwargs):
+        yield b"first line"
+        raise RuntimeError("write failed")
+    monkeypatch.setattr(app, "iter_conversion_output", output)
+    response = _post()
+    assert response.status_code == 200
+    with pytest.raises(RuntimeError):
+        response.get_data()
+    response.close()
+    assert budget.in_use == 0
+
+
+@pytest.mark.parametrize("propagate", [False, True])
+def test_unhandled_error_releases_the_upload(budget, monkeypatch, propagate):
+    def boom():
+        raise RuntimeError("boom")
+    monkeypatch.setitem(app.app.view_functions, "convert_txt", boom)
+    monkeypatch.setitem(app.app.config, "PROPAGATE_EXCEPTIONS", propagate)
+    if propagate:
+        # no response is finalized: the teardown hook gives the bytes back
+        with pytest.raises(RuntimeError):
+            _post()
+    else:
+        response = _post()
+        assert response.status_code == 500
+        response.close()
+    assert budget.in_use == 0
+
+
+def test_requests_that_upload_nothing_reserve_nothing(budget):
+    response = app.app.test_client().get("/stats")
+    assert response.status_code == 200
+    assert budget.admitted == 0
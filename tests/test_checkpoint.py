@@ -0,0 +1,186 @@
+# test_checkpoint.py — incremental conversions from a token or the previous TXT
+#
+# The "old" export is a prefix of the "new" one (cut at a message block), as
+# when the same group is exported again a few days later. Converting the new
+# export from the old conversion's token must give exactly the lines a full
+# conversion adds after the old TXT.
+
+import base64
+import io
+import os
+import re
+import sys
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.export_generator import FOOTER, write_exports  # noqa: E402
+from checkpoint import Checkpoint, find_resume_offset, instant_us, seen_digest  # noqa: E402
+from timestamps import parse_telegram_datetime  # noqa: E402
+
+_BLOCK_RE = re.compile(rb'<div class="message default[^"]*" id="message(\d+)"')
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    path = write_exports(str(tmp_path_factory.mktemp("checkpoint")), 600, seed=21, spam=0.1,
+                         joined=0.3)[0]
+    with open(path, "rb") as fh:
+        new = fh.read()
+    cut = list(_BLOCK_RE.finditer(new))[400].start()
+    return new[:cut] + FOOTER.encode("utf-8"), new
+
+
+@pytest.fixture(autouse=True)
+def _no_entry_cache(monkeypatch):
+    monkeypatch.setattr(app.ENTRY_CACHE, "max_bytes", 0)
+
+
+def _convert(data, **form):
+    fields = {"file": (io.BytesIO(data), "messages.html")}
+    for key, value in form.items():
+        fields[key] = (io.BytesIO(value), "previous.txt") if key == "previous" else value
+    response = app.app.test_client().post("/convert", data=fields, content_type="multipart/form-data")
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    headers = response.headers
+    response.close()
+    return text.split("\n") if text else [], headers
+
+
+# -- token --
+def test_token_round_trip():
+    cp = Checkpoint(4)
+    cp.last_id, cp.last_ts = 812, 1717416720000000
+    cp.last_wall = parse_telegram_datetime("06/03/25, 07:12 PM")
+    cp.last_sender, cp.run_key, cp.run_count = "Budi Santoso 🔥", "budi santoso", 2
+    cp.recent.extend(seen_digest("budi santoso", "pesan %d" % i) for i in range(3))
+    back = Checkpoint.from_token(cp.to_token(), 4)
+    assert (back.last_id, back.last_ts, back.last_wall, back.last_sender, back.run_key, back.run_count) == \
+        (cp.last_id, cp.last_ts, cp.last_wall, cp.last_sender, cp.run_key, cp.run_count)
+    assert list(back.recent) == list(cp.recent)
+    assert back.fingerprint.startswith("t")
+
+
+@pytest.mark.parametrize("token", ["", "cp1.", "cp2.abc", "cp1.!!!!", "cp1." + "A" * 70000,
+                                   Checkpoint().to_token()[:-6]])
+def test_corrupt_tokens_are_rejected(token):
+    with pytest.raises(ValueError):
+        Checkpoint.from_token(token)
+
+
+def test_token_with_digest_fragment_is_rejected():
+    body = base64.urlsafe_b64encode(zlib.compress(
+        b'{"id":1,"ts":null,"wall":null,"sender":null,"run":[null,0]}\n' + b"x" * 5)).decode()
+    with pytest.raises(ValueError):
+        Checkpoint.from_token("cp1." + body)
+
+
+def test_dedupe_partial_only_when_the_window_was_full():
+    cp = Checkpoint(3)
+    cp.recent.extend([b"a" * 8, b"b" * 8])
+    assert not Checkpoint.from_token(cp.to_token(), 3).dedupe_partial
+    cp.recent.append(b"c" * 8)
+    full = Checkpoint.from_token(cp.to_token(), 3)
+    assert full.dedupe_partial
+    assert full.resume().dedupe_partial
+
+
+# -- from the TXT --
+def test_from_txt():
+    lines = ["06/03/25, 07:12 PM - Budi: satu", "06/03/25, 07:12 PM - Budi: dua",
+             "06/03/25, 07:13 PM - Budi: tiga", "not a chat line", "06/03/25, 07:15 PM - Sari: ok"]
+    cp = Checkpoint.from_txt(lines, app.resolve_sender)
+    assert cp.last_wall == parse_telegram_datetime("06/03/25, 07:15 PM")
+    assert (cp.last_sender, cp.run_key, cp.run_count) == ("Sari", "sari", 1)
+    assert seen_digest("budi", "dua") in cp.seen and len(cp.seen) == 4
+    assert not cp.dedupe_partial
+    # lines of one message share a minute and count once
+    assert Checkpoint.from_txt(lines[:3], app.resolve_sender).run_count == 2
+
+
+# -- skipping the old part of the file --
+def _chunks(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_find_resume_offset_by_id(exports, chunk_size):
+    old, new = exports
+    cp = Checkpoint()
+    cp.last_id = max(int(m.group(1)) for m in _BLOCK_RE.finditer(old))
+    header_end, resume_at = find_resume_offset(_chunks(new, chunk_size), cp)
+    m = _BLOCK_RE.match(new, resume_at)
+    assert m is not None and int(m.group(1)) > cp.last_id
+    assert all(int(m.group(1)) <= cp.last_id for m in _BLOCK_RE.finditer(new, 0, resume_at))
+    assert new[header_end:].startswith(b"<div") and header_end < resume_at
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_find_resume_offset_by_time(exports, chunk_size):
+    old, new = exports
+    last = list(_BLOCK_RE.finditer(old))[-1]
+    title = re.search(rb'title="([^"]*)"', old[last.start():]).group(1).decode()
+    cp = Checkpoint()
+    cp.last_ts = instant_us(parse_telegram_datetime(title))
+    _, resume_at = find_resume_offset(_chunks(new, chunk_size), cp)
+    # messages at the boundary instant are not old: the dedupe decides about them
+    assert resume_at <= last.start()
+    assert resume_at > list(_BLOCK_RE.finditer(old))[-20].start()
+
+
+def test_find_resume_offset_before_the_first_and_after_the_last_message(exports):
+    _, new = exports
+    cp = Checkpoint()
+    cp.last_id = 0
+    assert find_resume_offset(_chunks(new, 4096), cp)[1] == _BLOCK_RE.search(new).start()
+    cp.last_id = 10 ** 9
+    assert find_resume_offset(_chunks(new, 4096), cp)[1] == len(new)
+
+
+# -- whole conversions --
+def test_token_resume_appends_exactly_the_new_lines(exports):
+    old, new = exports
+    full, _ = _convert(new)
+    before, headers = _convert(old)
+    after, headers = _convert(new, checkpoint=headers[app.CHECKPOINT_HEADER])
+    assert before and after
+    assert before + after == full
+    # continuing from the new token: nothing new
+    again, _ = _convert(new, checkpoint=headers[app.CHECKPOINT_HEADER])
+    assert again == []
+
+
+def test_previous_txt_resume_gives_the_full_chat(exports):
+    old, new = exports
+    full, _ = _convert(new)
+    before, _ = _convert(old)
+    out, headers = _convert(new, previous="\n".join(before).encode("utf-8"))
+    assert out == full
+    assert app.DEDUPE_HEADER not in headers
+
+
+def test_token_with_a_full_window_is_reported_partial(exports, monkeypatch):
+    old, new = exports
+    monkeypatch.setattr(app, "CHECKPOINT_RECENT", 8)
+    before, headers = _convert(old)
+    token = headers[app.CHECKPOINT_HEADER]
+    _, headers = _convert(new, checkpoint=token)
+    assert headers[app.DEDUPE_HEADER] == "partial"
+    _, headers = _convert(new, checkpoint=token, previous="\n".join(before).encode("utf-8"))
+    assert app.DEDUPE_HEADER not in headers
+    # a window larger than the old chat carries every digest
+    monkeypatch.setattr(app, "CHECKPOINT_RECENT", 100000)
+    _, headers = _convert(old)
+    _, headers = _convert(new, checkpoint=headers[app.CHECKPOINT_HEADER])
+    assert app.DEDUPE_HEADER not in headers
+
+
+def test_bad_token_is_a_client_error(exports):
+    _, new = exports
+    response = app.app.test_client().post("/convert", content_type="multipart/form-data", data={
+        "file": (io.BytesIO(new), "messages.html"), "checkpoint": "cp1.garbage"})
+    assert response.status_code == 400
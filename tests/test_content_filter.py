@@ -0,0 +1,199 @@
+# test_content_filter.py — ContentFilter against the original per-line chain
+#
+#   python -m pytest tests
+#
+# legacy_rule() is the if-chain parse_soup_to_entries ran on every line
+# before the rules were compiled into ContentFilter, with the built-in rule
+# lists. ContentFilter must reject exactly the lines the chain rejected; the
+# rule id it reports is pinned per line in GOLDEN. legacy_is_spam_like() is
+# the per-line spam check the chain ended with; spam_mask() and check_many()
+# are the batched forms parse_messages_to_store uses and must agree with it
+# and with check() line by line, whatever the batch size.
+
+import datetime
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_filter import (  # noqa: E402
+    RULE_BOT_PHRASE, RULE_BULLET, RULE_CATALOG, RULE_DURATION, RULE_IP_COUNT, RULE_LINK,
+    RULE_PRICE, RULE_PROMO, RULE_PROMO_EMOJI, RULE_RDP, RULE_SHORT, RULE_SINGLE_WORD,
+    RULE_SPAM_CAPS, RULE_SPAM_LENGTH, RULE_SPAM_PUNCT, RULE_SPAM_REPEAT, spam_mask,
+)
+from rules import DEFAULT_RULES, builtin_rules  # noqa: E402
+
+import app  # noqa: E402
+from benchmarks.export_generator import write_exports  # noqa: E402
+from jobs import ConversionProgress  # noqa: E402
+
+SINGLE_WORD_RE = re.compile(DEFAULT_RULES["single_word_re"], re.IGNORECASE)
+PRICE_RE = re.compile(DEFAULT_RULES["price_re"], re.IGNORECASE)
+IP_COUNT_RE = re.compile(DEFAULT_RULES["ip_count_re"], re.IGNORECASE)
+DURATION_RE = re.compile(DEFAULT_RULES["duration_re"], re.IGNORECASE)
+LINK_RE = re.compile(DEFAULT_RULES["link_re"], re.IGNORECASE)
+
+
+def legacy_is_spam_like(text):
+    if not text:
+        return False
+    t = text.strip()
+    if re.search(r"(.)\1{4,}", t.lower()):
+        return True
+    if re.search(r"([!?.,])\1{3,}", t):
+        return True
+    letters = [c for c in t if c.isalpha()]
+    if letters:
+        caps = sum(1 for c in letters if c.isupper())
+        if caps > len(letters) * 0.6:
+            return True
+    if len(t) > 350:
+        return True
+    return False
+
+
+def legacy_rule(content):
+    """Name of the first check of the old chain that dropped the line, or None."""
+    lc = content.lower().strip()
+    if any(p in lc for p in DEFAULT_RULES["bot_phrases"]):
+        return "bot_phrases"
+    if SINGLE_WORD_RE.fullmatch(lc):
+        return "single_word"
+    if len(lc) <= 3 and lc not in DEFAULT_RULES["short_whitelist"]:
+        return "short"
+    if re.match(r"^\s*[-•*]\s+", content):
+        return "bullet"
+    if PRICE_RE.search(lc):
+        return "price"
+    if IP_COUNT_RE.search(lc):
+        return "ip_count"
+    if any(k in lc for k in DEFAULT_RULES["catalog_keywords"]):
+        return "catalog"
+    if DURATION_RE.search(lc):
+        return "duration"
+    if any(k in lc for k in DEFAULT_RULES["rdp_keywords"]):
+        return "rdp"
+    if LINK_RE.search(content):
+        return "link"
+    if any(k in lc for k in DEFAULT_RULES["promo_keywords"]):
+        return "promo"
+    if any(e in content for e in DEFAULT_RULES["promo_emoji"]):
+        return "promo_emoji"
+    if legacy_is_spam_like(content):
+        return "spam"
+    return None
+
+
+# (line, rule id ContentFilter.check() reports)
+GOLDEN = [
+    ("selamat pagi semua, apa kabar?", None),
+    ("hai", None),
+    ("iya", None),
+    ("ok", RULE_SINGLE_WORD),
+    ("/up", RULE_SINGLE_WORD),
+    ("PING!!", RULE_SINGLE_WORD),
+    ("wkw", RULE_SHORT),
+    ("no", RULE_SHORT),
+    ("👍", RULE_SHORT),
+    ("😂😂😂", RULE_SHORT),
+    ("mantap 😂 semoga lancar ya", None),
+    ("Click below to claim", RULE_BOT_PHRASE),
+    ("Congrats, you have won", RULE_BOT_PHRASE),
+    ("daily reward sudah masuk", RULE_BOT_PHRASE),
+    ("- item satu", RULE_BULLET),
+    ("• barang murah", RULE_BULLET),
+    ("• Proxy murah", RULE_CATALOG),
+    ("harga 50k aja", RULE_PRICE),
+    ("cuma 25.5 rb kak", RULE_PRICE),
+    ("tersedia 10 ip hari ini", RULE_IP_COUNT),
+    ("ip: 10.0.0.1", RULE_CATALOG),
+    ("residential proxy ready", RULE_CATALOG),
+    ("aktif 30 hari full", RULE_DURATION),
+    ("ubuntu 22.04 stabil", RULE_RDP),
+    ("speed download kencang", RULE_RDP),
+    ("cek www.contoh.com ya", RULE_LINK),
+    ("https://t.me/grup", RULE_LINK),
+    ("jual akun premium", RULE_PROMO),
+    ("garansi sampai lunas", RULE_PROMO),
+    ("diskon hari ini 🔥", RULE_PROMO_EMOJI),
+    ("mantap 🎉🎉", RULE_PROMO_EMOJI),
+    ("hahahahaaaaaa lucu", RULE_SPAM_REPEAT),
+    ("seriusss??? beneran????", RULE_SPAM_PUNCT),
+    ("INI PENTING BANGET YA", RULE_SPAM_CAPS),
+    ("Jangan LUPA BESOK RAPAT", RULE_SPAM_CAPS),
+    ("kata " * 80 + "akhir", RULE_SPAM_LENGTH),
+    ("ÜBER ALLES GROSS", RULE_SPAM_CAPS),
+    ("Привет, как дела у тебя", None),
+    ("  spasi di depan dan belakang  ", None),
+    ("vps murah", RULE_RDP),
+    ("server down lagi!!!!", RULE_RDP),
+    ("beli 3 bulan dapat bonus", RULE_DURATION),
+]
+
+
+@pytest.fixture(scope="module")
+def content_filter():
+    return builtin_rules().content
+
+
+@pytest.mark.parametrize("line,rule", GOLDEN)
+def test_golden_rule_ids(content_filter, line, rule):
+    assert content_filter.check(line) == rule
+
+
+@pytest.mark.parametrize("line,rule", GOLDEN)
+def test_same_verdict_as_legacy_chain(content_filter, line, rule):
+    assert (content_filter.check(line) is None) == (legacy_rule(line) is None)
+    assert content_filter.accepts(line) == (legacy_rule(line) is None)
+
+
+def test_same_verdicts_on_generated_lines(content_filter):
+    words = ["kak", "jual", "VPS", "50k", "ok", "!!!!", "🔥", "hai", "www.x.id", "aaaaa",
+             "3 hari", "- ", "proxy", "Halo", "APA", "kabar", "😂", "ip:", "10 ip", "congrats"]
+    lines = []
+    for i in range(len(words)):
+        for j in range(len(words)):
+            lines.append("%s %s" % (words[i], words[j]))
+            lines.append(words[i] + words[j])
+    for line in lines:
+        assert (content_filter.check(line) is None) == (legacy_rule(line) is None), line
+
+
+EDGE_LINES = ["", " ", "\t", "a", "AB", "A1!", "!!!!", "....", "aaaaa", "AAAAa",
+              "x" * 350, "x" * 351, " " + "y" * 350 + " ", "Ünïcödé ÄÖÜ", "ßßßßß", "12345",
+              "ǅ titlecase", "İstanbul", "😂😂😂😂😂", "a\u200bb"]
+
+
+def _corpus():
+    return [line for line, _ in GOLDEN] + EDGE_LINES
+
+
+def test_spam_mask_matches_per_line_check():
+    lines = _corpus()
+    assert spam_mask(lines) == [legacy_is_spam_like(line) for line in lines]
+
+
+def test_check_many_matches_check(content_filter):
+    lines = _corpus()
+    assert content_filter.check_many(lines) == [content_filter.check(line) for line in lines]
+    assert content_filter.check_many([]) == []
+
+
+def _parse(path, batch, monkeypatch):
+    monkeypatch.setattr(app, "FILTER_BATCH_LINES", batch)
+    progress = ConversionProgress()
+    store = app.parse_file_entries(path, datetime.datetime(2024, 1, 1), progress=progress,
+                                   rules=builtin_rules(), keep_dropped=True)
+    return (list(store.iter_lines()), list(store.dropped.iter_lines()), progress.dropped,
+            progress.messages_seen, progress.messages_kept)
+
+
+def test_batch_size_does_not_change_output(tmp_path, monkeypatch):
+    path = write_exports(str(tmp_path), 600, seed=7, spam=0.3, bot=0.05, media=0.1)[0]
+    results = [_parse(path, batch, monkeypatch) for batch in (1, 3, 4096)]
+    assert results[0][0] and results[0][2]
+    assert results[1] == results[0]
+    assert results[2] == results[0]
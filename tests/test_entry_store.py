@@ -0,0 +1,131 @@
+# test_entry_store.py — columnar entry storage: ordering, naive rows and the
+# disk format of the entry cache
+
+import datetime
+import io
+import os
+import pickle
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import Checkpoint  # noqa: E402
+from entry_store import DroppedStore, EntryStore  # noqa: E402
+
+WIB = datetime.timezone(datetime.timedelta(hours=7))
+UTC = datetime.timezone.utc
+
+
+def _at(minute, tz=WIB):
+    return datetime.datetime(2025, 6, 3, 19, 0, tzinfo=tz) + datetime.timedelta(minutes=minute)
+
+
+def _store(rows):
+    """rows: (dt, sender, content)."""
+    store = EntryStore()
+    for dt, sender, content in rows:
+        store.add(dt, store.sender_id(sender, sender.lower()), content)
+    return store
+
+
+def _columns(store):
+    return {name: list(getattr(store, name)) for name in store.columns}
+
+
+def test_sort_orders_by_instant_and_keeps_ties_in_order():
+    store = _store([
+        (_at(5), "Budi", "lima"),
+        (_at(1), "Sari", "satu a"),
+        (_at(3), "Budi", "tiga"),
+        (_at(1), "Budi", "satu b"),
+        (_at(1, UTC) + datetime.timedelta(hours=-7), "Eko", "satu c"),  # same instant, other offset
+        (_at(0), "Sari", "nol"),
+    ])
+    store.sort()
+    assert [line.split(": ", 1)[1] for line in store.iter_lines()] == \
+        ["nol", "satu a", "satu b", "satu c", "tiga", "lima"]
+    assert list(store.ts) == sorted(store.ts)
+    # every column moved with its row
+    assert [store.names[s] for s in store.sender] == ["Sari", "Sari", "Budi", "Eko", "Budi", "Budi"]
+    assert store.line(3).startswith("06/03/25, 12:01 PM - Eko: ")
+
+
+def test_sort_of_a_sorted_store_changes_nothing():
+    store = _store([(_at(i), "Budi", "pesan %d" % i) for i in range(5)])
+    before = _columns(store)
+    store.sort()
+    assert _columns(store) == before
+
+
+def test_resolve_naive_gives_naive_rows_the_timezone():
+    store = _store([(_at(0), "Sari", "aware"), (_at(2).replace(tzinfo=None), "Budi", "naive")])
+    assert store.has_naive
+    store.resolve_naive(WIB)
+    assert not store.has_naive
+    assert list(store.tzoff) == [7 * 3600, 7 * 3600]
+    assert store.datetime_at(1) == _at(2)
+    assert list(store.iter_lines()) == ["06/03/25, 07:00 PM - Sari: aware",
+                                        "06/03/25, 07:02 PM - Budi: naive"]
+
+
+def test_resolve_naive_before_sort_orders_by_the_resolved_instant():
+    # 19:30 naive in UTC+07:00 is 12:30 UTC, before the aware 20:00 UTC row
+    store = _store([(_at(60, UTC), "Sari", "utc"), (_at(30).replace(tzinfo=None), "Budi", "naive")])
+    store.resolve_naive(WIB)
+    store.sort()
+    assert [line.split(": ", 1)[1] for line in store.iter_lines()] == ["naive", "utc"]
+
+
+def _filled():
+    store = _store([(_at(2), "Budi Santoso 🔥", "pesan dengan emoji 👋🏽"), (_at(0), "Sari", "ünïcödé"),
+                    (_at(1), "Budi Santoso 🔥", "")])
+    store.add(_at(1), store.sender_id("Sari", "sari"), "<Media omitted>", media=True)
+    store.sort()
+    cp = Checkpoint(4)
+    cp.last_id, cp.last_ts = 3, 1748952120000000
+    store.checkpoint = cp
+    return store
+
+
+def test_dump_load_round_trip():
+    store = _filled()
+    fh = io.BytesIO()
+    store.dump(fh)
+    back = EntryStore.load(io.BytesIO(fh.getvalue()))
+    assert _columns(back) == _columns(store)
+    assert list(back.media) == [0, 0, 1, 0]
+    assert (back.names, back.keys) == (store.names, store.keys)
+    assert list(back.iter_lines()) == list(store.iter_lines())
+    assert (back.checkpoint.last_id, back.checkpoint.last_ts) == (3, 1748952120000000)
+    # interned senders still resolve to the same ids
+    assert back.sender_id("Sari", "sari") == store.sender_id("Sari", "sari")
+    # the loaded store dumps to the same bytes
+    again = io.BytesIO()
+    back.dump(again)
+    assert again.getvalue() == fh.getvalue()
+
+
+def test_load_rejects_other_and_truncated_files():
+    fh = io.BytesIO()
+    _filled().dump(fh)
+    data = fh.getvalue()
+    # ESTORE1 files predate the media column
+    for bad in (b"", b"NOTSTORE" + data[8:], b"ESTORE1\n" + data[8:], data[:10], data[:-1]):
+        with pytest.raises(ValueError):
+            EntryStore.load(io.BytesIO(bad))
+
+
+def test_pickle_round_trip_keeps_dropped_rules():
+    store = _filled()
+    dropped = DroppedStore()
+    dropped.add(_at(0), dropped.sender_id("Spam", "spam"), "promo", rule="spam")
+    dropped.add(_at(1), dropped.sender_id("Spam", "spam"), "promo lagi", rule="spam")
+    dropped.add(_at(1), dropped.sender_id("Eko", "eko"), "<Media omitted>", rule="consecutive", media=True)
+    store.dropped = dropped
+    back = pickle.loads(pickle.dumps(store))
+    assert list(back.iter_lines()) == list(store.iter_lines())
+    assert [row[4] for row in back.dropped.iter_rows()] == ["spam", "spam", "consecutive"]
+    assert back.dropped.rule_names == ["spam", "consecutive"]
+    assert list(back.dropped.media) == [0, 0, 1]
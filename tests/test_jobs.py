@@ -0,0 +1,177 @@
+# test_jobs.py — background conversion jobs: the bounded JobManager (queue
+# full, failures, TTL cleanup, drain) and the /jobs endpoints end to end
+
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from admission import ByteBudget  # noqa: E402
+from jobs import STATUS_DONE, STATUS_FAILED, Job, JobManager, JobQueueFull  # noqa: E402
+
+
+def _wait(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.finished is None:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return job
+
+
+def _job(manager, name="chat.txt"):
+    workdir = manager.new_workdir()
+    path = os.path.join(workdir, "input_000.html")
+    with open(path, "wb") as fh:
+        fh.write(b"<html></html>")
+    return Job(workdir, {}, [path], name, "text/plain")
+
+
+@pytest.fixture
+def manager(tmp_path):
+    managers = []
+
+    def make(run_job, **kwargs):
+        managers.append(JobManager(run_job, str(tmp_path / "jobs"), **kwargs))
+        return managers[-1]
+    yield make
+    for m in managers:
+        m.shutdown()
+
+
+def _write_result(job):
+    with open(job.result_path, "wb") as fh:
+        fh.write(b"ok")
+
+
+def test_job_runs_and_removes_its_uploads(manager):
+    jobs = manager(_write_result)
+    job = _wait(jobs.submit(_job(jobs)))
+    assert job.status == STATUS_DONE and job.error is None
+    assert not os.path.exists(job.input_paths[0])
+    with open(job.result_path, "rb") as fh:
+        assert fh.read() == b"ok"
+    assert jobs.get(job.id) is job
+    assert jobs.pending_count() == 0
+
+
+def test_failed_job_reports_the_error(manager, capsys):
+    def fail(job):
+        raise ValueError("bad export")
+    jobs = manager(fail)
+    job = _wait(jobs.submit(_job(jobs)))
+    assert (job.status, job.error) == (STATUS_FAILED, "bad export")
+    assert "Traceback" in capsys.readouterr().err
+    assert not os.path.exists(job.input_paths[0])
+
+
+def test_queue_full(manager):
+    release = threading.Event()
+    jobs = manager(lambda job: release.wait(10), max_workers=1, max_pending=2)
+    running = [jobs.submit(_job(jobs))]
+    late = _job(jobs)  # workdir reserved while there was still room
+    running.append(jobs.submit(_job(jobs)))
+    with pytest.raises(JobQueueFull):
+        jobs.new_workdir()
+    # submitting it once the queue is full refuses it and removes its files
+    with pytest.raises(JobQueueFull):
+        jobs.submit(late)
+    assert not os.path.exists(late.workdir)
+    release.set()
+    for job in running:
+        _wait(job)
+    assert jobs.pending_count() == 0
+    _wait(jobs.submit(_job(jobs)))
+
+
+def test_finished_jobs_expire_after_the_ttl(manager):
+    jobs = manager(_write_result, ttl=60)
+    old = _wait(jobs.submit(_job(jobs)))
+    new = _wait(jobs.submit(_job(jobs)))
+    old.finished -= 61
+    new.finished -= 59
+    assert jobs.get(old.id) is None
+    assert not os.path.exists(old.workdir)
+    assert jobs.get(new.id) is new
+    assert os.path.exists(new.result_path)
+
+
+def test_running_jobs_never_expire(manager):
+    release = threading.Event()
+    jobs = manager(lambda job: release.wait(10), ttl=0)
+    job = jobs.submit(_job(jobs))
+    job.created -= 3600
+    assert jobs.get(job.id) is job
+    release.set()
+    _wait(job)
+
+
+def test_drain_waits_for_running_jobs_and_refuses_new_ones(manager):
+    release = threading.Event()
+    jobs = manager(lambda job: release.wait(10))
+    job = jobs.submit(_job(jobs))
+    assert jobs.drain(0.05) is False
+    with pytest.raises(JobQueueFull):
+        jobs.new_workdir()
+    release.set()
+    assert jobs.drain(10) is True
+    assert _wait(job).status == STATUS_DONE
+
+
+# -- /jobs --
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    jobs = JobManager(app.run_conversion_job, str(tmp_path / "jobs"), max_workers=1, max_pending=1)
+    monkeypatch.setattr(app, "JOB_MANAGER", jobs)
+    monkeypatch.setattr(app, "UPLOAD_BUDGET", ByteBudget(1 << 20))
+    monkeypatch.setattr(app.ENTRY_CACHE, "max_bytes", 0)
+    yield app.app.test_client()
+    jobs.shutdown()
+
+
+def _submit(client):
+    """(status code, headers, JSON body) of a /jobs submission; the response is closed."""
+    with client.post("/jobs", content_type="multipart/form-data",
+                     data={"file": (io.BytesIO(app.WARM_UP_HTML), "messages.html")}) as response:
+        return response.status_code, response.headers, response.get_json()
+
+
+def test_job_endpoints_give_the_same_result_as_convert(client):
+    code, _, body = _submit(client)
+    assert code == 202
+    _wait(app.JOB_MANAGER.get(body["id"]))
+    status = client.get(body["status_url"]).get_json()
+    assert status["status"] == STATUS_DONE
+    assert status["progress"]["files_parsed"] == 1
+    result = client.get(body["result_url"])
+    direct = client.post("/convert", content_type="multipart/form-data",
+                         data={"file": (io.BytesIO(app.WARM_UP_HTML), "messages.html")})
+    assert result.get_data() == direct.get_data()
+    result.close()
+    direct.close()
+    assert app.UPLOAD_BUDGET.in_use == 0
+
+
+def test_job_endpoints_when_the_queue_is_full(client):
+    release = threading.Event()
+    app.JOB_MANAGER.run_job = lambda job: release.wait(10)
+    _, _, first = _submit(client)
+    code, headers, _ = _submit(client)
+    assert code == 503
+    assert headers["Retry-After"] == str(app.JOB_RETRY_AFTER)
+    # only the accepted job has a workdir
+    assert os.listdir(app.JOB_MANAGER.base_dir) == [first["id"]]
+    assert client.get(first["result_url"]).status_code == 409
+    release.set()
+    _wait(app.JOB_MANAGER.get(first["id"]))
+    assert app.UPLOAD_BUDGET.in_use == 0
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.get("/jobs/nope/result").status_code == 404
@@ -0,0 +1,107 @@
+# test_media.py — MediaLibrary naming, its byte budget, and media in ZIP results
+
+import datetime
+import io
+import os
+import re
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.export_generator import write_exports  # noqa: E402
+from media import ATTACHED_SUFFIX, MEDIA_OMITTED, ExportArchive, MediaLibrary, media_ref  # noqa: E402
+from zipstream import ENCRYPTION_AES, ENCRYPTION_ZIPCRYPTO, aes_available  # noqa: E402
+
+
+def _archive(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("chat/messages.html", "<html></html>")
+        for name, data in files.items():
+            z.writestr("chat/" + name, data)
+    buf.seek(0)
+    return ExportArchive(buf)
+
+
+def _line(link):
+    return "01/02/24, 10:00 AM - Ana: %s" % media_ref(datetime.date(2024, 1, 2), link)
+
+
+def test_budget_leaves_later_files_out():
+    archive = _archive({"photos/a.jpg": b"a" * 60, "photos/b.jpg": b"b" * 60,
+                        "photos/c.jpg": b"a" * 60, "files/d.txt": b"d" * 30})
+    library = MediaLibrary([archive], max_bytes=100)
+    out = list(library.rewrite_lines([_line("photos/a.jpg"), _line("photos/b.jpg"),
+                                      _line("photos/c.jpg"), _line("files/d.txt")]))
+    assert out[0].endswith("IMG-20240102-WA0000.jpg" + ATTACHED_SUFFIX)
+    assert out[1].endswith(MEDIA_OMITTED)
+    # identical to a stored file: costs nothing
+    assert out[2].endswith("IMG-20240102-WA0000.jpg" + ATTACHED_SUFFIX)
+    assert out[3].endswith("DOC-20240102-WA0001.txt" + ATTACHED_SUFFIX)
+    assert library.stats() == {"files": 2, "bytes": 90, "duplicates": 1, "missing": 0,
+                               "over_budget": 1}
+    assert [entry[0] for entry in library.iter_zip_entries()] == ["IMG-20240102-WA0000.jpg",
+                                                                   "DOC-20240102-WA0001.txt"]
+    archive.close()
+
+
+def test_no_budget_by_default():
+    archive = _archive({"photos/a.jpg": b"a" * 1000})
+    library = MediaLibrary([archive])
+    assert list(library.rewrite_lines([_line("photos/a.jpg")]))[0].endswith(ATTACHED_SUFFIX)
+    assert library.stats()["over_budget"] == 0
+    archive.close()
+
+
+def test_media_budget_by_protection(monkeypatch):
+    monkeypatch.setattr(app, "MAX_MEDIA_BYTES", 1000)
+    monkeypatch.setattr(app, "MAX_SLOW_MEDIA_BYTES", 10)
+    assert app.media_budget() == 1000
+    assert app.media_budget("pw", ENCRYPTION_AES) == 1000
+    assert app.media_budget("pw", ENCRYPTION_ZIPCRYPTO) == 10
+    monkeypatch.setattr(app, "MAX_MEDIA_BYTES", 0)
+    assert app.media_budget("pw", ENCRYPTION_ZIPCRYPTO) == 10
+    assert app.media_budget(None, ENCRYPTION_ZIPCRYPTO) == 0
+
+
+def _export_zip(tmp_path):
+    paths = write_exports(str(tmp_path / "export"), 200, seed=3, media=0.3)
+    links = set()
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            links.update(re.findall(r'href="(photos/[^"]+)"', fh.read()))
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for path in paths:
+            z.write(path, "ChatExport/" + os.path.basename(path))
+        for link in sorted(links):
+            z.writestr("ChatExport/" + link, os.urandom(3000))
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("encryption", [
+    ENCRYPTION_ZIPCRYPTO,
+    pytest.param(ENCRYPTION_AES, marks=pytest.mark.skipif(not aes_available(), reason="needs cryptography")),
+])
+def test_password_result_stores_media_as_is(tmp_path, encryption):
+    upload = _export_zip(tmp_path)
+    client = app.app.test_client()
+    response = client.post("/convert_zip", content_type="multipart/form-data", data={
+        "file": [(io.BytesIO(upload), "export.zip")], "filename": "chat.txt",
+        "password": "rahasia", "encryption": encryption})
+    assert response.status_code == 200
+    z = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    response.close()
+    photos = [info for info in z.infolist() if info.filename.endswith(".jpg")]
+    assert photos
+    method = (lambda info: info.compress_type) if encryption == ENCRYPTION_ZIPCRYPTO else \
+        (lambda info: int.from_bytes(info.extra[9:11], "little"))  # AES extra field: real method
+    assert all(method(info) == zipfile.ZIP_STORED for info in photos)
+    assert method(z.getinfo("chat.txt")) == zipfile.ZIP_DEFLATED
+    if encryption == ENCRYPTION_ZIPCRYPTO:
+        z.setpassword(b"rahasia")
+        assert z.testzip() is None
@@ -0,0 +1,117 @@
+# test_merge.py — multi-file uploads: pool vs serial parsing, the k-way merge,
+# and joined follow-ups continuing the sender of the page before
+
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.export_generator import FOOTER, HEADER, START, render_message, write_exports  # noqa: E402
+from result_cache import EntryCache  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    return write_exports(str(tmp_path_factory.mktemp("merge")), 1500, files=3, seed=11,
+                         media=0.05, spam=0.1, joined=0.3, reply=0.1)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _shutdown_pool():
+    yield
+    if app._parse_pool is not None:
+        app._parse_pool.shutdown()
+        app._parse_pool = None
+
+
+def _runs(sources, workers):
+    return app.parse_files_to_runs(sources, workers=workers, cache=EntryCache(0))
+
+
+def _dump(runs):
+    return [(list(run.iter_rows()), run.names) for run in runs]
+
+
+def test_pool_output_is_byte_identical_to_serial(exports):
+    serial = _runs(exports, 1)
+    pooled = _runs(exports, 2)
+    assert _dump(pooled) == _dump(serial)
+    assert "\n".join(app.iter_merged_lines(pooled)) == "\n".join(app.iter_merged_lines(serial))
+
+
+def test_pool_parses_uploads_given_as_bytes(exports):
+    payloads = []
+    for path in exports:
+        with open(path, "rb") as fh:
+            payloads.append(fh.read())
+    assert "\n".join(app.iter_merged_lines(_runs(payloads, 2))) == \
+        "\n".join(app.iter_merged_lines(_runs(exports, 1)))
+
+
+def test_merge_is_a_stable_sort_of_the_runs(exports):
+    runs = _runs(exports, 1)
+    # one global stable sort of every run's entries, in upload order
+    expected = sorted((entry for run in runs for entry in run.iter_entries()), key=lambda e: e[0])
+    merged = list(app.iter_merged_entries(runs))
+    assert merged == expected
+    assert [line for _, line in merged] == list(app.iter_merged_lines(runs, dedupe=False))
+    assert all(a[0] <= b[0] for a, b in zip(merged, merged[1:]))
+    # the exports have equal instants, so the tie order is exercised
+    assert any(a[0] == b[0] for a, b in zip(merged, merged[1:]))
+
+
+
+def _page(path, messages):
+    """messages: (id, minute, sender, text, joined)."""
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(HEADER)
+        for msg_id, minute, sender, text, joined in messages:
+            fh.write(render_message(msg_id, START + datetime.timedelta(minutes=minute), sender, text,
+                                    joined=joined))
+        fh.write(FOOTER)
+    return path
+
+
+@pytest.fixture
+def split_export(tmp_path):
+    """A chat split into two pages; the second starts with a follow-up of the last sender of the first."""
+    first = _page(str(tmp_path / "messages.html"), [
+        (1, 0, "Sari Utami", "pagi semua", False),
+        (2, 1, "Budi Santoso", "pagi juga kak", False),
+    ])
+    second = _page(str(tmp_path / "messages2.html"), [
+        (3, 2, "Budi Santoso", "sudah sarapan belum", True),
+        (4, 3, "Sari Utami", "sudah dong", False),
+    ])
+    return first, second
+
+
+def _text(sources, workers=1):
+    return list(app.iter_merged_lines(_runs(sources, workers)))
+
+
+def test_joined_sender_carries_across_pages(split_export):
+    first, second = split_export
+    assert app.joined_carry_senders([first, second]) == [None, "Budi Santoso"]
+    lines = _text([first, second])
+    assert len(lines) == 4
+    assert lines[2].endswith(" - Budi Santoso: sudah sarapan belum")
+
+
+def test_joined_carry_does_not_depend_on_upload_order_or_pool(split_export):
+    first, second = split_export
+    expected = _text([first, second])
+    assert app.joined_carry_senders([second, first]) == ["Budi Santoso", None]
+    assert _text([second, first]) == expected
+    assert _text([second, first], workers=2) == expected
+
+
+def test_joined_message_without_previous_page_is_dropped(split_export):
+    _, second = split_export
+    lines = _text([second])
+    assert len(lines) == 1
+    assert lines[0].endswith(" - Sari Utami: sudah dong")
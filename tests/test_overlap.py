@@ -0,0 +1,118 @@
+# test_overlap.py — duplicates across overlapping exports: the time-windowed
+# OverlapIndex at the edge of DEDUPE_WINDOW_SECONDS, and ExportIndex
+# containment
+
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.export_generator import FOOTER, HEADER, START, render_message  # noqa: E402
+from entry_store import EntryStore  # noqa: E402
+from overlap import ExportIndex, OverlapIndex, find_contained  # noqa: E402
+
+WIB = datetime.timezone(datetime.timedelta(hours=7))
+T0 = datetime.datetime(2025, 6, 3, 19, 0, tzinfo=WIB)
+SECOND = 1000000
+
+
+# -- OverlapIndex --
+def test_same_instant_only_by_default():
+    overlap = OverlapIndex()
+    assert not overlap.seen(0, "budi", b"halo")
+    assert overlap.seen(0, "budi", b"halo")
+    assert not overlap.seen(1, "budi", b"halo")
+    assert not overlap.seen(1, "sari", b"halo")
+    assert not overlap.seen(1, "budi", b"halo juga")
+    assert overlap.dropped == 1
+
+
+@pytest.mark.parametrize("delta,duplicate", [
+    (60 * SECOND - 1, True),
+    (60 * SECOND, True),       # exactly at the window edge still counts
+    (60 * SECOND + 1, False),  # just past it is a new message
+])
+def test_window_edge(delta, duplicate):
+    overlap = OverlapIndex(60 * SECOND)
+    assert not overlap.seen(10 * SECOND, "budi", b"halo")
+    assert overlap.seen(10 * SECOND + delta, "budi", b"halo") is duplicate
+    assert overlap.dropped == int(duplicate)
+
+
+def test_window_slides_with_the_latest_sighting():
+    overlap = OverlapIndex(60 * SECOND)
+    assert not overlap.seen(0, "budi", b"halo")
+    assert not overlap.seen(61 * SECOND, "budi", b"halo")
+    # measured from the sighting at 61 s, not the first one
+    assert overlap.seen(121 * SECOND, "budi", b"halo")
+    assert not overlap.seen(182 * SECOND, "budi", b"halo")
+    assert len(overlap._last) == 1 and len(overlap._order) == 1
+
+
+# -- through the merge --
+def _run(rows):
+    """rows: (seconds after T0, sender, content), already in time order."""
+    store = EntryStore()
+    for seconds, sender, content in rows:
+        store.add(T0 + datetime.timedelta(seconds=seconds), store.sender_id(sender, sender.lower()),
+                  content)
+    store.sort()
+    return store
+
+
+@pytest.mark.parametrize("offset,kept", [(0, 2), (60, 2), (61, 3)])
+def test_merge_drops_repeats_up_to_the_window_edge(monkeypatch, offset, kept):
+    monkeypatch.setattr(app, "DEDUPE_WINDOW_SECONDS", 60)
+    first = _run([(0, "Budi", "halo"), (30, "Sari", "pagi")])
+    second = _run([(offset, "Budi", "halo")])
+    lines = list(app.iter_merged_lines([first, second], dedupe=True))
+    assert len(lines) == kept
+    assert sum(line.endswith(" - Budi: halo") for line in lines) == kept - 1
+
+
+def test_merge_without_window_keeps_repeats_a_second_apart(monkeypatch):
+    monkeypatch.setattr(app, "DEDUPE_WINDOW_SECONDS", 0)
+    lines = list(app.iter_merged_lines([_run([(0, "Budi", "halo")]), _run([(1, "Budi", "halo")])],
+                                       dedupe=True))
+    assert len(lines) == 2
+
+
+# -- ExportIndex --
+def _export(messages, chat="Benchmark Group"):
+    """messages: (id, minute)."""
+    parts = [HEADER.replace("Benchmark Group", chat)]
+    parts.extend(render_message(msg_id, START + datetime.timedelta(minutes=minute), "Budi", "pesan %d" % msg_id)
+                 for msg_id, minute in messages)
+    parts.append(FOOTER)
+    return "".join(parts).encode("utf-8")
+
+
+def _index(data, chunk_size=4096):
+    return ExportIndex.scan(data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_scan_is_independent_of_chunking(chunk_size):
+    data = _export([(i, i) for i in range(1, 40)])
+    index = _index(data, chunk_size)
+    assert list(index.ids) == list(range(1, 40))
+    assert list(index.titles) == list(_index(data).titles)
+    assert index.chat == b"Benchmark Group"
+
+
+def test_covers_and_find_contained():
+    full = _index(_export([(i, i) for i in range(1, 30)]))
+    older = _index(_export([(i, i) for i in range(1, 20)]))
+    edited = _index(_export([(i, i + (i == 5)) for i in range(1, 20)]))
+    beyond = _index(_export([(i, i) for i in range(10, 35)]))
+    assert full.covers(older) and not older.covers(full)
+    assert not full.covers(edited)   # message 5 has another date title
+    assert not full.covers(beyond)
+    assert not full.covers(_index(_export([(i, i) for i in range(1, 20)], chat="Grup Lain")))
+    assert find_contained([older, full, edited, beyond]) == {0: 1}
+    # of two identical exports the later one is contained
+    assert find_contained([full, _index(_export([(i, i) for i in range(1, 30)]))]) == {1: 0}
@@ -0,0 +1,76 @@
+# test_records.py — NDJSON records: the "media" field comes from the parser,
+# not from what the content says
+
+import datetime
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.export_generator import FOOTER, HEADER, START, render_message  # noqa: E402
+from media import MEDIA_OMITTED, MEDIA_REF  # noqa: E402
+from result_cache import EntryCache  # noqa: E402
+
+
+@pytest.fixture
+def export(tmp_path):
+    """A photo, a text that reads like the media placeholder, and a photo dropped as a third in a row."""
+    messages = [
+        (1, 0, "Sari Utami", "", True),
+        (2, 1, "Budi Santoso", "&lt;Media omitted&gt;", False),
+        (3, 2, "Eko Prasetyo", "kirim foto dulu ya", False),
+        (4, 3, "Eko Prasetyo", "", True),
+        (5, 4, "Eko Prasetyo", "", True),
+    ]
+    path = str(tmp_path / "messages.html")
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(HEADER)
+        for msg_id, minute, sender, text, media in messages:
+            fh.write(render_message(msg_id, START + datetime.timedelta(minutes=minute), sender, text,
+                                    media=media))
+        fh.write(FOOTER)
+    return path
+
+
+def _records(path, **args):
+    with open(path, "rb") as fh:
+        data = fh.read()
+    query = "&".join("%s=%s" % item for item in {"format": "ndjson", **args}.items())
+    with app.app.test_client().post("/convert?" + query, content_type="multipart/form-data",
+                                    data={"file": (io.BytesIO(data), "messages.html")}) as response:
+        assert response.status_code == 200
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture(autouse=True)
+def _no_entry_cache(monkeypatch):
+    monkeypatch.setattr(app.ENTRY_CACHE, "max_bytes", 0)
+
+
+def test_media_flag_is_not_read_off_the_content(export):
+    records = _records(export)
+    assert [(r["name"], r["content"], r["media"]) for r in records] == [
+        ("Sari Utami", MEDIA_OMITTED, True),
+        ("Budi Santoso", MEDIA_OMITTED, False),
+        ("Eko Prasetyo", "kirim foto dulu ya", False),
+        ("Eko Prasetyo", MEDIA_OMITTED, True),
+    ]
+
+
+def test_dropped_media_message_keeps_its_flag(export):
+    records = _records(export, dropped="1")
+    dropped = [r for r in records if r["dropped"] is not None]
+    assert [(r["content"], r["media"], r["dropped"]) for r in dropped] == \
+        [(MEDIA_OMITTED, True, app.DROP_CONSECUTIVE)]
+
+
+def test_media_reference_lines_are_media(export):
+    runs = app.parse_files_to_runs([export], workers=1, cache=EntryCache(0), keep_media=True)
+    records = [json.loads(r) for r in app.iter_merged_records(runs, ["messages.html"])]
+    assert [r["content"].startswith(MEDIA_REF) for r in records] == [True, False, False, True]
+    assert [r["media"] for r in records] == [True, False, False, True]
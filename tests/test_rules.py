@@ -0,0 +1,58 @@
+# test_rules.py — rules config validation and hot reload
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rules import RuleStore, load_rules, normalize_config  # noqa: E402
+
+
+@pytest.mark.parametrize("pattern", [
+    r"(?P<price>\d+)k",       # clashes with the combined regex's group names
+    r"(\d)\1 ?k",             # group numbers shift once combined
+    r"(a)?(?(1)b|c)",
+    r"(",
+])
+def test_rejects_regex_that_cannot_be_combined(pattern):
+    with pytest.raises(ValueError):
+        normalize_config({"version": "v1", "price_re": pattern})
+
+
+def test_accepts_plain_groups():
+    config = normalize_config({"version": "v1", "price_re": r"\b(\d+)\s*(k|rb)\b"})
+    assert config["price_re"] == r"\b(\d+)\s*(k|rb)\b"
+
+
+def _write(path, config):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(config, fh)
+
+
+def test_failed_reload_keeps_rules_and_retries_after_fix(tmp_path):
+    path = str(tmp_path / "rules.json")
+    _write(path, {"version": "v1"})
+    store = RuleStore(path, check_interval=0)
+    assert store.current().version == "v1"
+
+    _write(path, {"version": "v2", "price_re": r"(?P<price>\d+)k"})
+    os.utime(path, ns=(1, 1))
+    assert store.current().version == "v1"
+    assert store.last_error is not None
+    assert store.current().version == "v1"  # the broken version is not reloaded again
+
+    _write(path, {"version": "v3", "price_re": r"\d+k"})
+    os.utime(path, ns=(2, 2))
+    assert store.current().version == "v3"
+    assert store.last_error is None
+    assert store.reloads == 1
+
+
+def test_load_rules_reports_bad_file(tmp_path):
+    path = str(tmp_path / "rules.json")
+    _write(path, {"version": "v1", "link_re": r"(x)\1"})
+    with pytest.raises(ValueError):
+        load_rules(path)
@@ -0,0 +1,95 @@
+# test_stream_parser.py — the streaming parser against the BeautifulSoup path
+#
+# Every fragment is parsed by iter_message_elements() at several chunk
+# sizes (so tags, entities and UTF-8 sequences are split across chunk
+# boundaries) and by soup.select(".message.default"); extract_record() must
+# give the same fields for every message either way.
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+bs4 = pytest.importorskip("bs4")
+
+from message_record import extract_record  # noqa: E402
+from stream_parser import iter_message_elements  # noqa: E402
+
+CHUNK_SIZES = (1, 3, 7, 4096)
+
+
+def _message(body, classes="message default clearfix", msg_id="message1"):
+    return '<div class="%s" id="%s">%s</div>' % (classes, msg_id, body)
+
+
+DATE = '<div class="pull_right date details" title="03.06.2025 19:12:00 UTC+07:00">19:12</div>'
+NAME = '<div class="from_name">Budi Santoso </div>'
+
+FRAGMENTS = {
+    "plain": _message(DATE + NAME + '<div class="text">selamat pagi semua</div>'),
+    "br": _message(DATE + NAME + '<div class="text">baris satu<br>baris dua<br/>baris tiga<BR></div>'),
+    "entities": _message(DATE + NAME + '<div class="text">AT&amp;T &lt;b&gt; &nbsp;x&#128512;&#x1F600;'
+                                       ' &copy 2025 &notit; &unknown; &#0; &#xD800;</div>'),
+    "entity title": _message('<div class="date" title="03.06.2025 19:12:00 &amp; more">19:12</div>'
+                             + NAME + '<div class="text">t</div>'),
+    "nested text": _message(DATE + NAME + '<div class="text">luar <div class="text">dalam</div>'
+                                          ' <span>span <b>tebal</b></span> akhir</div>'),
+    "joined": _message(DATE + NAME + '<div class="text">pertama</div>', msg_id="message1")
+              + _message(DATE + '<div class="text">lanjutan</div>',
+                         classes="message default clearfix joined", msg_id="message2"),
+    "media": _message(DATE + NAME + '<div class="media_wrap clearfix"><a class="photo_wrap"'
+                      ' href="photos/photo_1@03-06-2025_19-12-00.jpg"><img class="photo"'
+                      ' src="photos/photo_1_thumb.jpg"></a></div><div class="text">lihat</div>'),
+    "reply": _message(DATE + NAME + '<div class="reply_to details">In reply to <a href="#go_to_message5"'
+                      ' onclick="return GoToMessage(5)">this message</a></div><div class="text">ya</div>'),
+    "bot": _message(DATE + NAME + '<div class="text"><a href="" onclick="return ShowBotCommand(\'start\')">'
+                    '/start</a></div><table class="bot_buttons_table"><tr><td>x</td></tr></table>'
+                    '<blockquote>kutipan</blockquote>'),
+    "script and comment": _message(DATE + NAME + '<div class="text">a<script>var x = "<div>";</script>b'
+                                   '<style>.x{}</style>c<!-- komentar -->d</div>'),
+    "unclosed": _message(DATE + NAME + '<div class="text"><p>satu<p>dua<span>tiga</div>'),
+    "stray end tags": '</div></span>' + _message(DATE + NAME + '<div class="text">x</b></div>') + '</div>',
+    "unicode": _message(DATE + '<div class="from_name">Дмитрий 😀</div>'
+                        '<div class="text">Привет 👋🏽 ünïcödé — ok</div>'),
+    "service and case": '<div class="message service" id="message0"><div class="body details">1 June</div>'
+                        '</div><DIV class="message default" id="message3">' + DATE
+                        + '<DIV class="from_name">Eko</DIV><div class="text">Huruf BESAR</div></DIV>',
+    "doctype and void": '<!DOCTYPE html><?xml version="1.0"?><html><head><meta charset="utf-8"><link'
+                        ' rel="x" href="y"></head><body>' + _message(
+                            DATE + NAME + '<div class="text">a<img src="x.png">b<wbr>c<hr>d</div>')
+                        + '</body></html>',
+    "attribute quirks": _message('<div class="date" title=\'03.06.2025 19:12:00 UTC+07:00\' data-x="a>b">'
+                                 '19:12</div><div class="from_name" >Sari</div><div class=text>tanpa'
+                                 ' kutip</div>'),
+}
+
+
+def _fields(rec):
+    return tuple(getattr(rec, name) for name in rec.__slots__)
+
+
+def _soup_records(html_text):
+    soup = bs4.BeautifulSoup(html_text, "html.parser")
+    return [_fields(extract_record(msg)) for msg in soup.select(".message.default")]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("name", sorted(FRAGMENTS))
+def test_same_records_as_soup(name, chunk_size):
+    html_text = "<html><body>%s</body></html>" % FRAGMENTS[name]
+    expected = _soup_records(html_text)
+    assert expected, name
+    got = [_fields(extract_record(msg))
+           for msg in iter_message_elements(io.BytesIO(html_text.encode("utf-8")), chunk_size)]
+    assert got == expected
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_whole_export_same_as_soup(chunk_size):
+    html_text = "<html><body>%s</body></html>" % "".join(FRAGMENTS[name] for name in sorted(FRAGMENTS))
+    got = [_fields(extract_record(msg))
+           for msg in iter_message_elements(io.BytesIO(("\ufeff" + html_text).encode("utf-8")), chunk_size)]
+    assert got == _soup_records(html_text)
@@ -0,0 +1,76 @@
+# test_zipstream.py — streamed ZIP archives read back with zipfile
+
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zipstream import (  # noqa: E402
+    ENCRYPTION_AES, ENCRYPTION_ZIPCRYPTO, ZipCryptoEncrypter, aes_available, iter_zip_entries,
+    iter_zip_single,
+)
+
+TEXT = b"".join(b"01/02/24, 10:%02d AM - Ana: pesan nomor %d\n" % (i % 60, i) for i in range(5000))
+
+
+def _legacy_encrypt(password, data):
+    """The byte-at-a-time loop ZipCryptoEncrypter.encrypt replaced."""
+    enc = ZipCryptoEncrypter(password)
+    crc, ks = enc._crc, enc._keystream
+    k0, k1, k2 = enc.k0, enc.k1, enc.k2
+    out = bytearray(data)
+    for i, b in enumerate(data):
+        out[i] = b ^ ks[k2 & 0xFFFF]
+        k0 = (k0 >> 8) ^ crc[(k0 ^ b) & 0xFF]
+        k1 = ((k1 + (k0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        k2 = (k2 >> 8) ^ crc[(k2 ^ (k1 >> 24)) & 0xFF]
+    return bytes(out)
+
+
+def test_zipcrypto_keystream_unchanged():
+    data = os.urandom(3000)
+    enc = ZipCryptoEncrypter(b"rahasia")
+    assert enc.encrypt(data[:1000]) + enc.encrypt(data[1000:]) == _legacy_encrypt(b"rahasia", data)
+    assert enc.encrypt(b"") == b""
+
+
+@pytest.mark.parametrize("password,encryption", [
+    (None, ENCRYPTION_ZIPCRYPTO),
+    ("rahasia", ENCRYPTION_ZIPCRYPTO),
+    pytest.param("rahasia", ENCRYPTION_AES,
+                 marks=pytest.mark.skipif(not aes_available(), reason="needs cryptography")),
+])
+def test_round_trip(password, encryption):
+    chunks = [TEXT[i:i + 4096] for i in range(0, len(TEXT), 4096)]
+    data = b"".join(iter_zip_single("chat.txt", chunks, password=password, encryption=encryption))
+    z = zipfile.ZipFile(io.BytesIO(data))
+    if encryption == ENCRYPTION_AES:
+        assert z.getinfo("chat.txt").compress_type == 99
+        return  # zipfile cannot decrypt AES
+    if password:
+        z.setpassword(password.encode())
+    assert z.read("chat.txt") == TEXT
+    assert z.testzip() is None
+
+
+def test_zipcrypto_streams_before_the_input_ends():
+    """The first bytes go out while the entry is still being read: nothing is spooled."""
+    consumed = []
+
+    def chunks():
+        for i in range(0, len(TEXT), 4096):
+            consumed.append(i)
+            yield TEXT[i:i + 4096]
+
+    stream = iter_zip_entries([("chat.txt", chunks(), False, None)], password="rahasia")
+    next(stream)  # local header
+    next(stream)  # encryption header
+    next(stream)  # the first stored chunk
+    assert len(consumed) == 1
+    rest = b"".join(stream)
+    assert len(consumed) == len(range(0, len(TEXT), 4096))
+    assert rest
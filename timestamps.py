@@ -0,0 +1,173 @@
+# timestamps.py — Telegram timestamp parsing and WhatsApp prefix formatting
+#
+# Telegram puts "dd.mm.YYYY HH:MM:SS UTC+hh:mm" in the title of every
+# .date element. Parsing it with datetime.strptime (and catching the
+# exception when the fallback format is tried) was a noticeable part of the
+# per-message cost, so the common shapes are sliced by hand here and strptime
+# is only used for anything unusual, which keeps the accepted inputs the same.
+#
+# Parsed datetimes carry the UTC offset from the title, so exports taken in
+# different timezones merge in real time order. The wall-clock time (what
+# ends up in the output lines) is unchanged.
+
+import datetime
+import re
+from functools import lru_cache
+
+TITLE_FORMAT = "%d.%m.%Y %H:%M:%S"
+ALT_FORMAT = "%m/%d/%y, %I:%M %p"
+PREFIX_FORMAT = "%m/%d/%y, %I:%M %p"
+
+UTC = datetime.timezone.utc
+_EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+
+_TITLE_RE = re.compile(r"(\d\d)\.(\d\d)\.(\d{4}) (\d\d):(\d\d):(\d\d)", re.ASCII)
+
+_tz_cache = {}
+
+
+def parse_utc_offset(s):
+    """
+    "+07:00" / "-03:30" / "+0700" / "" -> datetime.timezone, or None when the
+    text is not an offset. An empty offset ("UTC") is UTC.
+    """
+    tz = _tz_cache.get(s)
+    if tz is not None:
+        return tz
+    s2 = s.strip()
+    if not s2:
+        tz = UTC
+    else:
+        sign = s2[0]
+        digits = s2[1:].replace(":", "")
+        if sign not in "+-" or len(digits) not in (2, 4) or not (digits.isascii() and digits.isdigit()):
+            return None
+        hours = int(digits[:2])
+        minutes = int(digits[2:]) if len(digits) == 4 else 0
+        if hours > 23 or minutes > 59:
+            return None
+        delta = datetime.timedelta(hours=hours, minutes=minutes)
+        tz = datetime.timezone(-delta if sign == "-" else delta)
+    if len(_tz_cache) < 256:
+        _tz_cache[s] = tz
+    return tz
+
+
+def _is_ascii_digits(s):
+    return s.isascii() and s.isdigit()
+
+
+def _fast_alt(s):
+    """'MM/DD/YY, HH:MM AM' -> naive datetime, or None if the shape differs."""
+    if (len(s) != 18 or s[2] != "/" or s[5] != "/" or s[8:10] != ", "
+            or s[12] != ":" or s[15] != " "):
+        return None
+    ampm = s[16:18]
+    if ampm not in ("AM", "PM"):
+        return None
+    m, d, y, hh, mi = s[0:2], s[3:5], s[6:8], s[10:12], s[13:15]
+    if not _is_ascii_digits(m + d + y + hh + mi):
+        return None
+    hour = int(hh)
+    if not 1 <= hour <= 12:
+        return None
+    year = int(y)
+    year += 1900 if year >= 69 else 2000  # same pivot as %y
+    hour = hour % 12 + (12 if ampm == "PM" else 0)
+    try:
+        return datetime.datetime(year, int(m), int(d), hour, int(mi))
+    except ValueError:
+        return None
+
+
+def _slow_parse(t):
+    """
+    The original strptime chain, for inputs the fast paths don't recognise.
+    Returns (datetime or None, True if the title format matched).
+    """
+    try:
+        return datetime.datetime.strptime(t.split(" UTC")[0], TITLE_FORMAT), True
+    except Exception:
+        try:
+            return datetime.datetime.strptime(t.strip(), ALT_FORMAT), False
+        except Exception:
+            return None, False
+
+
+def parse_telegram_datetime(t, default_tz=None):
+    """
+    Parse a Telegram .date title (or the fallback "MM/DD/YY, HH:MM AM/PM"
+    text). Returns an aware datetime in the title's UTC offset; when the text
+    has no offset it gets default_tz (naive if default_tz is None). Returns
+    None when the text is not a timestamp.
+    """
+    if not t:
+        return None
+    head, sep, tail = t.partition(" UTC")
+    m = _TITLE_RE.fullmatch(head)
+    if m is not None:
+        tz = parse_utc_offset(tail) if sep else None
+        if tz is None:
+            tz = default_tz
+        d, mo, y, hh, mi, ss = m.groups()
+        try:
+            return datetime.datetime(int(y), int(mo), int(d), int(hh), int(mi), int(ss), tzinfo=tz)
+        except ValueError:
+            # e.g. 31.02: strptime rejects it too and it can't be the fallback format
+            return None
+
+    dt = _fast_alt(t.strip())
+    from_title = False
+    if dt is None:
+        dt, from_title = _slow_parse(t)
+        if dt is None:
+            return None
+    tz = parse_utc_offset(tail) if (from_title and sep) else None
+    if tz is None:
+        tz = default_tz
+    return dt.replace(tzinfo=tz) if tz is not None else dt
+
+
+@lru_cache(maxsize=8192)
+def _prefix_for_minute(year, month, day, hour, minute):
+    return datetime.datetime(year, month, day, hour, minute).strftime(PREFIX_FORMAT)
+
+
+def format_prefix(dt):
+    """WhatsApp "MM/DD/YY, HH:MM AM/PM" prefix, memoized per wall-clock minute."""
+    return _prefix_for_minute(dt.year, dt.month, dt.day, dt.hour, dt.minute)
+
+
+@lru_cache(maxsize=8192)
+def _prefix_for_epoch_minute(minute):
+    return (_EPOCH_NAIVE + datetime.timedelta(minutes=minute)).strftime(PREFIX_FORMAT)
+
+
+def format_prefix_wall(wall_seconds):
+    """format_prefix() for a wall-clock time given as seconds since 1970-01-01 00:00."""
+    return _prefix_for_epoch_minute(wall_seconds // 60)
+
+
+@lru_cache(maxsize=8192)
+def _iso_for_epoch_minute(minute):
+    return (_EPOCH_NAIVE + datetime.timedelta(minutes=minute)).strftime("%Y-%m-%dT%H:%M")
+
+
+@lru_cache(maxsize=256)
+def _iso_offset(seconds):
+    sign = "-" if seconds < 0 else "+"
+    seconds = abs(seconds)
+    return "%s%02d:%02d" % (sign, seconds // 3600, seconds % 3600 // 60)
+
+
+def format_iso_instant(us, utc_offset):
+    """
+    ISO 8601 wall-clock time with offset ("2025-06-03T19:12:00+07:00") of
+    an instant in µs since the epoch, at utc_offset seconds from UTC.
+    """
+    wall = us // 1000000 + utc_offset
+    text = "%s:%02d" % (_iso_for_epoch_minute(wall // 60), wall % 60)
+    micro = us % 1000000
+    if micro:
+        text += ".%06d" % micro
+    return text + _iso_offset(utc_offset)
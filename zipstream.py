@@ -0,0 +1,312 @@
+# zipstream.py — password-protected ZIP written straight into a response
+#
+# Replaces the pyminizip round trip (write txt to a temp dir, compress to a
+# second temp file, read it back). Entries are deflated and encrypted as the
+# data comes in and every header is emitted as soon as it is known, using a
+# data descriptor after each entry, so nothing touches the filesystem and
+# only one compressed chunk is held at a time.
+#
+# Encryption:
+#   - "zipcrypto": traditional PKWARE encryption, readable by every unzip
+#     tool and by WhatsApp/Android extractors (default, same as pyminizip)
+#   - "aes": WinZip AE-2 with AES-256; needs the optional `cryptography`
+#     package
+#
+# ZipCrypto's keystream depends on every plaintext byte, so
+# ZipCryptoEncrypter is a per-byte Python loop: about 2 MB/s of deflated
+# data (12 MB of chat text, 3 MB deflated: 1.8 s, against 0.5 s with AES).
+# It only encrypts what deflate leaves, so text pays for a quarter of its
+# size; stored media pay for all of it.
+#
+# Archives are limited to 4 GiB per entry (no ZIP64).
+
+import datetime
+import hashlib
+import hmac
+import os
+import struct
+import zlib
+
+ENCRYPTION_ZIPCRYPTO = "zipcrypto"
+ENCRYPTION_AES = "aes"
+ZIP_ENCRYPTIONS = (ENCRYPTION_ZIPCRYPTO, ENCRYPTION_AES)
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_AES_METHOD = 99
+
+FLAG_ENCRYPTED = 0x0001
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+
+AES_STRENGTH = 3          # AES-256
+AES_KEY_LEN = 32
+AES_SALT_LEN = 16
+AES_PBKDF2_ROUNDS = 1000
+AES_MAC_LEN = 10
+
+
+def aes_available():
+    try:
+        import cryptography.hazmat.primitives.ciphers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _dos_datetime(dt):
+    if dt.year < 1980:
+        dt = datetime.datetime(1980, 1, 1)
+    dos_date = (dt.year - 1980) << 9 | dt.month << 5 | dt.day
+    dos_time = dt.hour << 11 | dt.minute << 5 | (dt.second // 2)
+    return dos_date, dos_time
+
+
+# -----------------------
+# Traditional PKWARE (ZipCrypto) encryption
+# -----------------------
+def _make_crc_table():
+    table = []
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = (c >> 1) ^ 0xEDB88320 if c & 1 else c >> 1
+        table.append(c)
+    return table
+
+_zipcrypto_tables = None
+
+
+def zipcrypto_tables():
+    """
+    (CRC-32 table, keystream byte for every possible low half of key2,
+    key1 increment for every low byte of key0), built by the first
+    encrypted archive rather than at import.
+    """
+    global _zipcrypto_tables
+    tables = _zipcrypto_tables
+    if tables is None:
+        keystream = [((((t | 2) * ((t | 2) ^ 1)) >> 8) & 0xFF) for t in range(0x10000)]
+        # key1 = (key1 + low byte of key0) * 134775813 + 1, with the constant part looked up
+        key1_step = [b * 134775813 + 1 for b in range(256)]
+        tables = _zipcrypto_tables = (_make_crc_table(), keystream, key1_step)
+    return tables
+
+
+class ZipCryptoEncrypter:
+    def __init__(self, password):
+        self.k0, self.k1, self.k2 = 0x12345678, 0x23456789, 0x34567890
+        self._crc, self._keystream, self._key1_step = zipcrypto_tables()
+        for b in password:
+            self._update(b)
+
+    def _update(self, b):
+        crc = self._crc
+        self.k0 = (self.k0 >> 8) ^ crc[(self.k0 ^ b) & 0xFF]
+        self.k1 = ((self.k1 + (self.k0 & 0xFF)) * 134775813 + 1) & 0xFFFFFFFF
+        self.k2 = (self.k2 >> 8) ^ crc[(self.k2 ^ (self.k1 >> 24)) & 0xFF]
+
+    def encrypt(self, data):
+        # the loop only collects the keystream (keys and tables in locals,
+        # one bytearray append per byte); it is XORed onto the whole chunk
+        # at once, as two integers
+        crc = self._crc
+        ks = self._keystream
+        step = self._key1_step
+        k0, k1, k2 = self.k0, self.k1, self.k2
+        stream = bytearray()
+        append = stream.append
+        for b in data:
+            append(ks[k2 & 0xFFFF])
+            k0 = (k0 >> 8) ^ crc[(k0 ^ b) & 0xFF]
+            k1 = (k1 * 134775813 + step[k0 & 0xFF]) & 0xFFFFFFFF
+            k2 = (k2 >> 8) ^ crc[(k2 ^ (k1 >> 24)) & 0xFF]
+        self.k0, self.k1, self.k2 = k0, k1, k2
+        n = len(data)
+        return (int.from_bytes(data, "little") ^ int.from_bytes(stream, "little")).to_bytes(n, "little")
+
+    def header(self, check_byte):
+        """12-byte encryption header; the last byte lets unzip check the password."""
+        return self.encrypt(os.urandom(11) + bytes([check_byte]))
+
+
+# -----------------------
+# WinZip AES (AE-2) encryption
+# -----------------------
+class AesEncrypter:
+    """AES-256 in CTR mode with a little-endian counter, HMAC-SHA1 over the ciphertext."""
+
+    def __init__(self, password):
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        self.salt = os.urandom(AES_SALT_LEN)
+        key_material = hashlib.pbkdf2_hmac(
+            "sha1", password, self.salt, AES_PBKDF2_ROUNDS, 2 * AES_KEY_LEN + 2)
+        aes_key = key_material[:AES_KEY_LEN]
+        self.verifier = key_material[2 * AES_KEY_LEN:]
+        self._mac = hmac.new(key_material[AES_KEY_LEN:2 * AES_KEY_LEN], digestmod=hashlib.sha1)
+        self._ecb = Cipher(algorithms.AES(aes_key), modes.ECB()).encryptor()
+        self._counter = 1
+        self._keystream = b""
+
+    def header(self):
+        return self.salt + self.verifier
+
+    def encrypt(self, data):
+        need = len(data) - len(self._keystream)
+        if need > 0:
+            blocks = (need + 15) // 16
+            counters = b"".join(
+                (self._counter + i).to_bytes(16, "little") for i in range(blocks))
+            self._counter += blocks
+            self._keystream += self._ecb.update(counters)
+        ks = self._keystream[:len(data)]
+        self._keystream = self._keystream[len(data):]
+        n = len(data)
+        out = (int.from_bytes(data, "little") ^ int.from_bytes(ks, "little")).to_bytes(n, "little")
+        self._mac.update(out)
+        return out
+
+    def trailer(self):
+        return self._mac.digest()[:AES_MAC_LEN]
+
+
+# -----------------------
+# Streaming writer
+# -----------------------
+class ZipStreamWriter:
+    """
+    Write a ZIP archive as a stream of byte chunks.
+
+        zw = ZipStreamWriter(password="secret")
+        yield from zw.add_file("chat.txt", chunks)
+        yield from zw.close()
+
+    add_file() and close() are generators: nothing is written until the
+    caller iterates them. Without a password entries are not encrypted.
+    """
+
+    def __init__(self, password=None, encryption=ENCRYPTION_ZIPCRYPTO, compresslevel=5):
+        if encryption not in ZIP_ENCRYPTIONS:
+            raise ValueError("unsupported zip encryption: %r" % (encryption,))
+        if password and encryption == ENCRYPTION_AES and not aes_available():
+            raise RuntimeError("AES zip encryption needs the 'cryptography' package")
+        if isinstance(password, str):
+            password = password.encode("utf-8")
+        self.password = password or None
+        self.encryption = encryption
+        self.compresslevel = compresslevel
+        self._offset = 0
+        self._central = []
+        self._names = set()
+
+    def _emit(self, data):
+        self._offset += len(data)
+        return data
+
+    def add_file(self, name, chunks, compress=True, date_time=None):
+        """Add one entry from an iterable of bytes; compress=False stores it as is."""
+        if name in self._names:
+            raise ValueError("duplicate zip entry: %r" % (name,))
+        self._names.add(name)
+
+        dos_date, dos_time = _dos_datetime(date_time or datetime.datetime.now())
+        method = ZIP_DEFLATED if compress else ZIP_STORED
+        flags = FLAG_DATA_DESCRIPTOR
+        name_bytes = name.encode("utf-8")
+        if not name.isascii():
+            flags |= FLAG_UTF8
+
+        extra = b""
+        header_method = method
+        version = 20
+        encrypter = None
+        if self.password:
+            flags |= FLAG_ENCRYPTED
+            if self.encryption == ENCRYPTION_AES:
+                encrypter = AesEncrypter(self.password)
+                header_method = ZIP_AES_METHOD
+                version = 51
+                extra = struct.pack("<HHH2sBH", 0x9901, 7, 2, b"AE", AES_STRENGTH, method)
+            else:
+                encrypter = ZipCryptoEncrypter(self.password)
+
+        header_offset = self._offset
+        yield self._emit(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, version, flags, header_method, dos_time, dos_date,
+            0, 0, 0, len(name_bytes), len(extra)) + name_bytes + extra)
+
+        compressed_size = 0
+        if encrypter is not None:
+            if self.encryption == ENCRYPTION_AES:
+                head = encrypter.header()
+            else:
+                # with a data descriptor the check byte is taken from the DOS time
+                head = encrypter.header((dos_time >> 8) & 0xFF)
+            compressed_size += len(head)
+            yield self._emit(head)
+
+        crc = 0
+        size = 0
+        deflater = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15) if compress else None
+        for chunk in chunks:
+            if not chunk:
+                continue
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            out = deflater.compress(chunk) if deflater is not None else chunk
+            if out:
+                if encrypter is not None:
+                    out = encrypter.encrypt(out)
+                compressed_size += len(out)
+                yield self._emit(out)
+        if deflater is not None:
+            out = deflater.flush()
+            if out:
+                if encrypter is not None:
+                    out = encrypter.encrypt(out)
+                compressed_size += len(out)
+                yield self._emit(out)
+        if isinstance(encrypter, AesEncrypter):
+            mac = encrypter.trailer()
+            compressed_size += len(mac)
+            yield self._emit(mac)
+            crc = 0  # AE-2 leaves the CRC out, the HMAC covers integrity
+
+        if size >= 0xFFFFFFFF or compressed_size >= 0xFFFFFFFF:
+            raise ValueError("zip entry too large (ZIP64 not supported): %r" % (name,))
+
+        yield self._emit(struct.pack("<IIII", 0x08074B50, crc, compressed_size, size))
+
+        self._central.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, flags,
+            header_method, dos_time, dos_date, crc, compressed_size, size,
+            len(name_bytes), len(extra), 0, 0, 0, 0o100644 << 16, header_offset)
+            + name_bytes + extra)
+
+    def close(self):
+        """Central directory and end record."""
+        cd_offset = self._offset
+        cd = b"".join(self._central)
+        yield self._emit(cd)
+        yield self._emit(struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0, len(self._central), len(self._central),
+            len(cd), cd_offset, 0))
+
+
+def iter_zip_single(name, chunks, password=None, encryption=ENCRYPTION_ZIPCRYPTO, compresslevel=5):
+    """Stream a ZIP archive holding one entry built from `chunks`."""
+    return iter_zip_entries([(name, chunks, True, None)], password=password,
+                            encryption=encryption, compresslevel=compresslevel)
+
+
+def iter_zip_entries(entries, password=None, encryption=ENCRYPTION_ZIPCRYPTO, compresslevel=5):
+    """
+    Stream a ZIP archive of (name, chunks, compress, date_time) entries.
+    entries is only advanced once the previous entry has been written, so a
+    generator can decide on later entries from what the earlier ones held.
+    """
+    zw = ZipStreamWriter(password=password, encryption=encryption, compresslevel=compresslevel)
+    for name, chunks, compress, date_time in entries:
+        yield from zw.add_file(name, chunks, compress=compress, date_time=date_time)
+    yield from zw.close()